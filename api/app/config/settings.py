@@ -71,6 +71,10 @@ class Settings(BaseSettings):
     openai_model_embeddings: str = "text-embedding-3-small"
     openai_model_chat: str = "gpt-4-turbo"
     openai_embedding_dimension: int = 1536
+    embedding_backend: str = "local"  # "local" (hashing, offline) or "openai"
+    embedding_cache_dir: str = "./cache/embeddings"
+    embedding_cache_max_bytes: int = 256 * 1024 * 1024
+    embedding_batch_window_ms: float = 5.0
     
     # ==========================================
     # Translation Services
@@ -78,6 +82,12 @@ class Settings(BaseSettings):
     google_translate_api_key: Optional[str] = None
     deepl_api_key: Optional[str] = None
     deepl_api_type: str = "free"
+    translation_cache_size: int = 10000  # Translations kept per worker
+    translation_cache_ttl_seconds: float = 3600.0
+    translation_cache_backend: str = "none"  # Shared tier: "none", "postgres" (translation_cache table) or "redis"
+    translation_cache_batch_size: int = 100  # Pending shared-tier changes that trigger a flush
+    translation_cache_flush_interval_ms: float = 200.0
+    translation_max_concurrent_requests: int = 4  # Provider requests in flight per worker
     
     # ==========================================
     # Redis Configuration
@@ -92,6 +102,15 @@ class Settings(BaseSettings):
     librosa_cache_dir: str = "./cache/librosa"
     audio_sample_rate: int = 22050
     audio_max_duration: int = 600
+    audio_stream_threshold_seconds: float = 60.0
+    audio_stream_block_seconds: float = 5.0
+    audio_worker_processes: int = 2  # 0 = render on the default thread pool
+    audio_worker_queue_size: int = 8
+    audio_render_cache_enabled: bool = True
+    audio_render_cache_dir: str = "./cache/renders"
+    audio_render_cache_max_bytes: int = 1024 * 1024 * 1024
+    audio_decode_cache_enabled: bool = True
+    audio_decode_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
     
     # ==========================================
     # Memory & Storage
@@ -99,6 +118,26 @@ class Settings(BaseSettings):
     memory_vector_dimension: int = 1536
     memory_similarity_threshold: float = 0.75
     memory_consolidation_days: int = 30
+    memory_ann_index: str = "ivf"  # "ivf", "flat" or "none" (exact matrix scan only)
+    memory_ann_min_size: int = 10000  # Memories per user before an index is built
+    memory_ann_n_probe: int = 8  # IVF lists scanned per query (recall vs latency)
+    # "memory" (per process), "postgres" (pgvector; user ids must be user_profiles UUIDs) or "sqlite"
+    memory_store_backend: str = "memory"
+    memory_store_sqlite_path: str = "./cache/memories.db"
+    memory_store_batch_size: int = 100  # Records per batched insert
+    memory_proactive_push: bool = False  # Push due reminders from a background task
+    memory_recall_cache_size: int = 10000  # Cached recall results across users (0 = off)
+    memory_recall_cache_ttl_seconds: float = 300.0
+    memory_vector_codec: str = "float32"  # Persona memory embeddings: "float32", "int8" (~4x smaller) or "pq"
+    memory_pq_subspaces: int = 96  # PQ code bytes per vector; must divide memory_vector_dimension
+    memory_pq_train_size: int = 10000  # Vectors kept in float32 until the PQ codebooks are trained
+    memory_rerank_candidates: int = 0  # Candidates per result re-scored from exact vectors on disk (0 = off)
+    memory_rerank_dir: str = "./cache/memory-vectors"
+    memory_shards: int = 0  # Shard processes owning user memories (0 = engines in each worker)
+    memory_shard_socket_dir: str = "./cache/memory-shards"
+    # Shards run in a supervisor: `python main.py` starts one before uvicorn forks; with
+    # `uvicorn main:app --workers N`, run `python main.py shards` alongside
+    memory_shard_startup_timeout: float = 30.0  # Seconds a worker waits for the shards to listen
     
     # ==========================================
     # Security & Blockchain
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, Literal
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Optional, Literal
 from datetime import datetime
 
 # User Models
@@ -130,9 +130,22 @@ class TricksterEffectRequest(BaseModel):
     pitch_shift: float = 4.0
     formant_shift: float = 0.65
     tempo_rate: float = 1.1
+    streaming: Optional[bool] = None  # None = decide from file duration
+    mode: Literal['chain', 'fused'] = 'chain'
+    output_format: Literal['wav', 'flac', 'opus'] = 'wav'
+    inline: bool = False  # True = respond with the encoded audio itself
+
+class TricksterBatchRequest(BaseModel):
+    audio_urls: List[str] = Field(..., min_length=1, max_length=1000)
+    pitch_shift: float = 4.0
+    formant_shift: float = 0.65
+    tempo_rate: float = 1.1
+    mode: Literal['chain', 'fused'] = 'chain'
+    output_format: Literal['wav', 'flac', 'opus'] = 'wav'
 
 class AudioProcessingResponse(BaseModel):
     success: bool
     processed_url: Optional[str] = None
     error: Optional[str] = None
     processing_time_ms: float
+    cache_hit: bool = False
@@ -36,6 +36,8 @@ async def store_memory(user_id: str, memory: MemoryCreate):
             "summary": stored_memory.summary,
             "emotion": stored_memory.emotion_detected
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -129,6 +131,8 @@ async def translate_text(request: TranslationRequest):
             confidence_score=confidence,
             cache_hit=cache_hit
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -162,6 +166,17 @@ async def speech_to_speech_translate(request: SpeechToSpeechRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/translate/cache-stats")
+async def get_translation_cache_stats():
+    """Translation cache hit ratios per language pair"""
+    cache = translator.cache
+    return {
+        "entries": len(cache.local),
+        "language_pairs": cache.hit_ratios(),
+        "shared_tier": cache.stats,
+        "provider": translator.stats,
+    }
+
 @router.get("/languages")
 async def get_supported_languages():
     """Get all supported languages for translation"""
@@ -1,15 +1,134 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, StreamingResponse
+import asyncio
+import json
 import os
+import shutil
 import tempfile
-from app.models.schemas import TricksterEffectRequest, AudioProcessingResponse
-from app.services.audio_processor import processor
+import time
+from typing import Optional, Tuple
+import numpy as np
+from app.models.schemas import TricksterEffectRequest, TricksterBatchRequest, AudioProcessingResponse
+from app.services.audio_processor import OUTPUT_FORMATS, processor
+from app.services.audio_workers import WorkerPoolFull
 
 router = APIRouter(prefix="/api/audio", tags=["audio"])
 
+# How often a running job checks whether its client has gone away
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Upload copy buffer; bounds per-upload memory regardless of file size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Live voice changer: PCM sample formats and the longest accepted frame
+REALTIME_FORMATS = {"float32": "<f4", "int16": "<i2"}
+REALTIME_MAX_FRAME_SECONDS = 1.0
+
+# Read size when streaming encoded audio back to the client
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+async def _run_until_disconnect(http_request: Request, coro):
+    """
+    Await coro, cancelling it if the client disconnects first.
+    Cancellation reaches the audio worker, which stops at its next checkpoint.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" Range header into inclusive offsets.
+    Raises ValueError when the range cannot be satisfied; multi-range
+    requests return None and are answered with the whole file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        start, end = max(0, size - int(last)), size - 1  # suffix range
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+def _iter_file(path: str, start: int, end: int):
+    # Sync generator: StreamingResponse iterates it in the threadpool
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RESPONSE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def _ranged_file_response(http_request: Request, path: str, media_type: str) -> StreamingResponse:
+    """Stream a file, honouring a single byte Range (206 / 416)."""
+    size = os.path.getsize(path)
+    try:
+        byte_range = _parse_range(http_request.headers.get("range", ""), size)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=416, detail=str(e), headers={"Content-Range": f"bytes */{size}"}
+        )
+
+    start, end = byte_range or (0, size - 1)
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        _iter_file(path, start, end),
+        status_code=206 if byte_range else 200,
+        media_type=media_type,
+        headers=headers,
+    )
+
+async def _streamed_wav_response(request: TricksterEffectRequest) -> StreamingResponse:
+    """
+    Stream a Trickster render as WAV while it renders.
+    The header is produced before responding, so a full worker queue (429)
+    or an unreadable input (400) still gets a proper status code.
+    """
+    blocks = processor.stream_wav_async(
+        request.audio_url,
+        pitch_shift=request.pitch_shift,
+        formant_shift=request.formant_shift,
+        tempo_rate=request.tempo_rate,
+        mode=request.mode,
+    )
+    try:
+        header = await blocks.__anext__()
+    except RuntimeError as e:
+        await blocks.aclose()
+        raise HTTPException(status_code=400, detail=f"Unreadable audio: {e}")
+
+    async def body():
+        yield header
+        try:
+            async for chunk in blocks:
+                yield chunk
+        finally:
+            await blocks.aclose()
+
+    return StreamingResponse(body(), media_type=OUTPUT_FORMATS["wav"]["media_type"])
+
 @router.post("/trickster", response_model=AudioProcessingResponse)
 async def apply_trickster_effect(
     request: TricksterEffectRequest,
+    http_request: Request,
     background_tasks: BackgroundTasks
 ):
     """
@@ -19,55 +138,264 @@ async def apply_trickster_effect(
     - Pitch shift: +4 semitones (default)
     - Formant shift: 0.65x (default)
     - Tempo: 1.1x speedup (default)
+    
+    mode="fused" renders all three in a single STFT pass.
+    output_format selects 16-bit WAV, FLAC or Ogg/Opus. With inline=true the
+    encoded audio is streamed back directly (Range requests supported)
+    instead of a JSON body with its path. Inline WAV with streaming=true is
+    sent block by block while it renders (no Range support, not cached).
+    Returns 429 when the audio worker queue is full.
     """
+    if request.output_format not in processor.available_output_formats():
+        raise HTTPException(status_code=400, detail=f"Output format not available: {request.output_format}")
     try:
-        # Create temporary output file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_output:
-            output_path = tmp_output.name
-
         # Download audio from URL (in production, would use signed URLs)
         # For now, assume local file path
         if not os.path.exists(request.audio_url):
             raise HTTPException(status_code=400, detail="Audio file not found")
 
+        if request.inline and request.streaming and request.output_format == "wav":
+            return await _streamed_wav_response(request)
+
+        # Create temporary output file
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_output:
+            output_path = tmp_output.name
+
         # Process audio
-        result = await processor.process_async(
+        start = time.perf_counter()
+        result = await _run_until_disconnect(http_request, processor.process_async(
             audio_path=request.audio_url,
             output_path=output_path,
             pitch_shift=request.pitch_shift,
             formant_shift=request.formant_shift,
             tempo_rate=request.tempo_rate,
-        )
+            streaming=request.streaming,
+            mode=request.mode,
+        ))
 
         if result["success"]:
+            rendered = result["output_path"]
+            if rendered != output_path and os.path.exists(output_path):
+                # Served from the render cache, the temp file is unused
+                os.remove(output_path)
+
+            # Renders are 16-bit WAV; other formats are encoded off the loop
+            # from the (possibly cached) render
+            encoded = rendered
+            if request.output_format != "wav":
+                encoded = await asyncio.get_event_loop().run_in_executor(
+                    None, processor.encode_file, rendered, request.output_format
+                )
+                if rendered == output_path:
+                    os.remove(rendered)
+            processing_time_ms = 1000.0 * (time.perf_counter() - start)
+
+            if request.inline:
+                # Temporary files go once sent; cached renders stay
+                temporary = encoded == output_path or encoded != rendered
+                try:
+                    response = _ranged_file_response(
+                        http_request, encoded, OUTPUT_FORMATS[request.output_format]["media_type"]
+                    )
+                except HTTPException:
+                    if temporary:
+                        os.remove(encoded)
+                    raise
+                if temporary:
+                    background_tasks.add_task(os.remove, encoded)
+                response.headers["X-Processing-Time-Ms"] = f"{processing_time_ms:.1f}"
+                response.background = background_tasks
+                return response
+
             # In production, upload to S3 and return signed URL
             return AudioProcessingResponse(
                 success=True,
-                processed_url=output_path,  # Should be S3 URL
-                processing_time_ms=0,
+                processed_url=encoded,  # Should be S3 URL
+                processing_time_ms=processing_time_ms,
+                cache_hit=result.get("cache_hit", False),
             )
         else:
             raise HTTPException(status_code=500, detail=result["error"])
 
+    except WorkerPoolFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/trickster/batch")
+async def apply_trickster_batch(request: TricksterBatchRequest):
+    """
+    Apply one Trickster preset to many clips.
+    
+    Clips are bucketed by length and each bucket is rendered as one stacked
+    array. Results stream back as NDJSON, one line per clip
+    ({"index", "success", "processed_url" | "error"}), as buckets finish.
+    """
+    if request.output_format not in processor.available_output_formats():
+        raise HTTPException(status_code=400, detail=f"Output format not available: {request.output_format}")
+    missing = [url for url in request.audio_urls if not os.path.exists(url)]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Audio file not found: {missing[0]}")
+
+    async def results():
+        async for result in processor.process_batch_async(
+            request.audio_urls,
+            pitch_shift=request.pitch_shift,
+            formant_shift=request.formant_shift,
+            tempo_rate=request.tempo_rate,
+            mode=request.mode,
+            output_format=request.output_format,
+        ):
+            if "output_path" in result:
+                result["processed_url"] = result.pop("output_path")  # Should be S3 URL
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.websocket("/trickster/live")
+async def trickster_live(
+    websocket: WebSocket,
+    pitch_shift: Optional[float] = None,
+    formant_shift: Optional[float] = None,
+    sample_format: str = "float32",
+    stats_every: int = 50,
+):
+    """
+    Real-time Trickster voice changer over WebSocket.
+    
+    - The server first sends a JSON "config" message (sample rate, latency)
+    - The client sends binary mono PCM frames at that sample rate
+      (little-endian float32 or int16, see sample_format)
+    - Each frame is answered with a processed frame of the same length
+    - Every stats_every frames a JSON "stats" message compares processing
+      time so far with the audio duration processed (the real-time budget)
+    - A JSON text message {"pitch_shift": .., "formant_shift": ..} changes
+      the effect without restarting the stream
+    """
+    if sample_format not in REALTIME_FORMATS:
+        await websocket.close(code=1003, reason=f"Unsupported sample_format: {sample_format}")
+        return
+    dtype = np.dtype(REALTIME_FORMATS[sample_format])
+    scale = 32768.0 if sample_format == "int16" else 1.0
+    max_bytes = int(processor.sr * REALTIME_MAX_FRAME_SECONDS) * dtype.itemsize
+
+    await websocket.accept()
+    vocoder = processor.realtime_session(pitch_shift, formant_shift)
+    sr = processor.sr
+    await websocket.send_json({
+        "type": "config",
+        "sample_rate": sr,
+        "sample_format": sample_format,
+        "latency_ms": 1000.0 * vocoder.latency_samples / sr,
+        "pitch_shift": vocoder.n_steps,
+        "formant_shift": vocoder.formant_factor,
+    })
+
+    frames, overruns, busy, budget, worst = 0, 0, 0.0, 0.0, 0.0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                try:
+                    update = json.loads(message["text"])
+                    vocoder.set_params(
+                        float(update.get("pitch_shift", vocoder.n_steps)),
+                        float(update.get("formant_shift", vocoder.formant_factor)),
+                    )
+                except (ValueError, TypeError, AttributeError) as e:
+                    await websocket.send_json({"type": "error", "detail": f"Invalid settings: {e}"})
+                continue
+
+            data = message.get("bytes") or b""
+            if len(data) > max_bytes or len(data) % dtype.itemsize:
+                await websocket.send_json({
+                    "type": "error",
+                    "detail": f"Frames must be whole {sample_format} samples, at most {max_bytes} bytes",
+                })
+                continue
+
+            # Frames are a few ms of audio; processing them inline avoids a
+            # thread hop per frame, which would cost more than the work
+            start = time.perf_counter()
+            x = np.frombuffer(data, dtype=dtype).astype(np.float32) / scale
+            y = vocoder.process(x)
+            if sample_format == "int16":
+                out = np.clip(y * scale, -32768, 32767).astype(dtype)
+            else:
+                out = y.astype(dtype)
+            elapsed = time.perf_counter() - start
+            await websocket.send_bytes(out.tobytes())
+
+            frames += 1
+            busy += elapsed
+            budget += len(x) / sr
+            worst = max(worst, elapsed)
+            overruns += elapsed > len(x) / sr
+            if stats_every > 0 and frames % stats_every == 0:
+                await websocket.send_json({
+                    "type": "stats",
+                    "frames": frames,
+                    "processing_ms": 1000.0 * busy,
+                    "budget_ms": 1000.0 * budget,
+                    "max_frame_ms": 1000.0 * worst,
+                    "realtime_factor": busy / budget if budget else 0.0,
+                    "overruns": overruns,
+                })
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/cache/stats")
+async def render_cache_stats():
+    """
+    Trickster render cache counters (hits, misses, evictions, size).
+    Counters for the decoded-audio cache are reported under "decoded".
+    """
+    decode_cache = processor.decode_cache
+    decoded = {"enabled": decode_cache is not None, **(decode_cache.stats() if decode_cache else {})}
+    if processor.render_cache is None:
+        return {"enabled": False, "decoded": decoded}
+    return {"enabled": True, **processor.render_cache.stats(), "decoded": decoded}
+
 @router.post("/upload")
 async def upload_audio(file: UploadFile = File(...)):
     """
     Upload audio file for processing.
     Returns file path for use in Trickster endpoint.
+    
+    The header is probed straight from the spooled upload, so files over the
+    duration/channel/sample-rate limits are rejected (413) before anything is
+    decoded or copied. Files whose header cannot be read are rejected (415),
+    since their limits cannot be checked. Accepted files are copied to disk in
+    fixed-size chunks.
     """
+    loop = asyncio.get_event_loop()
     try:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-            contents = await file.read()
-            tmp_file.write(contents)
+        metadata = await loop.run_in_executor(None, processor.probe_audio, file.file)
+        if metadata is None:
+            raise HTTPException(status_code=415, detail="Unsupported or unreadable audio file")
+        reason = processor.check_limits(metadata)
+        if reason:
+            raise HTTPException(status_code=413, detail=reason)
+
+        suffix = os.path.splitext(file.filename or "")[1] or ".wav"
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp_file:
+            await loop.run_in_executor(
+                None, shutil.copyfileobj, file.file, tmp_file, UPLOAD_CHUNK_SIZE
+            )
+            size = tmp_file.tell()
             tmp_file_path = tmp_file.name
 
         return {
             "filename": file.filename,
             "path": tmp_file_path,
-            "size": len(contents),
+            "size": size,
+            "metadata": metadata,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
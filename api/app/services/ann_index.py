@@ -0,0 +1,271 @@
+"""
+Approximate Nearest-Neighbour Index for memory recall
+
+Pure-numpy vector indexes with a common interface (add / remove / search by
+integer id, cosine similarity on normalised vectors):
+- FlatIndex: exact brute-force search, the reference for recall
+- IVFFlatIndex: inverted file index. Vectors are clustered with spherical
+  k-means and a query only scans the `n_probe` closest clusters. n_probe is
+  the recall/latency knob: 1 is fastest, n_lists is exact.
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.vector_store import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _Bucket:
+    """Growable (vectors, ids) block with O(1) swap-remove"""
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.size = 0
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray) -> int:
+        """Append rows, returns the position of the first one."""
+        start, n = self.size, len(ids)
+        if start + n > len(self.ids):
+            capacity = max(2 * len(self.ids), start + n)
+            vecs = np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)
+            vecs[:start] = self.vectors[:start]
+            idx = np.zeros(capacity, dtype=np.int64)
+            idx[:start] = self.ids[:start]
+            self.vectors, self.ids = vecs, idx
+        self.vectors[start:start + n] = vectors
+        self.ids[start:start + n] = ids
+        self.size += n
+        return start
+
+    def pop(self, pos: int) -> Optional[int]:
+        """Remove the row at pos; returns the id moved into its place, if any."""
+        last = self.size - 1
+        moved = None
+        if pos != last:
+            self.vectors[pos] = self.vectors[last]
+            self.ids[pos] = self.ids[last]
+            moved = int(self.ids[pos])
+        self.size -= 1
+        return moved
+
+    def scores(self, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self.ids[:self.size], self.vectors[:self.size] @ query
+
+
+class VectorIndex:
+    """
+    Interface of a cosine-similarity index over integer ids
+
+    Vectors are normalised on insert and queries on search, so scores are
+    cosine similarities.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        """Insert vectors (n, dim) under the given ids (n,)."""
+        raise NotImplementedError
+
+    def remove(self, ids: np.ndarray) -> None:
+        """Delete ids; unknown ids are ignored."""
+        raise NotImplementedError
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar vectors.
+
+        Returns:
+            (ids, similarities), best first
+        """
+        raise NotImplementedError
+
+
+class FlatIndex(VectorIndex):
+    """Exact search over every vector"""
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self._bucket = _Bucket(dim)
+        self._pos: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self._bucket.size
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        self.remove(ids)
+        start = self._bucket.append(ids, _normalize_rows(vectors))
+        for offset, id_ in enumerate(ids.tolist()):
+            self._pos[id_] = start + offset
+
+    def remove(self, ids: np.ndarray) -> None:
+        for id_ in np.atleast_1d(ids).tolist():
+            pos = self._pos.pop(int(id_), None)
+            if pos is not None:
+                moved = self._bucket.pop(pos)
+                if moved is not None:
+                    self._pos[moved] = pos
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        ids, sims = self._bucket.scores(_normalize_rows(query)[0])
+        best = top_k_indices(sims, k)
+        return ids[best], sims[best]
+
+
+class IVFFlatIndex(VectorIndex):
+    """
+    Inverted-file index with exact scoring inside the probed lists
+
+    The index is exact until it holds `train_threshold` vectors. It then
+    clusters itself into n_lists lists (default sqrt(n)), and it re-clusters
+    whenever it has doubled in size since the last training, so the
+    rebuild cost stays amortised over the inserts.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        train_threshold: int = 4096,
+        kmeans_iterations: int = 10,
+        seed: int = 0,
+    ):
+        super().__init__(dim)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_threshold = train_threshold
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.RandomState(seed)
+
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[_Bucket] = [_Bucket(dim)]
+        self._pos: Dict[int, Tuple[int, int]] = {}  # id -> (list, position)
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        vectors = _normalize_rows(vectors)
+        self.remove(ids)
+        self._insert(ids, vectors)
+
+        size = len(self)
+        if size >= self.train_threshold and size >= 2 * self._trained_size:
+            self.train()
+
+    def remove(self, ids: np.ndarray) -> None:
+        for id_ in np.atleast_1d(ids).tolist():
+            loc = self._pos.pop(int(id_), None)
+            if loc is not None:
+                list_no, pos = loc
+                moved = self._lists[list_no].pop(pos)
+                if moved is not None:
+                    self._pos[moved] = (list_no, pos)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        q = _normalize_rows(query)[0]
+        if self.centroids is None:
+            probe = [0]
+        else:
+            probe = top_k_indices(self.centroids @ q, self.n_probe).tolist()
+
+        all_ids, all_sims = [], []
+        for list_no in probe:
+            ids, sims = self._lists[list_no].scores(q)
+            all_ids.append(ids)
+            all_sims.append(sims)
+        ids = np.concatenate(all_ids)
+        sims = np.concatenate(all_sims)
+        best = top_k_indices(sims, k)
+        return ids[best], sims[best]
+
+    def train(self) -> None:
+        """(Re)cluster all stored vectors and rebuild the inverted lists."""
+        ids, vectors = self._export()
+        n = len(ids)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+
+        # k-means on a sample; ~40 points per centroid is plenty
+        sample_size = min(n, 40 * n_lists)
+        sample = vectors[self._rng.choice(n, sample_size, replace=False)]
+        centroids = sample[self._rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assign = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            # Re-seed empty clusters from random sample points
+            sums[empty] = sample[self._rng.choice(sample_size, int(empty.sum()))]
+            centroids = _normalize_rows(sums)
+
+        self.centroids = centroids
+        self._lists = [_Bucket(self.dim) for _ in range(n_lists)]
+        self._pos = {}
+        self._insert(ids, vectors)
+        self._trained_size = n
+        logger.debug(f"IVF index trained: {n} vectors in {n_lists} lists")
+
+    def _insert(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        if self.centroids is None:
+            assign = np.zeros(len(ids), dtype=np.intp)
+        else:
+            assign = self._assign(vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.flatnonzero(np.diff(assign[order])) + 1
+        for group in np.split(order, bounds):
+            if not len(group):
+                continue
+            list_no = int(assign[group[0]])
+            start = self._lists[list_no].append(ids[group], vectors[group])
+            for offset, id_ in enumerate(ids[group].tolist()):
+                self._pos[id_] = (list_no, start + offset)
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        # Chunked so the (n, n_lists) score matrix stays small
+        out = np.empty(len(vectors), dtype=np.intp)
+        for start in range(0, len(vectors), chunk):
+            out[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return out
+
+    def _export(self) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.concatenate([b.ids[:b.size] for b in self._lists])
+        vectors = np.concatenate([b.vectors[:b.size] for b in self._lists])
+        return ids, vectors
+
+
+# Index types selectable by name
+INDEX_TYPES = {"flat": FlatIndex, "ivf": IVFFlatIndex}
+
+
+def index_factory(kind: str, **options) -> Callable[[int], VectorIndex]:
+    """Build-per-user factory for the memory engines, e.g. index_factory("ivf", n_probe=8)."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind}")
+    cls = INDEX_TYPES[kind]
+    return lambda dim: cls(dim, **options)
@@ -0,0 +1,153 @@
+"""
+Trickster Render Cache
+
+Disk-backed, size-bounded LRU cache of encoded Trickster renders. Entries are
+content-addressed: the key is a hash of the input audio bytes plus the
+resolved effect parameters, so the same clip with the same preset is only
+rendered once.
+
+The same class backs the decoded-audio cache (suffix ".npy"), which keeps
+the float32 PCM that load_audio produces so repeated renders of one upload
+skip decoding and resampling.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when rendering changes in a way that invalidates stored outputs
+RENDER_CACHE_VERSION = 1
+
+
+class RenderCache:
+    """
+    LRU cache of rendered files
+
+    Files live in `cache_dir` as `<key><suffix>`. Recency is kept in memory and
+    mirrored to file mtimes, so the LRU order survives a restart. Safe to use
+    from executor threads.
+
+    Worker processes can share `cache_dir`: a key missing from this process's
+    index is looked up on disk, and a file another worker rendered is adopted
+    into the index instead of being rendered again. Files only appear under
+    their final name once complete (put moves them into place).
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 ** 3, suffix: str = ".wav"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(audio_path: str, params: Dict, chunk_size: int = 1 << 20) -> str:
+        """Hash the audio file bytes together with the effect parameters."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+            {"version": RENDER_CACHE_VERSION, **params}, sort_keys=True
+        ).encode())
+        with open(audio_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached render, or None on a miss."""
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            size = None
+        with self._lock:
+            if size is None:
+                self._drop(key)  # Evicted by another worker
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                self._entries[key] = size  # Cached by another worker
+                self._total_bytes += size
+                self._evict(keep=key)
+            self.hits += 1
+        os.utime(path)
+        return path
+
+    def put(self, key: str, rendered_path: str) -> str:
+        """
+        Move a freshly rendered file into the cache.
+
+        Returns:
+            The cached file's path
+        """
+        path = self._path(key)
+        os.replace(rendered_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict(keep=key)
+        return path
+
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def _drop(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self, keep: str) -> None:
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            self._drop(key)
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _load_index(self) -> None:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.suffix):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, name[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict(keep="")
+        if entries:
+            logger.info(f"Render cache: {len(self._entries)} entries, {self._total_bytes} bytes")
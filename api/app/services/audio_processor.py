@@ -5,14 +5,179 @@ Applies viral voice effect filters:
 - Pitch Shift: +4 semitones
 - Formant Shift: 0.65x scaling
 - Tempo: 1.1x speedup
+
+Two engines are available: "chain" runs librosa's pitch shift, a resampling
+formant trick and librosa's time stretch one after another; "fused" does all
+three in one STFT/ISTFT pass with a spectral-envelope formant warp.
+
+Long files are rendered in streaming mode: the input is read block by block
+and every stage runs with overlap-add continuity, so peak memory is bounded
+by the block size rather than the file length.
 """
 
 import numpy as np
 import librosa
 import soundfile as sf
-from typing import Optional, Tuple
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 from io import BytesIO
 import asyncio
+import contextlib
+import functools
+import logging
+import os
+import struct
+import tempfile
+import threading
+from app.services.audio_cache import RenderCache
+from app.services.audio_workers import AudioWorkerPool, WorkerPoolFull
+from app.services.fused_vocoder import RealtimeVocoder, fused_pitch_formant_tempo
+
+logger = logging.getLogger(__name__)
+
+TRICKSTER_MODES = ("chain", "fused")
+
+# Encoded output formats: libsndfile format/subtype, file extension, media
+# type, and a fixed sample rate where the codec requires one (Opus does not
+# support 22050 Hz)
+OUTPUT_FORMATS = {
+    "wav": {"format": "WAV", "subtype": "PCM_16", "extension": ".wav", "media_type": "audio/wav", "sample_rate": None},
+    "flac": {"format": "FLAC", "subtype": "PCM_16", "extension": ".flac", "media_type": "audio/flac", "sample_rate": None},
+    "opus": {"format": "OGG", "subtype": "OPUS", "extension": ".ogg", "media_type": "audio/ogg", "sample_rate": 24000},
+}
+
+
+# RIFF and data chunk sizes of a WAV streamed before its length is known;
+# players read to the end of the stream
+WAV_STREAM_SIZE = 0xFFFFFFFF
+
+# How often a streamed response checks the render for new samples
+STREAM_POLL_SECONDS = 0.05
+
+
+def _wav_stream_header(sr: int) -> bytes:
+    """Header of a mono 16-bit PCM WAV of unknown length."""
+    return (
+        struct.pack("<4sI4s", b"RIFF", WAV_STREAM_SIZE, b"WAVE")
+        + struct.pack("<4sIHHIIHH", b"fmt ", 16, 1, 1, sr, sr * 2, 2, 16)
+        + struct.pack("<4sI", b"data", WAV_STREAM_SIZE)
+    )
+
+
+class ProcessingCancelled(Exception):
+    """Raised when a Trickster job is cancelled while it is running."""
+
+
+class _StreamingStage:
+    """
+    Block-wise wrapper around a whole-array effect function.
+
+    Input is buffered until a block plus its right-hand context is available.
+    Each block is rendered together with `context` input samples on either
+    side, the context is trimmed from the result, and consecutive blocks are
+    joined with a short linear crossfade of `fade` output samples.
+
+    `ratio` is the output/input length ratio of the effect (1.0 for pitch
+    shift, 1/rate for time stretching, target_sr/orig_sr for resampling).
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[np.ndarray], np.ndarray],
+        ratio: float,
+        block: int,
+        context: int,
+        fade: int,
+        max_output: Optional[int] = None,
+    ):
+        self.fn = fn
+        self.ratio = ratio
+        self.block = block
+        self.context = context
+        self.fade = max(0, min(fade, int(context * ratio) - 1))
+        self.max_output = max_output
+
+        self._buf = np.zeros(0, dtype=np.float32)
+        self._buf_start = 0  # absolute input index of _buf[0]
+        self._pos = 0  # absolute input index of the next block
+        self._emitted = 0  # output samples emitted so far
+        self._tail: Optional[np.ndarray] = None  # pending crossfade region
+
+    def push(self, x: np.ndarray) -> np.ndarray:
+        """Feed input samples, return the output that is now final."""
+        if len(x):
+            self._buf = np.concatenate([self._buf, x.astype(np.float32, copy=False)])
+        out = []
+        while self._buf_start + len(self._buf) >= self._pos + self.block + self.context:
+            out.append(self._render(final=False))
+        return self._join(out)
+
+    def flush(self) -> np.ndarray:
+        """Render whatever is buffered once the input is exhausted."""
+        out = []
+        while self._pos < self._buf_start + len(self._buf):
+            out.append(self._render(final=True))
+        if self._tail is not None:
+            out.append(self._cap(self._tail))
+            self._tail = None
+        if self.max_output is not None and self._emitted < self.max_output:
+            out.append(np.zeros(self.max_output - self._emitted, dtype=np.float32))
+            self._emitted = self.max_output
+        return self._join(out)
+
+    def _render(self, final: bool) -> np.ndarray:
+        buf_end = self._buf_start + len(self._buf)
+        block_end = min(self._pos + self.block, buf_end)
+        if final and buf_end - block_end < self.context:
+            # Fold a short remainder into this block instead of rendering it
+            # without enough right-hand context
+            block_end = buf_end
+        seg_start = max(self._buf_start, self._pos - self.context)
+        seg_end = min(buf_end, block_end + self.context)
+        extra = 0 if block_end == buf_end and final else self.fade
+
+        out_a = int(round(self._pos * self.ratio))
+        out_b = int(round(block_end * self.ratio))
+
+        chunk = np.zeros(0, dtype=np.float32)
+        if self.max_output is None or out_a < self.max_output:
+            seg = self._buf[seg_start - self._buf_start:seg_end - self._buf_start]
+            y = np.asarray(self.fn(seg), dtype=np.float32)
+
+            lo = out_a - int(round(seg_start * self.ratio))
+            hi = lo + (out_b - out_a) + extra
+            if len(y) < hi:
+                y = np.pad(y, (0, hi - len(y)))
+            chunk = y[lo:hi].copy()
+
+            if self._tail is not None:
+                n = min(len(self._tail), len(chunk))
+                ramp = np.linspace(0.0, 1.0, n + 2, dtype=np.float32)[1:-1]
+                chunk[:n] = self._tail[:n] * (1.0 - ramp) + chunk[:n] * ramp
+                self._tail = None
+            if extra:
+                chunk, self._tail = chunk[:-extra], chunk[-extra:]
+            chunk = self._cap(chunk)
+
+        # Keep only the input later blocks still need as left context
+        self._pos = block_end
+        keep_from = max(self._buf_start, self._pos - self.context)
+        self._buf = self._buf[keep_from - self._buf_start:].copy()
+        self._buf_start = keep_from
+        return chunk
+
+    def _cap(self, chunk: np.ndarray) -> np.ndarray:
+        if self.max_output is not None:
+            chunk = chunk[:max(0, self.max_output - self._emitted)]
+        self._emitted += len(chunk)
+        return chunk
+
+    @staticmethod
+    def _join(chunks: List[np.ndarray]) -> np.ndarray:
+        chunks = [c for c in chunks if len(c)]
+        if not chunks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(chunks)
+
 
 class TricksterAudioProcessor:
     def __init__(self):
@@ -21,14 +186,163 @@ class TricksterAudioProcessor:
         self.default_formant_shift = 0.65
         self.default_tempo_rate = 1.1
 
+        # Streaming mode (long files)
+        self.stream_threshold_seconds = 60.0  # auto-stream files longer than this
+        self.stream_block_seconds = 5.0
+        self.stream_context_seconds = 0.25  # audio rendered either side of a block
+        self.stream_fade_seconds = 0.05  # crossfade between adjacent blocks
+
+        # Upload limits, checked from the file header before any decoding
+        self.max_duration_seconds = 600.0
+        self.max_channels = 8
+        self.max_sample_rate = 192000
+
+        # Batch mode: clips are grouped so the longest is at most
+        # batch_bucket_ratio times the shortest, batch_max_clips per bucket
+        self.batch_max_clips = 32
+        self.batch_bucket_ratio = 1.25
+
+        # Real-time mode: 512-sample frames keep latency at ~23 ms at 22050 Hz
+        self.realtime_n_fft = 512
+        self.realtime_hop_length = 128
+
+        # Process pool for rendering; None = default thread pool executor
+        self.worker_pool: Optional[AudioWorkerPool] = None
+
+        # Content-addressed cache of finished renders; None = disabled
+        self.render_cache: Optional[RenderCache] = None
+        # Decoded, resampled PCM (.npy) reused across renders of one upload
+        self.decode_cache: Optional[RenderCache] = None
+
     def load_audio(self, audio_path: str) -> Tuple[np.ndarray, int]:
-        """Load audio file and return waveform and sample rate."""
+        """
+        Load audio file and return waveform and sample rate.
+        
+        With a decode_cache attached, the decoded and resampled waveform is
+        stored as .npy and returned memory-mapped (read-only) on reuse.
+        """
+        cache = self.decode_cache
+        if cache is None:
+            y, sr = librosa.load(audio_path, sr=self.sr)
+            return y, sr
+
+        key = RenderCache.make_key(audio_path, {"decoded": True, "sr": self.sr})
+        cached = cache.get(key)
+        if cached is not None:
+            try:
+                return np.load(cached, mmap_mode="r"), self.sr
+            except (OSError, ValueError):
+                pass  # Truncated or evicted underneath us, decode again
+
         y, sr = librosa.load(audio_path, sr=self.sr)
+        with tempfile.NamedTemporaryFile(suffix=".tmp", dir=cache.cache_dir, delete=False) as f:
+            np.save(f, y)
+        cache.put(key, f.name)
         return y, sr
 
-    def save_audio(self, y: np.ndarray, output_path: str, sr: int = 22050) -> None:
-        """Save audio array to file."""
-        sf.write(output_path, y, sr)
+    def probe_audio(self, source) -> Optional[Dict]:
+        """
+        Read basic metadata from the file header without decoding.
+        
+        Args:
+            source: Path or seekable file object (rewound afterwards)
+        
+        Returns:
+            Dict with duration, channels, sample_rate, frames and format, or
+            None if libsndfile cannot parse the header
+        """
+        if hasattr(source, "seek"):
+            source.seek(0)
+        try:
+            info = sf.info(source)
+        except RuntimeError:
+            return None
+        finally:
+            if hasattr(source, "seek"):
+                source.seek(0)
+        return {
+            "duration": info.duration,
+            "channels": info.channels,
+            "sample_rate": info.samplerate,
+            "frames": info.frames,
+            "format": info.format,
+        }
+
+    def check_limits(self, metadata: Dict) -> Optional[str]:
+        """Return why an upload exceeds the limits, or None if it is acceptable."""
+        if metadata["duration"] > self.max_duration_seconds:
+            return f"Audio too long: {metadata['duration']:.1f}s (max {self.max_duration_seconds:.0f}s)"
+        if metadata["channels"] > self.max_channels:
+            return f"Too many channels: {metadata['channels']} (max {self.max_channels})"
+        if metadata["sample_rate"] > self.max_sample_rate:
+            return f"Sample rate too high: {metadata['sample_rate']} Hz (max {self.max_sample_rate} Hz)"
+        return None
+
+    def save_audio(
+        self,
+        y: np.ndarray,
+        output_path: str,
+        sr: int = 22050,
+        output_format: str = "wav",
+    ) -> None:
+        """Save audio array to file (16-bit WAV unless another format is given)."""
+        spec = OUTPUT_FORMATS[output_format]
+        if spec["sample_rate"] and spec["sample_rate"] != sr:
+            y = librosa.resample(y, orig_sr=sr, target_sr=spec["sample_rate"])
+            sr = spec["sample_rate"]
+        sf.write(output_path, y, sr, format=spec["format"], subtype=spec["subtype"])
+
+    @staticmethod
+    def available_output_formats() -> List[str]:
+        """Output formats supported by the installed libsndfile."""
+        return [
+            name for name, spec in OUTPUT_FORMATS.items()
+            if spec["subtype"] in sf.available_subtypes(spec["format"])
+        ]
+
+    def encode_file(self, audio_path: str, output_format: str, block_seconds: float = None) -> str:
+        """
+        Re-encode a rendered file block by block, so memory stays bounded
+        by the block size for long renders.
+        
+        Args:
+            audio_path: Rendered audio (any libsndfile-readable file)
+            output_format: Key of OUTPUT_FORMATS
+            block_seconds: Block length (defaults to stream_block_seconds)
+        
+        Returns:
+            Path of a new temporary file in the requested format
+        """
+        spec = OUTPUT_FORMATS[output_format]
+        block_seconds = block_seconds or self.stream_block_seconds
+        info = sf.info(audio_path)
+        out_sr = spec["sample_rate"] or info.samplerate
+
+        resample = None
+        if out_sr != info.samplerate:
+            resample = _StreamingStage(
+                lambda x: librosa.resample(x, orig_sr=info.samplerate, target_sr=out_sr),
+                out_sr / info.samplerate,
+                block=int(block_seconds * info.samplerate),
+                context=int(self.stream_context_seconds * info.samplerate),
+                fade=int(self.stream_fade_seconds * out_sr),
+                max_output=int(np.ceil(info.frames * out_sr / info.samplerate)),
+            )
+
+        with tempfile.NamedTemporaryFile(suffix=spec["extension"], delete=False) as tmp:
+            output_path = tmp.name
+        read_block = max(1, int(block_seconds * info.samplerate))
+        with sf.SoundFile(
+            output_path, "w", samplerate=out_sr, channels=info.channels,
+            format=spec["format"], subtype=spec["subtype"],
+        ) as out:
+            for frames in sf.blocks(audio_path, blocksize=read_block, dtype="float32", always_2d=True):
+                if resample is not None:
+                    frames = resample.push(frames.mean(axis=1))[:, None]
+                out.write(frames)
+            if resample is not None:
+                out.write(resample.flush()[:, None])
+        return output_path
 
     def pitch_shift(self, y: np.ndarray, n_steps: float, sr: int) -> np.ndarray:
         """
@@ -58,14 +372,15 @@ class TricksterAudioProcessor:
             Formant-shifted audio
         """
         # Resample to apply formant shift
-        n_samples = int(len(y) / shift_factor)
         shifted = librosa.resample(y, orig_sr=sr, target_sr=int(sr / shift_factor))
         
-        # Pad or trim to original length
-        if len(shifted) < len(y):
-            shifted = np.pad(shifted, (0, len(y) - len(shifted)))
+        # Pad or trim to original length (last axis, so batches work too)
+        n_samples = y.shape[-1]
+        if shifted.shape[-1] < n_samples:
+            pad = [(0, 0)] * (y.ndim - 1) + [(0, n_samples - shifted.shape[-1])]
+            shifted = np.pad(shifted, pad)
         else:
-            shifted = shifted[:len(y)]
+            shifted = shifted[..., :n_samples]
         
         return shifted
 
@@ -82,12 +397,38 @@ class TricksterAudioProcessor:
         """
         return librosa.effects.time_stretch(y, rate=rate)
 
+    def fused_effect(
+        self,
+        y: np.ndarray,
+        n_steps: float,
+        formant_factor: float,
+        rate: float,
+    ) -> np.ndarray:
+        """
+        Apply pitch, formant and tempo changes in a single STFT pass.
+        
+        Unlike the chain, pitch and formants are independent: n_steps moves
+        the harmonics with the envelope held in place, formant_factor warps
+        the envelope only.
+        
+        Args:
+            y: Audio waveform
+            n_steps: Semitones to shift
+            formant_factor: Spectral envelope scaling factor
+            rate: Tempo rate
+        
+        Returns:
+            Processed audio of length len(y) / rate
+        """
+        return fused_pitch_formant_tempo(y, n_steps, formant_factor, rate)
+
     def apply_trickster_effect(
         self,
         audio_path: str,
         pitch_shift: float = None,
         formant_shift: float = None,
         tempo_rate: float = None,
+        mode: str = "chain",
     ) -> np.ndarray:
         """
         Apply the complete Trickster effect pipeline.
@@ -97,30 +438,395 @@ class TricksterAudioProcessor:
             pitch_shift: Semitones to shift (default: +4)
             formant_shift: Formant scaling factor (default: 0.65)
             tempo_rate: Tempo speedup rate (default: 1.1)
+            mode: "chain" (three librosa stages) or "fused" (single pass)
         
         Returns:
             Processed audio waveform
         """
+        if mode not in TRICKSTER_MODES:
+            raise ValueError(f"Unknown Trickster mode: {mode}")
+
+        # Load audio
+        y, sr = self.load_audio(audio_path)
+
+        return self.process_array(y, sr, pitch_shift, formant_shift, tempo_rate, mode)
+
+    def process_array(
+        self,
+        y: np.ndarray,
+        sr: int,
+        pitch_shift: float = None,
+        formant_shift: float = None,
+        tempo_rate: float = None,
+        mode: str = "chain",
+        should_cancel: Optional[Callable[[], bool]] = None,
+    ) -> np.ndarray:
+        """
+        Apply the Trickster effect to an already decoded waveform.
+        
+        Args:
+            y: Audio waveform at sample rate sr
+            sr: Sample rate
+            pitch_shift, formant_shift, tempo_rate, mode: As in apply_trickster_effect
+            should_cancel: Polled between stages; ProcessingCancelled is
+                raised as soon as it returns True
+        
+        Returns:
+            Processed audio waveform
+        """
+        if mode not in TRICKSTER_MODES:
+            raise ValueError(f"Unknown Trickster mode: {mode}")
+
         # Use defaults if not specified
         pitch_shift = pitch_shift or self.default_pitch_shift
         formant_shift = formant_shift or self.default_formant_shift
         tempo_rate = tempo_rate or self.default_tempo_rate
 
-        # Load audio
-        y, sr = self.load_audio(audio_path)
+        def checkpoint():
+            if should_cancel is not None and should_cancel():
+                raise ProcessingCancelled("Trickster job cancelled")
+
+        checkpoint()
+        if mode == "fused":
+            logger.debug(f"Applying fused effect: +{pitch_shift} semitones, {formant_shift}x formants, {tempo_rate}x tempo")
+            return self.fused_effect(y, pitch_shift, formant_shift, tempo_rate)
 
         # Apply effects in sequence
-        print(f"Applying pitch shift: +{pitch_shift} semitones")
+        logger.debug(f"Applying pitch shift: +{pitch_shift} semitones")
         y = self.pitch_shift(y, pitch_shift, sr)
+        checkpoint()
 
-        print(f"Applying formant shift: {formant_shift}x")
+        logger.debug(f"Applying formant shift: {formant_shift}x")
         y = self.formant_shift(y, formant_shift, sr)
+        checkpoint()
 
-        print(f"Applying tempo stretch: {tempo_rate}x")
+        logger.debug(f"Applying tempo stretch: {tempo_rate}x")
         y = self.time_stretch(y, tempo_rate)
 
         return y
 
+    @staticmethod
+    def bucket_by_length(
+        lengths: Sequence[int],
+        max_clips: int = 32,
+        max_ratio: float = 1.25,
+    ) -> List[List[int]]:
+        """
+        Group clip indices into buckets of similar length.
+        
+        Clips are sorted by length and a bucket is closed once it holds
+        max_clips clips or the next clip is more than max_ratio times longer
+        than its shortest one, which bounds the padding per bucket.
+        
+        Returns:
+            Lists of clip indices, shortest clips first
+        """
+        buckets: List[List[int]] = []
+        current: List[int] = []
+        for i in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+            if current and (
+                len(current) >= max_clips
+                or lengths[i] > max_ratio * max(lengths[current[0]], 1)
+            ):
+                buckets.append(current)
+                current = []
+            current.append(i)
+        if current:
+            buckets.append(current)
+        return buckets
+
+    def _stack(self, clips: Sequence[np.ndarray], bucket: List[int]) -> np.ndarray:
+        """Zero-pad the clips of a bucket to a common length and stack them."""
+        stacked = np.zeros((len(bucket), max(len(clips[i]) for i in bucket)), dtype=np.float32)
+        for row, i in enumerate(bucket):
+            stacked[row, :len(clips[i])] = clips[i]
+        return stacked
+
+    def _unstack(
+        self,
+        clips: Sequence[np.ndarray],
+        bucket: List[int],
+        rendered: np.ndarray,
+        tempo_rate: float = None,
+    ) -> List[Tuple[int, np.ndarray]]:
+        """Cut each clip's own output (len / tempo_rate) out of a bucket render."""
+        rate = tempo_rate or self.default_tempo_rate
+        return [
+            (i, rendered[row, :int(round(len(clips[i]) / rate))].copy())
+            for row, i in enumerate(bucket)
+        ]
+
+    def apply_batch(
+        self,
+        clips: Sequence[np.ndarray],
+        sr: int,
+        pitch_shift: float = None,
+        formant_shift: float = None,
+        tempo_rate: float = None,
+        mode: str = "chain",
+    ) -> Iterator[List[Tuple[int, np.ndarray]]]:
+        """
+        Apply the Trickster effect to many clips with one preset.
+        
+        Clips are bucketed by length, zero-padded and stacked into a 2-D
+        array, so every STFT stage runs once per bucket instead of once per
+        clip. Results are yielded as each bucket finishes.
+        
+        Args:
+            clips: Audio waveforms at sample rate sr
+            sr: Sample rate
+            pitch_shift, formant_shift, tempo_rate, mode: As in apply_trickster_effect
+        
+        Yields:
+            Lists of (clip index, processed audio) for one bucket
+        """
+        lengths = [len(c) for c in clips]
+        for bucket in self.bucket_by_length(lengths, self.batch_max_clips, self.batch_bucket_ratio):
+            rendered = self.process_array(
+                self._stack(clips, bucket), sr, pitch_shift, formant_shift, tempo_rate, mode
+            )
+            yield self._unstack(clips, bucket, rendered, tempo_rate)
+
+    def stream_trickster_effect(
+        self,
+        audio_path: str,
+        pitch_shift: float = None,
+        formant_shift: float = None,
+        tempo_rate: float = None,
+        block_seconds: float = None,
+        mode: str = "chain",
+    ) -> Iterator[np.ndarray]:
+        """
+        Apply the Trickster effect block by block.
+        
+        The input is read in blocks, downmixed and resampled, then passed
+        through the same pitch/formant/tempo stages as apply_trickster_effect.
+        Every stage renders its blocks with overlapping context and joins them
+        with a crossfade, so memory use depends only on the block size.
+        
+        Args:
+            audio_path: Path to input audio file
+            pitch_shift: Semitones to shift (default: +4)
+            formant_shift: Formant scaling factor (default: 0.65)
+            tempo_rate: Tempo speedup rate (default: 1.1)
+            block_seconds: Block length (default: stream_block_seconds)
+            mode: "chain" or "fused", as in apply_trickster_effect
+        
+        Yields:
+            Consecutive blocks of processed audio at self.sr
+        """
+        if mode not in TRICKSTER_MODES:
+            raise ValueError(f"Unknown Trickster mode: {mode}")
+
+        pitch_shift = pitch_shift or self.default_pitch_shift
+        formant_shift = formant_shift or self.default_formant_shift
+        tempo_rate = tempo_rate or self.default_tempo_rate
+        block_seconds = block_seconds or self.stream_block_seconds
+
+        sr = self.sr
+        info = sf.info(audio_path)
+        n_samples = int(np.ceil(info.frames * sr / info.samplerate))
+        formant_sr = int(sr / formant_shift)
+
+        def stage(fn, ratio, in_sr, max_output=None):
+            return _StreamingStage(
+                fn,
+                ratio,
+                block=int(block_seconds * in_sr),
+                context=int(self.stream_context_seconds * in_sr),
+                fade=int(self.stream_fade_seconds * sr),
+                max_output=max_output,
+            )
+
+        stages = []
+        if info.samplerate != sr:
+            stages.append(stage(
+                lambda x: librosa.resample(x, orig_sr=info.samplerate, target_sr=sr),
+                sr / info.samplerate, info.samplerate, max_output=n_samples,
+            ))
+        if mode == "fused":
+            stages.append(stage(
+                lambda x: self.fused_effect(x, pitch_shift, formant_shift, tempo_rate),
+                1.0 / tempo_rate, sr,
+            ))
+        else:
+            stages.append(stage(lambda x: self.pitch_shift(x, pitch_shift, sr), 1.0, sr))
+            # Formant stage reads the signal at formant_shift speed and is cut
+            # to the original length, exactly like formant_shift()
+            stages.append(stage(
+                lambda x: librosa.resample(x, orig_sr=sr, target_sr=formant_sr),
+                formant_sr / sr, sr, max_output=n_samples,
+            ))
+            stages.append(stage(lambda x: self.time_stretch(x, tempo_rate), 1.0 / tempo_rate, sr))
+
+        read_block = max(1, int(block_seconds * info.samplerate))
+        for frames in sf.blocks(audio_path, blocksize=read_block, dtype="float32", always_2d=True):
+            y = frames.mean(axis=1)
+            for st in stages:
+                y = st.push(y)
+            if len(y):
+                yield y
+
+        y = np.zeros(0, dtype=np.float32)
+        for st in stages:
+            y = np.concatenate([st.push(y), st.flush()])
+        if len(y):
+            yield y
+
+    def process_streaming(
+        self,
+        audio_path: str,
+        output_path: str,
+        pitch_shift: float = None,
+        formant_shift: float = None,
+        tempo_rate: float = None,
+        mode: str = "chain",
+        should_cancel: Optional[Callable[[], bool]] = None,
+        raw: bool = False,
+    ) -> int:
+        """
+        Render the Trickster effect to output_path in streaming mode.
+        
+        Args:
+            should_cancel: Polled after every block, as in process_array
+            raw: Write headerless 16-bit PCM, each block as soon as it is
+                rendered (read while it grows by stream_wav_async)
+        
+        Returns:
+            Number of samples written
+        """
+        written = 0
+        file_format = {"format": "RAW", "subtype": "PCM_16"} if raw else {}
+        with sf.SoundFile(output_path, "w", samplerate=self.sr, channels=1, **file_format) as out:
+            for block in self.stream_trickster_effect(
+                audio_path, pitch_shift, formant_shift, tempo_rate, mode=mode
+            ):
+                if should_cancel is not None and should_cancel():
+                    raise ProcessingCancelled("Trickster job cancelled")
+                out.write(block)
+                written += len(block)
+        return written
+
+    async def stream_wav_async(
+        self,
+        audio_path: str,
+        pitch_shift: float = None,
+        formant_shift: float = None,
+        tempo_rate: float = None,
+        mode: str = "chain",
+    ) -> AsyncIterator[bytes]:
+        """
+        Render the Trickster effect in streaming mode as 16-bit WAV bytes.
+        
+        The render runs like process_async's streaming mode (on worker_pool
+        when one is attached, else on the default executor) into a temporary
+        raw PCM file, which is read while it grows. The first item is a WAV
+        header of open length, sent once the input header has been read and a
+        worker_pool slot is held (WorkerPoolFull is raised before it). Closing
+        the generator cancels the render. Renders are not stored in the
+        render cache.
+        
+        Yields:
+            WAV header, then PCM samples as they are rendered
+        """
+        loop = asyncio.get_event_loop()
+        pool = self.worker_pool
+        params = {
+            "pitch_shift": pitch_shift,
+            "formant_shift": formant_shift,
+            "tempo_rate": tempo_rate,
+            "mode": mode,
+        }
+        await loop.run_in_executor(None, sf.info, audio_path)
+        with pool.reserve() if pool is not None else contextlib.nullcontext():
+            with tempfile.NamedTemporaryFile(suffix=".pcm", delete=False) as f:
+                pcm_path = f.name
+            cancelled = threading.Event()
+            if pool is not None:
+                render = asyncio.ensure_future(
+                    pool.run_streaming(audio_path, pcm_path, reserved=True, raw=True, **params)
+                )
+            else:
+                render = loop.run_in_executor(None, functools.partial(
+                    self.process_streaming, audio_path, pcm_path,
+                    should_cancel=cancelled.is_set, raw=True, **params,
+                ))
+            try:
+                yield _wav_stream_header(self.sr)
+                with open(pcm_path, "rb") as pcm:
+                    partial = b""
+                    while True:
+                        finished = render.done()
+                        data = partial + pcm.read()
+                        whole = len(data) - len(data) % 2
+                        partial = data[whole:]
+                        if whole:
+                            yield data[:whole]
+                        if finished:
+                            break
+                        await asyncio.wait({render}, timeout=STREAM_POLL_SECONDS)
+                render.result()
+            finally:
+                if not render.done():
+                    # Stop after the current block; the slot and the file stay
+                    # until the render has returned
+                    cancelled.set()
+                    if pool is not None:
+                        render.cancel()
+                    await asyncio.wait({render})
+                if not render.cancelled():
+                    render.exception()  # Retrieved; ProcessingCancelled is expected here
+                os.remove(pcm_path)
+
+    def realtime_session(
+        self,
+        pitch_shift: float = None,
+        formant_shift: float = None,
+    ) -> RealtimeVocoder:
+        """
+        Create a stateful voice changer for a live stream at self.sr.
+        
+        Tempo is not available in real time; pitch and formants match the
+        fused engine.
+        
+        Args:
+            pitch_shift: Semitones to shift
+            formant_shift: Formant scaling factor
+        
+        Returns:
+            RealtimeVocoder fed with consecutive mono blocks
+        """
+        return RealtimeVocoder(
+            pitch_shift or self.default_pitch_shift,
+            formant_shift or self.default_formant_shift,
+            n_fft=self.realtime_n_fft,
+            hop_length=self.realtime_hop_length,
+        )
+
+    def should_stream(self, audio_path: str) -> bool:
+        """Whether a file is long enough to be rendered in streaming mode."""
+        try:
+            return sf.info(audio_path).duration > self.stream_threshold_seconds
+        except RuntimeError:
+            # Format not readable block-wise, fall back to librosa.load
+            return False
+
+    def _cache_params(
+        self,
+        pitch_shift: float = None,
+        formant_shift: float = None,
+        tempo_rate: float = None,
+        mode: str = "chain",
+    ) -> dict:
+        """Effect parameters with defaults resolved, as hashed by the render cache."""
+        return {
+            "pitch_shift": pitch_shift or self.default_pitch_shift,
+            "formant_shift": formant_shift or self.default_formant_shift,
+            "tempo_rate": tempo_rate or self.default_tempo_rate,
+            "mode": mode,
+            "sr": self.sr,
+        }
+
     async def process_async(
         self,
         audio_path: str,
@@ -128,37 +834,207 @@ class TricksterAudioProcessor:
         pitch_shift: float = None,
         formant_shift: float = None,
         tempo_rate: float = None,
+        streaming: Optional[bool] = None,
+        mode: str = "chain",
     ) -> dict:
         """
         Asynchronously process audio with Trickster effect.
         
+        Rendering runs on worker_pool when one is attached (raising
+        WorkerPoolFull when its queue is full), else on the default executor.
+        With a render_cache attached, a hit returns the cached file without
+        rendering and a fresh render is moved into the cache.
+        
+        Args:
+            mode: "chain" or "fused", as in apply_trickster_effect
+            streaming: Force streaming mode on/off (default: decided by
+                stream_threshold_seconds)
+        
         Returns:
             Dict with processing results
         """
         loop = asyncio.get_event_loop()
+        pool = self.worker_pool
+        params = {
+            "pitch_shift": pitch_shift,
+            "formant_shift": formant_shift,
+            "tempo_rate": tempo_rate,
+            "mode": mode,
+        }
+        cache = self.render_cache
+        cache_key = None
         try:
-            y = await loop.run_in_executor(
-                None,
-                self.apply_trickster_effect,
-                audio_path,
-                pitch_shift,
-                formant_shift,
-                tempo_rate,
-            )
-            
-            await loop.run_in_executor(None, self.save_audio, y, output_path)
+            if cache is not None:
+                cache_key = await loop.run_in_executor(
+                    None, cache.make_key, audio_path, self._cache_params(**params)
+                )
+                cached_path = await loop.run_in_executor(None, cache.get, cache_key)
+                if cached_path is not None:
+                    info = await loop.run_in_executor(None, sf.info, cached_path)
+                    return {
+                        "success": True,
+                        "output_path": cached_path,
+                        "samples_processed": info.frames,
+                        "streaming": False,
+                        "cache_hit": True,
+                    }
+
+            if streaming is None:
+                streaming = await loop.run_in_executor(None, self.should_stream, audio_path)
+
+            if streaming and pool is not None:
+                samples = await pool.run_streaming(audio_path, output_path, **params)
+            elif streaming:
+                samples = await loop.run_in_executor(
+                    None,
+                    self.process_streaming,
+                    audio_path,
+                    output_path,
+                    pitch_shift,
+                    formant_shift,
+                    tempo_rate,
+                    mode,
+                )
+            else:
+                if pool is not None:
+                    # Take the queue slot first: a full pool rejects before any decoding
+                    with pool.reserve():
+                        y, sr = await loop.run_in_executor(None, self.load_audio, audio_path)
+                        y = await pool.run_array(y, sr, reserved=True, **params)
+                else:
+                    y = await loop.run_in_executor(
+                        None,
+                        self.apply_trickster_effect,
+                        audio_path,
+                        pitch_shift,
+                        formant_shift,
+                        tempo_rate,
+                        mode,
+                    )
+                await loop.run_in_executor(None, self.save_audio, y, output_path)
+                samples = len(y)
+
+            if cache_key is not None:
+                output_path = await loop.run_in_executor(None, cache.put, cache_key, output_path)
             
             return {
                 "success": True,
                 "output_path": output_path,
-                "samples_processed": len(y),
+                "samples_processed": samples,
+                "streaming": streaming,
+                "cache_hit": False,
             }
+        except WorkerPoolFull:
+            raise
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e),
             }
 
+    async def process_batch_async(
+        self,
+        audio_paths: List[str],
+        pitch_shift: float = None,
+        formant_shift: float = None,
+        tempo_rate: float = None,
+        mode: str = "chain",
+        output_format: str = "wav",
+    ) -> AsyncIterator[Dict]:
+        """
+        Asynchronously run apply_batch over files, writing one file per clip
+        in output_format.
+        
+        Headers are probed first: clips over the upload limits fail without
+        being decoded, and buckets are formed from the probed lengths. Each
+        bucket's clips are decoded just before it renders, so memory is
+        bounded by one bucket. Clips whose header cannot be read are decoded
+        and rendered on their own, last.
+        
+        Buckets render on worker_pool when one is attached. A result dict is
+        yielded for every clip as soon as its bucket is rendered; failures
+        (including a full worker queue) are reported per clip instead of
+        aborting the batch.
+        
+        Yields:
+            Dicts with index, success and output_path or error
+        """
+        loop = asyncio.get_event_loop()
+        params = {
+            "pitch_shift": pitch_shift,
+            "formant_shift": formant_shift,
+            "tempo_rate": tempo_rate,
+            "mode": mode,
+        }
+
+        lengths: Dict[int, int] = {}  # Probed length at self.sr
+        unprobed: List[int] = []
+        for i, path in enumerate(audio_paths):
+            metadata = await loop.run_in_executor(None, self.probe_audio, path)
+            if metadata is None:
+                unprobed.append(i)
+                continue
+            reason = self.check_limits(metadata)
+            if reason:
+                yield {"index": i, "success": False, "error": reason}
+            else:
+                lengths[i] = int(round(metadata["duration"] * self.sr))
+
+        indices = list(lengths)
+        buckets = [
+            [indices[j] for j in bucket]
+            for bucket in self.bucket_by_length(
+                [lengths[i] for i in indices], self.batch_max_clips, self.batch_bucket_ratio
+            )
+        ] + [[i] for i in unprobed]
+        sr = self.sr
+        for bucket in buckets:
+            # Decode this bucket only
+            clips: Dict[int, np.ndarray] = {}
+            for i in bucket:
+                try:
+                    y, sr = await loop.run_in_executor(None, self.load_audio, audio_paths[i])
+                    if len(y) > self.max_duration_seconds * sr:
+                        raise ValueError(
+                            f"Audio too long: {len(y) / sr:.1f}s (max {self.max_duration_seconds:.0f}s)"
+                        )
+                    clips[i] = y
+                except Exception as e:
+                    yield {"index": i, "success": False, "error": str(e)}
+            bucket = [i for i in bucket if i in clips]
+            if not bucket:
+                continue
+            try:
+                stacked = self._stack(clips, bucket)
+                if self.worker_pool is not None:
+                    rendered = await self.worker_pool.run_array(stacked, sr, **params)
+                else:
+                    rendered = await loop.run_in_executor(
+                        None, self.process_array, stacked, sr,
+                        pitch_shift, formant_shift, tempo_rate, mode,
+                    )
+            except Exception as e:
+                for i in bucket:
+                    yield {"index": i, "success": False, "error": str(e)}
+                continue
+
+            for i, y in self._unstack(clips, bucket, rendered, tempo_rate):
+                try:
+                    suffix = OUTPUT_FORMATS[output_format]["extension"]
+                    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                        output_path = tmp.name
+                    await loop.run_in_executor(
+                        None, self.save_audio, y, output_path, sr, output_format
+                    )
+                    result = {
+                        "index": i,
+                        "success": True,
+                        "output_path": output_path,
+                        "samples_processed": len(y),
+                    }
+                except Exception as e:
+                    result = {"index": i, "success": False, "error": str(e)}
+                yield result
 
 # Singleton instance
 processor = TricksterAudioProcessor()
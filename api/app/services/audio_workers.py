@@ -0,0 +1,250 @@
+"""
+Audio Worker Pool
+
+Dedicated process pool for CPU-heavy Trickster rendering. librosa/numpy work
+holds the GIL and fights over BLAS threads, so running it on the event loop's
+default thread pool does not scale with concurrent requests.
+
+- Workers are spawned once at startup and pre-import librosa/numpy (warm JIT)
+- Audio travels through shared memory; only names and sizes are pickled
+- The number of queued jobs is bounded; callers get WorkerPoolFull instead.
+  A slot is claimed before any shared memory is allocated, and callers can
+  reserve() one before their own preparation (e.g. decoding the input)
+- A cancelled caller sets a flag in shared memory the worker polls between
+  stages, so abandoned jobs stop early; the slot and the shared memory are
+  released once the worker has stopped
+"""
+
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Shared input buffers start with a one-byte control header (cancel flag)
+# padded to keep the float32 payload aligned
+_HEADER = 8
+
+
+class WorkerPoolFull(Exception):
+    """Raised when the worker pool queue is at capacity."""
+
+
+# ==================== WORKER SIDE ====================
+
+def _init_worker(processor_config: Dict) -> None:
+    """Configure the worker's processor and warm up librosa/numba."""
+    import librosa  # noqa: F401  (pre-import in the worker)
+    from app.services.audio_processor import processor
+
+    for name, value in processor_config.items():
+        setattr(processor, name, value)
+
+    warm = np.random.RandomState(0).randn(processor.sr // 2).astype(np.float32) * 0.1
+    processor.process_array(warm, processor.sr, mode="chain")
+    processor.process_array(warm, processor.sr, mode="fused")
+
+
+def _run_array_job(
+    in_name: str,
+    shape: Tuple[int, ...],
+    out_name: str,
+    capacity: int,
+    sr: int,
+    params: Dict,
+) -> int:
+    """
+    Render a waveform (or a stack of clips) from shared memory into a shared
+    output buffer of shape shape[:-1] + (capacity,). Returns samples per row.
+    """
+    from app.services.audio_processor import processor
+
+    inp = SharedMemory(name=in_name)
+    out = SharedMemory(name=out_name)
+    try:
+        # Copy out rather than keep a view: no buffer export may outlive the
+        # job, or close() fails and the mapping leaks in this long-lived worker
+        y = np.frombuffer(
+            inp.buf, dtype=np.float32, count=int(np.prod(shape)), offset=_HEADER
+        ).reshape(shape).copy()
+        result = processor.process_array(
+            y, sr, should_cancel=lambda: inp.buf[0] != 0, **params
+        )
+        n_out = min(result.shape[-1], capacity)
+        rows = np.zeros(shape[:-1] + (capacity,), dtype=np.float32)
+        rows[..., :n_out] = result[..., :n_out]
+        out.buf[:rows.nbytes] = rows.tobytes()
+        return n_out
+    finally:
+        inp.close()
+        out.close()
+
+
+def _run_streaming_job(ctrl_name: str, audio_path: str, output_path: str, params: Dict) -> int:
+    """Render a file to a file in streaming mode (no audio crosses processes)."""
+    from app.services.audio_processor import processor
+
+    ctrl = SharedMemory(name=ctrl_name)
+    try:
+        return processor.process_streaming(
+            audio_path, output_path, should_cancel=lambda: ctrl.buf[0] != 0, **params
+        )
+    finally:
+        ctrl.close()
+
+
+# ==================== PARENT SIDE ====================
+
+class AudioWorkerPool:
+    """
+    Bounded process pool for Trickster jobs
+
+    At most `max_workers` jobs run at once and `max_queue` more may wait;
+    anything beyond that is rejected with WorkerPoolFull (HTTP 429).
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 8):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.stats = {"completed": 0, "failed": 0, "rejected": 0, "cancelled": 0}
+
+    @property
+    def pending(self) -> int:
+        """Jobs running or waiting"""
+        return self._pending
+
+    def start(self, processor_config: Optional[Dict] = None) -> None:
+        """Spawn the worker processes."""
+        if self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(processor_config or {},),
+        )
+        # Start every worker now so warm-up does not land on the first request
+        for _ in range(self.max_workers):
+            self._executor.submit(int)
+        logger.info(f"Audio worker pool started ({self.max_workers} workers, queue {self.max_queue})")
+
+    def shutdown(self) -> None:
+        """Stop the workers, cancelling queued jobs."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.info("Audio worker pool stopped")
+
+    @contextlib.contextmanager
+    def reserve(self):
+        """
+        Claim a queue slot for the duration of the block.
+
+        Raises WorkerPoolFull right away when the queue is full, so callers
+        can reserve before expensive preparation and pass reserved=True to
+        the run_* call made inside the block.
+        """
+        if self._executor is None:
+            raise RuntimeError("Audio worker pool is not running")
+        if self._pending >= self.max_workers + self.max_queue:
+            self.stats["rejected"] += 1
+            raise WorkerPoolFull(f"Audio worker queue full ({self._pending} jobs pending)")
+        self._pending += 1
+        try:
+            yield
+        finally:
+            self._pending -= 1
+
+    async def run_array(self, y: np.ndarray, sr: int, reserved: bool = False, **params) -> np.ndarray:
+        """
+        Render a waveform in a worker.
+
+        Args:
+            y: Audio waveform, or a stack of equal-length clips (n_clips, n)
+            sr: Sample rate
+            reserved: The caller already holds a slot from reserve()
+            **params: pitch_shift, formant_shift, tempo_rate, mode
+
+        Returns:
+            Processed audio waveform
+        """
+        with contextlib.nullcontext() if reserved else self.reserve():
+            rate = params.get("tempo_rate") or 1.0
+            y = np.ascontiguousarray(y, dtype=np.float32)
+            capacity = int(np.ceil(y.shape[-1] / min(rate, 1.0))) + 1
+            out_shape = y.shape[:-1] + (capacity,)
+            inp = self._alloc(y.nbytes + _HEADER)
+            out = self._alloc(int(np.prod(out_shape)) * 4)
+            try:
+                inp.buf[_HEADER:_HEADER + y.nbytes] = y.tobytes()
+                n_out = await self._submit(
+                    inp, _run_array_job, inp.name, y.shape, out.name, capacity, sr, params
+                )
+                return np.frombuffer(
+                    out.buf, dtype=np.float32, count=int(np.prod(out_shape))
+                ).reshape(out_shape)[..., :n_out].copy()
+            finally:
+                self._free(inp)
+                self._free(out)
+
+    async def run_streaming(self, audio_path: str, output_path: str, reserved: bool = False, **params) -> int:
+        """Render a file in streaming mode in a worker, returns samples written."""
+        with contextlib.nullcontext() if reserved else self.reserve():
+            ctrl = self._alloc(_HEADER)
+            try:
+                return await self._submit(ctrl, _run_streaming_job, ctrl.name, audio_path, output_path, params)
+            finally:
+                self._free(ctrl)
+
+    async def _submit(self, ctrl: SharedMemory, fn, *args):
+        # Runs under a slot from reserve()
+        future = self._executor.submit(fn, *args)
+        try:
+            result = await asyncio.wrap_future(future)
+            self.stats["completed"] += 1
+            return result
+        except asyncio.CancelledError:
+            # Drop it if still queued, otherwise ask the worker to stop and
+            # wait until it has: it uses the shared segments (and the slot)
+            # until then
+            if not future.cancel():
+                ctrl.buf[0] = 1
+                await self._wait_stopped(future)
+            self.stats["cancelled"] += 1
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+
+    @staticmethod
+    async def _wait_stopped(future) -> None:
+        waiter = asyncio.wrap_future(future)
+        while not waiter.done():
+            try:
+                await asyncio.wait({waiter})
+            except asyncio.CancelledError:
+                pass  # Already cancelling; the caller re-raises
+        if not waiter.cancelled():
+            waiter.exception()  # Retrieved; ProcessingCancelled is expected
+
+    @staticmethod
+    def _alloc(size: int) -> SharedMemory:
+        # New segments are zero-filled, so the cancel flag starts cleared
+        return SharedMemory(create=True, size=max(size, 1))
+
+    @staticmethod
+    def _free(shm: SharedMemory) -> None:
+        shm.close()
+        shm.unlink()
+
+
+# Singleton instance (started from the application lifespan)
+worker_pool = AudioWorkerPool()
@@ -0,0 +1,259 @@
+"""
+Embedding Provider - Batched, cached text embeddings
+
+EmbeddingProvider sits in front of an embedding backend:
+- Request coalescing: embed() calls arriving within `batch_window_ms` of each
+  other are sent to the backend as one batch (identical texts only once)
+- Two cache tiers keyed by a hash of the text: an in-process LRU and an
+  optional size-bounded on-disk .npy store (a RenderCache) that survives
+  restarts
+- Vectors are float32 numpy arrays (read-only, as they are shared)
+
+Backends:
+- HashingEmbeddingBackend: deterministic hashing-trick embeddings of words
+  and character trigrams, for offline use and tests (no network, no model)
+- OpenAIEmbeddingBackend: OpenAI embeddings API (needs the openai package)
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import tempfile
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.services.audio_cache import RenderCache
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class EmbeddingBackend:
+    """Turns a batch of texts into an (n, dim) float32 matrix"""
+
+    name = "backend"
+    dim = 0
+
+    async def embed_batch(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Feature-hashing embeddings
+
+    Every lowercased word and every character trigram of a word is hashed to
+    a signed bucket; the bucket counts are L2-normalised. Texts sharing words
+    get high cosine similarity, which is enough for offline ranking.
+    """
+
+    name = "hashing-v1"
+
+    def __init__(self, dim: int = 1536, trigram_weight: float = 0.5):
+        self.dim = dim
+        self.trigram_weight = trigram_weight
+
+    def _features(self, text: str) -> Tuple[List[int], List[float]]:
+        buckets, weights = [], []
+        for word in _TOKEN_RE.findall(text.lower()):
+            features = [(f"w:{word}", 1.0)]
+            padded = f"<{word}>"
+            features += [(f"c:{padded[i:i + 3]}", self.trigram_weight) for i in range(len(padded) - 2)]
+            for feature, weight in features:
+                h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                buckets.append(h % self.dim)
+                weights.append(weight if (h >> 63) & 1 else -weight)
+        return buckets, weights
+
+    def embed_sync(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets, weights = self._features(text)
+            if buckets:
+                np.add.at(out[row], buckets, weights)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+    async def embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """OpenAI embeddings API; one request per batch"""
+
+    def __init__(self, api_key: str, model: str = "text-embedding-3-small", dim: int = 1536):
+        from openai import AsyncOpenAI  # Optional dependency
+
+        self.client = AsyncOpenAI(api_key=api_key)
+        self.model = model
+        self.dim = dim
+        self.name = f"openai:{model}:{dim}"
+
+    async def embed_batch(self, texts: List[str]) -> np.ndarray:
+        response = await self.client.embeddings.create(model=self.model, input=texts)
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+
+class EmbeddingProvider:
+    """
+    Coalescing, caching front end for an EmbeddingBackend
+
+    Args:
+        backend: Embedding backend
+        batch_window_ms: How long the first request of a batch waits for others
+        max_batch_size: A batch is sent as soon as it reaches this size
+        cache_size: Entries kept in the in-process LRU
+        cache_dir: Directory for the on-disk cache (None disables it)
+        cache_max_bytes: Size bound of the on-disk cache (least recently used
+            vectors are evicted)
+    """
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        batch_window_ms: float = 5.0,
+        max_batch_size: int = 256,
+        cache_size: int = 10000,
+        cache_dir: Optional[str] = None,
+        cache_max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.backend = backend
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self.disk_cache = RenderCache(cache_dir, cache_max_bytes, suffix=".npy") if cache_dir else None
+
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._queue: Dict[str, Tuple[str, asyncio.Future]] = {}  # key -> (text, future)
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()  # Full batches being sent
+        self.stats = {
+            "requests": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "coalesced": 0,
+            "backend_calls": 0,
+            "backend_texts": 0,
+        }
+
+    @property
+    def dim(self) -> int:
+        return self.backend.dim
+
+    def key(self, text: str) -> str:
+        """Cache key: backend identity plus a hash of the text"""
+        return hashlib.sha256(f"{self.backend.name}\0{text}".encode()).hexdigest()
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text (batched with concurrent callers)."""
+        self.stats["requests"] += 1
+        key = self.key(text)
+
+        vector = self._cache_get(key)
+        if vector is not None:
+            self.stats["memory_hits"] += 1
+            return vector
+        if self.disk_cache is not None:
+            vector = await asyncio.get_running_loop().run_in_executor(None, self._disk_get, key)
+            if vector is not None:
+                self.stats["disk_hits"] += 1
+                self._cache_put(key, vector)
+                return vector
+
+        if key in self._queue:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self._queue[key][1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue[key] = (text, future)
+        if len(self._queue) >= self.max_batch_size:
+            # Flush in its own task: cancelling this caller must not strand
+            # the other callers waiting on the batch
+            flush = asyncio.ensure_future(self._flush())
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+        elif self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_after(self.batch_window_ms / 1000.0))
+        return await asyncio.shield(future)
+
+    async def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed several texts; returns an (n, dim) matrix in input order."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack(await asyncio.gather(*(self.embed(t) for t in texts)))
+
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self._flush()
+
+    async def _flush(self) -> None:
+        if not self._queue:
+            return
+        batch, self._queue = self._queue, {}
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        keys = list(batch)
+        texts = [batch[k][0] for k in keys]
+        self.stats["backend_calls"] += 1
+        self.stats["backend_texts"] += len(texts)
+        try:
+            vectors = await self.backend.embed_batch(texts)
+        except Exception as e:
+            for key in keys:
+                if not batch[key][1].done():
+                    batch[key][1].set_exception(e)
+            return
+        except asyncio.CancelledError:
+            # Cancelled mid-call: waiters get CancelledError instead of hanging
+            for key in keys:
+                batch[key][1].cancel()
+            raise
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors.setflags(write=False)
+        for key, vector in zip(keys, vectors):
+            self._cache_put(key, vector)
+            if not batch[key][1].done():
+                batch[key][1].set_result(vector)
+        if self.disk_cache is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._disk_put_many, keys, vectors
+            )
+
+    def _cache_get(self, key: str) -> Optional[np.ndarray]:
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+        return vector
+
+    def _cache_put(self, key: str, vector: np.ndarray) -> None:
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        path = self.disk_cache.get(key)
+        if path is None:
+            return None
+        try:
+            vector = np.load(path)
+        except (OSError, ValueError):
+            return None  # Truncated or evicted underneath us
+        vector.setflags(write=False)
+        return vector
+
+    def _disk_put_many(self, keys: List[str], vectors: np.ndarray) -> None:
+        for key, vector in zip(keys, vectors):
+            with tempfile.NamedTemporaryFile(suffix=".tmp", dir=self.cache_dir, delete=False) as f:
+                np.save(f, vector)
+            self.disk_cache.put(key, f.name)
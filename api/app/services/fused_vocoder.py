@@ -0,0 +1,251 @@
+"""
+Fused Phase Vocoder
+
+Single analysis/synthesis pass for the Trickster effect. One STFT of the input
+is time-scaled, pitch-shifted and formant-warped in the frequency domain and
+resynthesised with one ISTFT:
+- Tempo: frames are read at `rate` frames per output frame (phase vocoder)
+- Pitch: harmonics are moved by remapping bins with scaled phase advance
+- Formants: the cepstral spectral envelope is warped independently of pitch
+
+Inputs may carry leading batch axes (..., n_samples); every clip in a batch
+is processed by the same vectorised STFT, as librosa does for multichannel.
+
+RealtimeVocoder is the stateful, frame-by-frame variant of the same pitch and
+formant processing for live audio (no tempo change): phase state is carried
+between calls, so a stream can be fed in arbitrary block sizes.
+"""
+
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+import librosa
+
+
+@lru_cache(maxsize=16)
+def _cepstral_basis(n_bins: int, n_lifter: int, warp: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cosine bases for the low-quefrency cepstrum of a one-sided spectrum.
+
+    Returns (analysis, synthesis) so that `analysis @ log_mag` gives the first
+    n_lifter cepstral coefficients and `synthesis @ cepstrum` the smoothed log
+    spectrum read at bin k / warp (held at its Nyquist value beyond that).
+    """
+    n_fft = 2 * (n_bins - 1)
+    k = np.arange(n_bins)
+    q = np.arange(n_lifter)
+
+    weights = np.full(n_bins, 2.0)
+    weights[[0, -1]] = 1.0
+    analysis = np.cos(2.0 * np.pi * np.outer(q, k) / n_fft) * weights / n_fft
+
+    src = np.minimum(k / warp, n_bins - 1)
+    synthesis = np.cos(2.0 * np.pi * np.outer(src, q) / n_fft) * np.where(q == 0, 1.0, 2.0)
+    return analysis.astype(np.float32), synthesis.astype(np.float32)
+
+
+def spectral_envelope(mag: np.ndarray, n_lifter: int = 40) -> np.ndarray:
+    """
+    Estimate the spectral envelope of every frame by cepstral liftering.
+
+    Args:
+        mag: Magnitude spectrogram (..., 1 + n_fft/2, n_frames)
+        n_lifter: Number of low-quefrency cepstral coefficients kept
+
+    Returns:
+        Smooth envelope with the same shape as mag
+    """
+    analysis, synthesis = _cepstral_basis(mag.shape[-2], n_lifter)
+    return np.exp(synthesis @ (analysis @ np.log(mag + 1e-8)))
+
+
+def _warp_bins(x: np.ndarray, factor: float) -> np.ndarray:
+    """
+    Resample along frequency (axis -2) so content at bin k moves to k*factor.
+    Bins whose source lies above Nyquist are set to zero.
+    """
+    n_bins = x.shape[-2]
+    src = np.arange(n_bins) / factor
+    idx = np.floor(src).astype(int)
+    frac = (src - idx).astype(x.dtype)[:, None]
+    valid = idx < n_bins - 1
+    idx = np.minimum(idx, n_bins - 2)
+    out = x[..., idx, :]
+    out += frac * (x[..., idx + 1, :] - out)
+    out[..., ~valid, :] = 0.0
+    return out
+
+
+def fused_pitch_formant_tempo(
+    y: np.ndarray,
+    n_steps: float,
+    formant_factor: float,
+    rate: float,
+    n_fft: int = 2048,
+    hop_length: int = 512,
+    n_lifter: int = 40,
+) -> np.ndarray:
+    """
+    Apply pitch shift, formant warp and tempo change in one STFT/ISTFT pass.
+
+    Args:
+        y: Audio waveform (..., n_samples)
+        n_steps: Semitones to shift the pitch (formants are kept in place)
+        formant_factor: Spectral envelope scaling (0.65 = lower formants)
+        rate: Tempo rate (1.1 = 10% faster)
+        n_fft: FFT size
+        hop_length: Analysis and synthesis hop
+        n_lifter: Cepstral coefficients kept for the envelope
+
+    Returns:
+        Processed audio of length n_samples / rate
+    """
+    pitch_factor = 2.0 ** (n_steps / 12.0)
+    window = "hann"
+    D = librosa.stft(y.astype(np.float32), n_fft=n_fft, hop_length=hop_length, window=window)
+    n_bins, n_frames = D.shape[-2:]
+    D = np.pad(D, [(0, 0)] * (D.ndim - 1) + [(0, 2)])
+    mag_all = np.abs(D)
+    phase_all = np.angle(D)
+
+    # Tempo: fractional analysis positions, one per synthesis frame
+    steps = np.arange(0, n_frames, rate)
+    left = steps.astype(int)
+    alpha = (steps - left).astype(np.float32)[None, :]
+    mag = mag_all[..., left]
+    mag += alpha * (mag_all[..., left + 1] - mag)
+
+    # Instantaneous frequency as phase advance per hop
+    expected = (2.0 * np.pi * hop_length / n_fft * np.arange(n_bins)).astype(np.float32)
+    advance = phase_all[..., left + 1] - phase_all[..., left] - expected[:, None]
+    advance = np.mod(advance + np.pi, 2.0 * np.pi) - np.pi
+    advance += expected[:, None]
+
+    # Pitch: move the harmonics together with their phase advance. The
+    # envelope they carry is divided out and replaced by the original envelope
+    # warped by formant_factor, so pitch and formants move independently.
+    analysis, _ = _cepstral_basis(n_bins, n_lifter)
+    _, env_pitch = _cepstral_basis(n_bins, n_lifter, pitch_factor)
+    _, env_formant = _cepstral_basis(n_bins, n_lifter, formant_factor)
+    cepstrum = analysis @ np.log(mag + 1e-8)
+    mag = _warp_bins(mag, pitch_factor)
+    mag *= np.exp(np.clip((env_formant - env_pitch) @ cepstrum, -20.0, 20.0))
+    advance = _warp_bins(advance, pitch_factor) * pitch_factor
+
+    # Accumulate wrapped advances so float32 phase keeps its precision
+    advance[..., 1:] = np.mod(advance[..., :-1] + np.pi, 2.0 * np.pi) - np.pi
+    advance[..., 0] = phase_all[..., 0]
+    phase = np.cumsum(advance, axis=-1)
+
+    S = np.empty(mag.shape, dtype=np.complex64)
+    np.multiply(mag, np.cos(phase), out=S.real)
+    np.multiply(mag, np.sin(phase), out=S.imag)
+    length = int(round(y.shape[-1] / rate))
+    return librosa.istft(S, hop_length=hop_length, window=window, length=length).astype(np.float32)
+
+
+class RealtimeVocoder:
+    """
+    Streaming pitch/formant shifter with fixed algorithmic latency
+
+    Input is consumed in hops; each hop adds one windowed frame to an
+    overlap-add buffer. Output is delayed by exactly `latency_samples`
+    (n_fft) and every call returns as many samples as it was given.
+    """
+
+    def __init__(
+        self,
+        n_steps: float,
+        formant_factor: float,
+        n_fft: int = 512,
+        hop_length: int = 128,
+        n_lifter: int = 20,
+    ):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_lifter = n_lifter
+        self.n_bins = n_fft // 2 + 1
+
+        self.window = librosa.filters.get_window("hann", n_fft, fftbins=True).astype(np.float32)
+        # Squared-window overlap sum is constant for hann at hop <= n_fft/4
+        self._norm = np.float32(np.sum(self.window ** 2) / hop_length)
+        self._expected = (2.0 * np.pi * hop_length / n_fft * np.arange(self.n_bins)).astype(np.float32)
+
+        self._frame = np.zeros(n_fft, dtype=np.float32)        # last n_fft input samples
+        self._pending = np.zeros(0, dtype=np.float32)          # input short of a full hop
+        self._overlap = np.zeros(n_fft, dtype=np.float32)      # overlap-add accumulator
+        self._output = np.zeros(hop_length, dtype=np.float32)  # ready samples (primed)
+        self._prev_phase = np.zeros(self.n_bins, dtype=np.float32)
+        self._synth_phase = np.zeros(self.n_bins, dtype=np.float32)
+
+        self.set_params(n_steps, formant_factor)
+
+    @property
+    def latency_samples(self) -> int:
+        """Delay between an input sample and its processed output"""
+        return self.n_fft
+
+    def set_params(self, n_steps: float, formant_factor: float) -> None:
+        """Change pitch/formant settings without resetting phase state."""
+        if formant_factor <= 0:
+            raise ValueError(f"formant_factor must be positive, got {formant_factor}")
+        self.n_steps = n_steps
+        self.formant_factor = formant_factor
+        self._pitch_factor = 2.0 ** (n_steps / 12.0)
+        analysis, _ = _cepstral_basis(self.n_bins, self.n_lifter)
+        _, env_pitch = _cepstral_basis(self.n_bins, self.n_lifter, self._pitch_factor)
+        _, env_formant = _cepstral_basis(self.n_bins, self.n_lifter, formant_factor)
+        # Log magnitude -> log envelope correction in a single matrix
+        self._envelope_shift = (env_formant - env_pitch) @ analysis
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        """
+        Process the next block of a mono stream.
+
+        Args:
+            x: Input samples (any length)
+
+        Returns:
+            The same number of processed samples, delayed by latency_samples
+        """
+        hop = self.hop_length
+        data = np.concatenate([self._pending, np.asarray(x, dtype=np.float32)])
+        n_hops = len(data) // hop
+        produced = [self._output]
+        for i in range(n_hops):
+            produced.append(self._process_hop(data[i * hop:(i + 1) * hop]))
+        self._pending = data[n_hops * hop:]
+
+        ready = np.concatenate(produced)
+        self._output = ready[len(x):]
+        return ready[:len(x)]
+
+    def _process_hop(self, samples: np.ndarray) -> np.ndarray:
+        hop = self.hop_length
+        self._frame[:-hop] = self._frame[hop:]
+        self._frame[-hop:] = samples
+
+        spectrum = np.fft.rfft(self._frame * self.window)
+        mag = np.abs(spectrum).astype(np.float32)
+        phase = np.angle(spectrum).astype(np.float32)
+
+        advance = phase - self._prev_phase - self._expected
+        advance = np.mod(advance + np.pi, 2.0 * np.pi) - np.pi + self._expected
+        self._prev_phase = phase
+
+        # Same envelope handling as the offline engine, one frame at a time
+        correction = self._envelope_shift @ np.log(mag + 1e-8)
+        if self._pitch_factor != 1.0:
+            mag = _warp_bins(mag[:, None], self._pitch_factor)[:, 0]
+            advance = _warp_bins(advance[:, None], self._pitch_factor)[:, 0] * self._pitch_factor
+        mag *= np.exp(np.clip(correction, -20.0, 20.0))
+
+        self._synth_phase = np.mod(self._synth_phase + advance + np.pi, 2.0 * np.pi) - np.pi
+        frame = np.fft.irfft(mag * np.exp(1j * self._synth_phase), n=self.n_fft).astype(np.float32)
+
+        self._overlap += frame * self.window / self._norm
+        out = self._overlap[:hop].copy()
+        self._overlap[:-hop] = self._overlap[hop:]
+        self._overlap[-hop:] = 0.0
+        return out
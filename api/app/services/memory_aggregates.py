@@ -0,0 +1,57 @@
+"""
+Memory Aggregates - Incrementally maintained per-user memory statistics
+
+Both memory engines update a UserAggregates on every stored memory (O(1)):
+counts per memory type and per emotion, a bounded ring buffer of the most
+recent contents per type, and the last interaction time. Profile and
+emotional-response lookups read these instead of scanning the history.
+"""
+
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+
+class UserAggregates:
+    """
+    Running counters and recent-N buffers for one user
+
+    Args:
+        recent_size: Contents kept per memory type (oldest dropped first)
+    """
+
+    __slots__ = ("recent_size", "total", "type_counts", "emotion_counts", "recent", "last_interaction")
+
+    def __init__(self, recent_size: int = 50):
+        self.recent_size = recent_size
+        self.total = 0
+        self.type_counts: Dict[str, int] = {}
+        self.emotion_counts: Dict[str, int] = {}
+        self.recent: Dict[str, Deque[str]] = {}
+        self.last_interaction: Optional[float] = None  # Epoch seconds
+
+    def record(
+        self,
+        memory_type: str,
+        content: str,
+        timestamp: float,
+        emotion: Optional[str] = None,
+    ) -> None:
+        """Account for a newly stored memory."""
+        self.count(memory_type, emotion, 1)
+        buffer = self.recent.get(memory_type)
+        if buffer is None:
+            buffer = self.recent[memory_type] = deque(maxlen=self.recent_size)
+        buffer.append(content)
+        if self.last_interaction is None or timestamp > self.last_interaction:
+            self.last_interaction = timestamp
+
+    def count(self, memory_type: str, emotion: Optional[str], delta: int) -> None:
+        """Adjust the counters only (delta=-1 when a memory is merged away)."""
+        self.total += delta
+        self.type_counts[memory_type] = self.type_counts.get(memory_type, 0) + delta
+        if emotion is not None:
+            self.emotion_counts[emotion] = self.emotion_counts.get(emotion, 0) + delta
+
+    def recent_contents(self, memory_type: str) -> List[str]:
+        """Most recent contents of a type, oldest first."""
+        return list(self.recent.get(memory_type, ()))
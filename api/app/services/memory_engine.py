@@ -4,22 +4,93 @@ Integrates with Pinecone/Weaviate for vector similarity search
 Enables the Avatar to "remember" and bond with users
 """
 
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 import asyncio
+import sys
 from datetime import datetime, timedelta
-from dataclasses import dataclass
 
-@dataclass
+import numpy as np
+
+from app.services.embeddings import EmbeddingProvider, HashingEmbeddingBackend
+from app.services.memory_aggregates import UserAggregates
+from app.services.memory_shards import MemoryShardClient
+from app.services.memory_store import MemoryStore
+from app.services.recall_cache import RecallCache
+from app.services.recall_scheduler import RecallScheduler
+from app.services.vector_store import CodeTable, UserVectorStore, VectorMatrix, top_k_indices
+
+# Enumerations stored as small-int codes (unknown values are appended)
+MEMORY_TYPES = CodeTable(['note', 'reminder', 'birthday', 'event', 'preference'])
+EMOTIONS = CodeTable(['happy', 'sad', 'angry', 'afraid', 'surprised', 'calm'])
+
+
 class Memory:
-    id: str
-    user_id: str
-    summary: str
-    full_text: str
-    emotion_detected: str
-    emotion_confidence: float
-    memory_type: str
-    created_at: datetime
-    recalled_count: int = 0
+    """
+    Slotted memory record
+    
+    The embedding lives in the engine's vector store; memory_type and
+    emotion_detected are kept as MEMORY_TYPES / EMOTIONS codes and
+    created_at as epoch seconds (created_ts).
+    """
+    __slots__ = (
+        "id", "user_id", "summary", "full_text", "emotion_code",
+        "emotion_confidence", "type_code", "created_ts", "recalled_count",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        user_id: str,
+        summary: str,
+        full_text: str,
+        emotion_detected: str,
+        emotion_confidence: float,
+        memory_type: str,
+        created_at: Union[datetime, float],
+        recalled_count: int = 0,
+    ):
+        self.id = id
+        self.user_id = sys.intern(user_id)
+        self.summary = summary
+        self.full_text = full_text
+        self.emotion_code = EMOTIONS.code(emotion_detected)
+        self.emotion_confidence = emotion_confidence
+        self.type_code = MEMORY_TYPES.code(memory_type)
+        self.created_ts = created_at.timestamp() if isinstance(created_at, datetime) else float(created_at)
+        self.recalled_count = recalled_count
+
+    @property
+    def emotion_detected(self) -> str:
+        return EMOTIONS.name(self.emotion_code)
+
+    @emotion_detected.setter
+    def emotion_detected(self, emotion: str) -> None:
+        self.emotion_code = EMOTIONS.code(emotion)
+
+    @property
+    def memory_type(self) -> str:
+        return MEMORY_TYPES.name(self.type_code)
+
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromtimestamp(self.created_ts)
+
+    def to_dict(self) -> Dict:
+        """Plain field dict (the layout persisted by memory_store)"""
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "summary": self.summary,
+            "full_text": self.full_text,
+            "emotion_detected": self.emotion_detected,
+            "emotion_confidence": self.emotion_confidence,
+            "memory_type": self.memory_type,
+            "created_at": self.created_at,
+            "recalled_count": self.recalled_count,
+        }
+
+    def __repr__(self) -> str:
+        return f"Memory({self.id!r}, {self.memory_type!r}, {self.summary[:40]!r})"
 
 class MemoryEngine:
     """
@@ -30,6 +101,18 @@ class MemoryEngine:
     - Emotional context preservation
     - Proactive recall (birthdays, important dates)
     - Memory consolidation (merging related memories)
+    
+    Embeddings are kept per user in a UserVectorStore, so recall scores all
+    of a user's memories with one vectorised similarity + time-decay pass.
+    With a persistent MemoryStore attached, memories are also written there
+    (batched) and recall is ranked by the store, across all workers. Before
+    consolidation, proactive recall or emotional synthesis, a user's
+    in-process state is checked against the store's version of the user and
+    rebuilt from the store when another worker (or an earlier process) has
+    changed it, so consolidation, reminders and aggregates see every
+    worker's memories. Consolidation archives merged memories in the store.
+    With a MemoryShardClient attached, the public methods run on the shard
+    process that owns the user instead (see memory_shards.py).
     """
 
     def __init__(self):
@@ -37,6 +120,18 @@ class MemoryEngine:
         self.embedding_dimension = 1536  # OpenAI embedding size
         self.max_memories_per_user = 10000
         self.importance_threshold = 0.5
+        self.vector_store = UserVectorStore(self.embedding_dimension)
+        # Local hashing backend by default; main.py swaps in OpenAI when configured
+        self.embedding_provider = EmbeddingProvider(HashingEmbeddingBackend(self.embedding_dimension))
+        self.ann_candidates = 4  # Shortlist size per result for indexed users
+        self.consolidation_threshold = 0.8  # Cosine similarity for merging
+        self._consolidated_rows: Dict[str, int] = {}  # user_id -> rows checked by the last run
+        self._user_locks: Dict[str, asyncio.Lock] = {}  # Held while a user's state is rebuilt or consolidated
+        self.store: Optional[MemoryStore] = None  # Persistent backend, set by main.py
+        self._store_versions: Dict[str, Tuple[int, int]] = {}  # user_id -> store version the state matches
+        self.aggregates: Dict[str, UserAggregates] = {}  # Per-user counts, updated on store
+        self.recall_cache = RecallCache()  # Invalidated on store and consolidation
+        self.shards: Optional[MemoryShardClient] = None  # Set by main.py when sharded
         
         # Proactive recall triggers
         self.recall_triggers = {
@@ -45,6 +140,7 @@ class MemoryEngine:
             'event': 168,  # Remind 7 days before
             'reminder': 24,
         }
+        self.recall_scheduler = RecallScheduler(self.recall_triggers)
 
     async def store_memory(
         self,
@@ -65,6 +161,15 @@ class MemoryEngine:
         5. Check for consolidation opportunities
         """
         
+        if self.shards is not None:
+            return await self.shards.call(
+                user_id, "memory", "store_memory", user_id, text, memory_type, emotion, emotion_confidence
+            )
+        
+        if self.store is not None:
+            if not self.store.valid_user_id(user_id):
+                raise ValueError(f"Memory store cannot hold memories for user_id {user_id!r}")
+        
         # Extract key information
         summary = await self._extract_summary(text)
         
@@ -76,21 +181,30 @@ class MemoryEngine:
             emotion, emotion_confidence = await self._detect_emotion(text)
         
         # Create memory object (would save to database)
+        now = datetime.now().timestamp()
         memory = Memory(
-            id=f"mem_{user_id}_{datetime.now().timestamp()}",
+            id=self.store.new_id(user_id, now) if self.store is not None else f"mem_{user_id}_{now}",
             user_id=user_id,
             summary=summary,
             full_text=text,
             emotion_detected=emotion,
             emotion_confidence=emotion_confidence,
             memory_type=memory_type,
-            created_at=datetime.now(),
+            created_at=now,
         )
         
         # Store in memory
-        if user_id not in self.memories:
-            self.memories[user_id] = []
-        self.memories[user_id].append(memory)
+        if self.store is not None:
+            async with self._user_lock(user_id):
+                await self.store.add(memory.to_dict(), embedding)
+                self._remember(user_id, memory, embedding)
+                # Our own write: the state still matches the store
+                version = self._store_versions.get(user_id)
+                if version is not None:
+                    self._store_versions[user_id] = (version[0] + 1, version[1])
+        else:
+            self._remember(user_id, memory, embedding)
+        self.recall_cache.invalidate(user_id)
         
         # Check for consolidation with existing memories
         await self._consolidate_memories(user_id, memory)
@@ -119,37 +233,72 @@ class MemoryEngine:
             List of (Memory, relevance_score) tuples
         """
         
-        if user_id not in self.memories:
-            return []
+        if self.shards is not None:
+            return await self.shards.call(user_id, "memory", "recall_memory", user_id, query, top_k, time_weight)
+        
+        if self.store is None:
+            matrix = self.vector_store.get(user_id)
+            if matrix is None or not len(matrix):
+                return []
         
         # Generate embedding for query
         query_embedding = await self._generate_embedding(query)
         
-        # Find similar memories using vector similarity
-        memories = self.memories[user_id]
-        scored_memories = []
-        
-        for memory in memories:
-            # Vector similarity (cosine)
-            similarity = await self._cosine_similarity(
+        # Near-identical queries since the user's last write reuse the result
+        key = self.recall_cache.key(query_embedding, top_k, time_weight)
+        generation = self.recall_cache.generation(user_id)  # Writes during the search make the result stale
+        cached = self.recall_cache.get(user_id, key)
+        if cached is not None:
+            return list(cached)
+        
+        if self.store is not None:
+            # Similarity and time decay are ranked in SQL
+            results = await self.store.search(
+                user_id,
                 query_embedding,
-                memory.id  # Would get from vector DB
+                top_k=top_k,
+                time_weight=time_weight,
+                candidates=top_k * self.ann_candidates,
             )
-            
-            # Time decay (older = lower score)
-            days_old = (datetime.now() - memory.created_at).days
-            time_score = 1.0 / (1.0 + (time_weight * days_old))
-            
-            # Combined score
-            final_score = (similarity * 0.7) + (time_score * 0.3)
-            
-            scored_memories.append((memory, final_score))
+            results = [(Memory(**record), score) for record, score in results]
+        else:
+            results = self._rank(user_id, matrix, query_embedding, top_k, time_weight)
+        self.recall_cache.put(user_id, key, results, generation)
+        return list(results)
+
+    def _rank(
+        self,
+        user_id: str,
+        matrix: VectorMatrix,
+        query_embedding: np.ndarray,
+        top_k: int,
+        time_weight: float,
+    ) -> List[Tuple[Memory, float]]:
+        """Similarity + time-decay ranking over the in-process vector store"""
         
-        # Sort by relevance and return top K
-        scored_memories.sort(key=lambda x: x[1], reverse=True)
-        return scored_memories[:top_k]
+        # Candidate rows: all memories, or an ANN shortlist for large users
+        rows = self.vector_store.shortlist(user_id, query_embedding, top_k * self.ann_candidates)
+        
+        # Vector similarity (cosine) for every candidate at once
+        similarity = matrix.similarities(query_embedding, rows)
+        
+        # Time decay (older = lower score), in whole days
+        created = matrix.timestamp if rows is None else matrix.timestamp[rows]
+        days_old = np.floor((datetime.now().timestamp() - created) / 86400.0)
+        time_score = 1.0 / (1.0 + (time_weight * days_old))
+        
+        # Combined score
+        final_scores = (similarity * 0.7) + (time_score * 0.3)
+        
+        # Top K by relevance
+        best = top_k_indices(final_scores, top_k)
+        best_rows = best if rows is None else rows[best]
+        return [
+            (matrix.items[row], float(score))
+            for row, score in zip(best_rows, final_scores[best])
+        ]
 
-    async def proactive_recall(self, user_id: str) -> List[Memory]:
+    async def proactive_recall(self, user_id: str, limit: int = 5) -> List[Memory]:
         """
         Proactively recall important memories
         
@@ -160,27 +309,15 @@ class MemoryEngine:
         
         Example: If user mentioned friend's birthday on Monday,
         Friday morning Avatar says: "Don't forget to call your friend!"
-        """
-        
-        if user_id not in self.memories:
-            return []
-        
-        important_memories = []
-        now = datetime.now()
-        
-        for memory in self.memories[user_id]:
-            if memory.memory_type in self.recall_triggers:
-                # Check if should be recalled
-                hours_until_trigger = self.recall_triggers[memory.memory_type]
-                
-                # Parse date from memory if available
-                # (In production, would extract dates more intelligently)
-                
-                # For now, include high-importance recent memories
-                if memory.emotion_confidence > 0.8:
-                    important_memories.append(memory)
         
-        return important_memories[:5]  # Top 5 most important
+        Dates are extracted when memories are stored; this pops the user's
+        due reminders from the recall scheduler (O(log n) each) instead of
+        scanning memories. Each reminder is returned once.
+        """
+        if self.shards is not None:
+            return await self.shards.call(user_id, "memory", "proactive_recall", user_id, limit)
+        await self._restore(user_id)
+        return [r.memory for r in self.recall_scheduler.due(user_id, limit=limit)]
 
     async def consolidate_memories(self, user_id: str) -> int:
         """
@@ -192,36 +329,97 @@ class MemoryEngine:
         - Memory 3: "User's favorite pizza topping is pepperoni"
         
         Consolidate into: "User loves pizza, especially with pepperoni"
+        
+        Runs as an incremental batch job: only memories stored since the last
+        run are looked up (ANN index or exact block scan), matches are grouped
+        with union-find, and each group is merged into its oldest memory in
+        place. The other members are removed in one compaction pass. Runs for
+        the same user are serialised; a run queued behind another only sees
+        the rows stored since.
+        
+        Returns:
+            Number of memory groups merged
         """
+        if self.shards is not None:
+            return await self.shards.call(user_id, "memory", "consolidate_memories", user_id)
         
-        if user_id not in self.memories:
+        async with self._user_lock(user_id):
+            if self.store is not None:
+                await self._sync(user_id)
+            return await self._consolidate(user_id)
+
+    async def _consolidate(self, user_id: str) -> int:
+        # Runs under the user's lock
+        matrix = self.vector_store.get(user_id)
+        if matrix is None:
             return 0
         
-        consolidated_count = 0
-        memories = self.memories[user_id]
+        # Only rows added since the last run need a neighbour lookup. The mark
+        # is taken before any await: rows stored meanwhile stay unchecked.
+        checked = len(matrix)
+        new_rows = np.arange(self._consolidated_rows.get(user_id, 0), checked)
+        rows, neighbours = self.vector_store.similar_pairs(
+            user_id, new_rows, self.consolidation_threshold
+        )
         
-        # Find groups of similar memories
-        i = 0
-        while i < len(memories) - 1:
-            current = memories[i]
-            similar_memories = []
-            
-            for j in range(i + 1, len(memories)):
-                similarity = await self._check_memory_similarity(current, memories[j])
-                if similarity > 0.8:  # High similarity threshold
-                    similar_memories.append(memories[j])
-            
-            # If found similar memories, consolidate
-            if similar_memories:
-                consolidated = await self._merge_memories(
-                    [current] + similar_memories
+        # Group matches; each group's root is its lowest (oldest) row
+        parent = {}
+        
+        def find(row: int) -> int:
+            parent.setdefault(row, row)
+            while parent[row] != row:
+                parent[row] = parent[parent[row]]
+                row = parent[row]
+            return row
+        
+        for a, b in zip(rows.tolist(), neighbours.tolist()):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+        
+        groups: Dict[int, List[int]] = {}
+        for row in parent:
+            groups.setdefault(find(row), []).append(row)
+        groups = {root: sorted(members) for root, members in groups.items() if len(members) > 1}
+        removed = [row for members in groups.values() for row in members[1:]]
+        
+        if groups:
+            aggregates = self.aggregates[user_id]
+            merged = []
+            for members in groups.values():
+                group = [matrix.items[row] for row in members]
+                for memory in group:
+                    aggregates.count(memory.memory_type, memory.emotion_detected, -1)
+                    self.recall_scheduler.cancel(memory.id)
+                merged.append(await self._merge_memories(group))
+                aggregates.count(merged[-1].memory_type, merged[-1].emotion_detected, 1)
+                self.recall_scheduler.schedule(
+                    user_id, merged[-1], merged[-1].full_text, merged[-1].memory_type
                 )
-                # Replace in memory list (would update DB)
-                consolidated_count += 1
+            # Re-embed all merged texts in one provider batch
+            embeddings = await self.embedding_provider.embed_many([m.full_text for m in merged])
+            for root, embedding in zip(groups, embeddings):
+                self.vector_store.update(user_id, root, embedding)
+            if self.store is not None:
+                try:
+                    await self.store.merge([
+                        (memory.to_dict(), embedding, [matrix.items[row].id for row in members[1:]])
+                        for memory, embedding, members in zip(merged, embeddings, groups.values())
+                    ])
+                except Exception:
+                    self._store_versions.pop(user_id, None)  # Rebuild from the store next time
+                    raise
+                version = self._store_versions.get(user_id)
+                if version is not None:
+                    self._store_versions[user_id] = (version[0], version[1] + len(removed))
             
-            i += 1
+            self.vector_store.remove(user_id, removed)
+            self.memories[user_id] = list(matrix.items)
+            self.recall_cache.invalidate(user_id)
         
-        return consolidated_count
+        # Removed rows were all below the mark; later rows moved up by as many
+        self._consolidated_rows[user_id] = checked - len(removed)
+        return len(groups)
 
     async def emotional_response_synthesis(
         self,
@@ -240,22 +438,25 @@ class MemoryEngine:
             Dict with avatar expression, tone, and verbal response
         """
         
-        if user_id not in self.memories:
+        if self.shards is not None:
+            return await self.shards.call(
+                user_id, "memory", "emotional_response_synthesis", user_id, current_emotion
+            )
+        
+        await self._restore(user_id)
+        if user_id not in self.aggregates:
             return {
                 "avatar_expression": "neutral",
                 "tone": "friendly",
                 "suggested_response": "I'm here to listen.",
             }
         
-        # Analyze user's emotional patterns
-        memories = self.memories[user_id]
-        emotion_history = {}
-        
-        for memory in memories:
-            emotion = memory.emotion_detected
-            if emotion not in emotion_history:
-                emotion_history[emotion] = 0
-            emotion_history[emotion] += 1
+        # User's emotional patterns (maintained incrementally by store_memory)
+        emotion_history = {
+            emotion: count
+            for emotion, count in self.aggregates[user_id].emotion_counts.items()
+            if count > 0
+        }
         
         # Generate response based on emotion
         return {
@@ -266,20 +467,66 @@ class MemoryEngine:
             ),
         }
 
+    def _user_lock(self, user_id: str) -> asyncio.Lock:
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        return lock
+
+    def _remember(self, user_id: str, memory: Memory, embedding: np.ndarray, schedule: bool = True) -> None:
+        """Add a memory to the in-process state (list, vectors, aggregates, reminders)"""
+        self.memories.setdefault(user_id, []).append(memory)
+        self.vector_store.add(
+            user_id, memory, embedding,
+            type_code=memory.type_code, timestamp=memory.created_ts,
+        )
+        aggregates = self.aggregates.get(user_id)
+        if aggregates is None:
+            aggregates = self.aggregates[user_id] = UserAggregates()
+        aggregates.record(memory.memory_type, memory.summary, memory.created_ts, memory.emotion_detected)
+        if schedule:
+            self.recall_scheduler.schedule(user_id, memory, memory.full_text, memory.memory_type)
+
+    async def _restore(self, user_id: str) -> None:
+        """Bring the user's in-process state up to date with the store"""
+        if self.store is None:
+            return
+        async with self._user_lock(user_id):
+            await self._sync(user_id)
+
+    async def _sync(self, user_id: str) -> None:
+        # Runs under the user's lock
+        version = await self.store.version(user_id)
+        if self._store_versions.get(user_id) == version:
+            return
+        records = await self.store.load(user_id)
+        
+        # Rebuild from the store; reminders of unchanged memories are kept,
+        # so one already delivered is not delivered again
+        previous = {memory.id: memory for memory in self.memories.pop(user_id, [])}
+        self.vector_store.drop(user_id)
+        self.aggregates.pop(user_id, None)
+        self._consolidated_rows.pop(user_id, None)
+        for record, embedding in records:
+            memory = Memory(**record)
+            before = previous.pop(memory.id, None)
+            self._remember(user_id, memory, embedding, schedule=before is None or before.full_text != memory.full_text)
+        for memory_id in previous:
+            self.recall_scheduler.cancel(memory_id)
+        self._store_versions[user_id] = version
+        self.recall_cache.invalidate(user_id)
+
     async def _extract_summary(self, text: str) -> str:
         """Extract key summary from full text"""
         # In production: Use abstractive summarization
         return text[:100] if len(text) > 100 else text
 
-    async def _generate_embedding(self, text: str) -> List[float]:
+    async def _generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate vector embedding for text
-        Uses: OpenAI Embeddings API or similar
+        Uses: the engine's EmbeddingProvider (batched and cached)
         """
-        # Placeholder - would call actual embedding API
-        import hashlib
-        hash_val = int(hashlib.md5(text.encode()).hexdigest(), 16)
-        return [float((hash_val >> (i % 128)) % 256) / 256.0 for i in range(self.embedding_dimension)]
+        return await self.embedding_provider.embed(text)
 
     async def _detect_emotion(self, text: str) -> Tuple[str, float]:
         """Detect emotion from text"""
@@ -287,10 +534,9 @@ class MemoryEngine:
         # Placeholder
         return 'calm', 0.85
 
-    async def _cosine_similarity(self, vec1: List[float], vec_id: str) -> float:
-        """Calculate cosine similarity between vectors"""
-        # Placeholder
-        return 0.85
+    async def _consolidate_memories(self, user_id: str, memory: Memory) -> None:
+        """New memories are picked up by the next consolidate_memories run"""
+        return None
 
     async def _check_memory_similarity(self, mem1: Memory, mem2: Memory) -> float:
         """Check semantic similarity between two memories"""
@@ -298,13 +544,19 @@ class MemoryEngine:
         return 0.5
 
     async def _merge_memories(self, memories: List[Memory]) -> Memory:
-        """Merge multiple similar memories into one"""
-        merged_text = " ".join([m.full_text for m in memories])
-        return await self.store_memory(
-            memories[0].user_id,
-            merged_text,
-            memory_type=memories[0].memory_type
-        )
+        """
+        Merge multiple similar memories into the first one (in place)
+        
+        The caller re-embeds the result and drops the other memories.
+        """
+        target = memories[0]
+        target.full_text = " ".join([m.full_text for m in memories])
+        target.summary = await self._extract_summary(target.full_text)
+        target.recalled_count = sum(m.recalled_count for m in memories)
+        strongest = max(memories, key=lambda m: m.emotion_confidence)
+        target.emotion_code = strongest.emotion_code
+        target.emotion_confidence = strongest.emotion_confidence
+        return target
 
     def _get_avatar_expression(self, emotion: str) -> Dict:
         """Map emotion to avatar facial expression"""
@@ -0,0 +1,380 @@
+"""
+Memory Shards - User-partitioned memory engines in dedicated processes
+
+With several API workers, per-process singletons each see a different slice
+of user memories. Instead, MemoryShardPool runs N shard processes, each
+owning a MemoryEngine and a NeuralPersonaService for the users that hash to
+it, and the API workers reach them through MemoryShardClient:
+
+- Users map to shards by consistent hashing (HashRing, virtual nodes), so
+  changing the shard count only moves ~1/N of the users
+- Transport is a Unix domain socket per shard carrying length-prefixed
+  pickle frames (local, trusted processes only; sockets are mode 0600)
+- Requests are pipelined: many calls share one connection and replies are
+  matched by request id, so slow calls do not block fast ones
+
+MemoryEngine and NeuralPersonaService delegate their memory calls to the
+client when their `shards` attribute is set (see main.py).
+
+The pool is owned by one supervisor outside the API workers (`python main.py
+shards`, or `python main.py` before uvicorn forks): it removes stale socket
+files, restarts shards that die, and stops them on exit. Workers only wait
+(with a timeout) until every shard accepts connections.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import inspect
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import socket
+import struct
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct("!I")
+
+# Methods a shard executes, per target object
+SHARD_METHODS = {
+    "memory": {
+        "store_memory", "recall_memory", "consolidate_memories",
+        "proactive_recall", "emotional_response_synthesis",
+    },
+    "persona": {"store_user_memory", "get_proactive_recall"},
+}
+
+# (memory_engine, persona_memory_engine) -> awaitable, run inside each shard
+EngineHook = Callable[[Any, Any], Awaitable[None]]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+def _frame(message: Any) -> bytes:
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return _LENGTH.pack(len(data)) + data
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Any:
+    (size,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return pickle.loads(await reader.readexactly(size))
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = 64):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._nodes[i]
+
+
+# ==================== SHARD SIDE ====================
+
+class _ShardServer:
+    """Serves pipelined requests against the shard's engines"""
+
+    def __init__(self, targets: Dict[str, Any]):
+        self.targets = targets
+        self.stopped = asyncio.Event()
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def close_connections(self) -> None:
+        """Close client connections and wait for their in-flight calls."""
+        for writer in self._connections.values():
+            writer.transport.abort()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        current = asyncio.current_task()
+        self._connections[current] = writer
+        tasks = set()
+        try:
+            while True:
+                request = await _read_frame(reader)
+                task = asyncio.ensure_future(self._dispatch(writer, *request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            self._connections.pop(current, None)
+
+    async def _dispatch(self, writer, request_id: int, target: str, method: str, args, kwargs) -> None:
+        try:
+            if target == "shard" and method == "shutdown":
+                self.stopped.set()
+                result = None
+            elif method in SHARD_METHODS.get(target, ()):
+                result = getattr(self.targets[target], method)(*args, **kwargs)
+                if inspect.isawaitable(result):
+                    result = await result
+            else:
+                raise AttributeError(f"Shard does not serve {target}.{method}")
+            frame = _frame((request_id, True, result))
+        except Exception as e:
+            try:
+                frame = _frame((request_id, False, e))
+            except Exception:
+                frame = _frame((request_id, False, RuntimeError(repr(e))))
+        writer.write(frame)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def _shard_main(socket_path: str, initializer: Optional[EngineHook], finalizer: Optional[EngineHook]) -> None:
+    # Ctrl+C reaches the whole process group; the supervisor decides when shards stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve(socket_path, initializer, finalizer))
+
+
+async def _serve(socket_path: str, initializer: Optional[EngineHook], finalizer: Optional[EngineHook]) -> None:
+    from app.services.memory_engine import MemoryEngine
+    from app.services.neural_persona import NeuralPersonaService
+
+    engine, persona = MemoryEngine(), NeuralPersonaService()
+    if initializer is not None:
+        await initializer(engine, persona.memory_engine)
+
+    shard = _ShardServer({"memory": engine, "persona": persona})
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(shard.handle, path=socket_path)
+    os.chmod(socket_path, 0o600)
+    logger.info(f"Memory shard listening on {socket_path}")
+
+    await shard.stopped.wait()
+    server.close()
+    await asyncio.sleep(0)  # Let the shutdown reply go out
+    await shard.close_connections()
+    if finalizer is not None:
+        await finalizer(engine, persona.memory_engine)
+    os.unlink(socket_path)
+
+
+# ==================== CLIENT SIDE ====================
+
+class _ShardConnection:
+    """One pipelined connection to a shard socket"""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+
+    async def request(self, target: str, method: str, args: Tuple, kwargs: Dict) -> Any:
+        await self._connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(_frame((request_id, target, method, args, kwargs)))
+        await self._writer.drain()
+        ok, result = await future
+        if not ok:
+            raise result
+        return result
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions=True)
+
+    async def _connect(self) -> None:
+        if self._writer is not None:
+            return
+        async with self._connect_lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                self._read_task = asyncio.ensure_future(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        error: Exception = ConnectionError(f"Memory shard {self.socket_path} closed the connection")
+        try:
+            while True:
+                request_id, ok, result = await _read_frame(self._reader)
+                future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((ok, result))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            if isinstance(e, ConnectionError):
+                error = e
+        finally:
+            # Fail in-flight calls; the next request reconnects
+            self._reader = self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+
+class MemoryShardClient:
+    """Routes memory calls to the shard that owns the user"""
+
+    def __init__(self, socket_paths: Sequence[str], vnodes: int = 64):
+        self._paths = {os.path.basename(path): path for path in socket_paths}
+        self.ring = HashRing(list(self._paths), vnodes)
+        self._connections: Dict[str, _ShardConnection] = {}
+
+    def shard_for(self, user_id: str) -> str:
+        """Socket path of the shard owning user_id."""
+        return self._paths[self.ring.node_for(user_id)]
+
+    async def call(self, user_id: str, target: str, method: str, *args, **kwargs) -> Any:
+        """Run target.method(*args, **kwargs) on the user's shard."""
+        path = self.shard_for(user_id)
+        connection = self._connections.get(path)
+        if connection is None:
+            connection = self._connections[path] = _ShardConnection(path)
+        return await connection.request(target, method, args, kwargs)
+
+    async def shutdown_shards(self) -> None:
+        """Ask every shard to finalize its engines and exit."""
+        for path in self._paths.values():
+            connection = self._connections.get(path) or _ShardConnection(path)
+            self._connections[path] = connection
+            try:
+                await connection.request("shard", "shutdown", (), {})
+            except (ConnectionError, OSError) as e:
+                logger.warning(f"Memory shard {path} did not acknowledge shutdown: {e}")
+        await self.close()
+
+    async def close(self) -> None:
+        connections, self._connections = self._connections, {}
+        for connection in connections.values():
+            await connection.close()
+
+
+def _accepts_connections(socket_path: str) -> bool:
+    """Whether a shard is listening (a socket file left by a crashed run is not)"""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+async def wait_for_shards(socket_paths: Sequence[str], timeout: float = 30.0) -> None:
+    """
+    Wait until every shard socket accepts connections.
+
+    Raises:
+        TimeoutError: If a shard is not listening within timeout seconds
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    for path in socket_paths:
+        while not _accepts_connections(path):
+            if loop.time() > deadline:
+                raise TimeoutError(
+                    f"Memory shard {path} is not listening after {timeout}s (is the shard supervisor running?)"
+                )
+            await asyncio.sleep(0.1)
+
+
+class MemoryShardPool:
+    """
+    Spawns and stops the shard processes
+
+    Args:
+        n_shards: Number of shard processes
+        socket_dir: Directory for the shard-<i>.sock Unix sockets
+    """
+
+    def __init__(self, n_shards: int, socket_dir: str):
+        self.n_shards = n_shards
+        self.socket_dir = socket_dir
+        self._processes: List[multiprocessing.Process] = []
+        self._hooks: Tuple[Optional[EngineHook], Optional[EngineHook]] = (None, None)
+
+    @property
+    def socket_paths(self) -> List[str]:
+        return [os.path.join(self.socket_dir, f"shard-{i}.sock") for i in range(self.n_shards)]
+
+    def start(
+        self,
+        initializer: Optional[EngineHook] = None,
+        finalizer: Optional[EngineHook] = None,
+        timeout: float = 60.0,
+    ) -> None:
+        """
+        Start the shards and wait until every socket accepts connections.
+
+        initializer / finalizer are module-level async functions (they are
+        pickled by reference) run in each shard on its fresh engines.
+        """
+        os.makedirs(self.socket_dir, exist_ok=True)
+        self._hooks = (initializer, finalizer)
+        self._processes = [self._spawn(path) for path in self.socket_paths]
+        deadline = time.monotonic() + timeout
+        for process, path in zip(self._processes, self.socket_paths):
+            self._wait_listening(process, path, deadline, timeout)
+        logger.info(f"Started {self.n_shards} memory shards in {self.socket_dir}")
+
+    def supervise(self, stopped: threading.Event, interval: float = 1.0, timeout: float = 60.0) -> None:
+        """Restart shards that exit, until stopped is set (blocks; run after start)."""
+        while not stopped.wait(interval):
+            for i, path in enumerate(self.socket_paths):
+                process = self._processes[i]
+                if process.is_alive() or stopped.is_set():
+                    continue
+                logger.error(f"Memory shard {path} exited with code {process.exitcode}, restarting")
+                self._processes[i] = self._spawn(path)
+                try:
+                    self._wait_listening(self._processes[i], path, time.monotonic() + timeout, timeout)
+                except (RuntimeError, TimeoutError) as e:
+                    logger.error(str(e))
+
+    def _spawn(self, path: str) -> multiprocessing.Process:
+        if os.path.exists(path):
+            os.unlink(path)  # Stale socket of a crashed run
+        process = multiprocessing.get_context("spawn").Process(
+            target=_shard_main, args=(path, *self._hooks), name=os.path.basename(path), daemon=True
+        )
+        process.start()
+        return process
+
+    @staticmethod
+    def _wait_listening(process: multiprocessing.Process, path: str, deadline: float, timeout: float) -> None:
+        while not _accepts_connections(path):
+            if not process.is_alive():
+                raise RuntimeError(f"Memory shard {path} exited during startup")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Memory shard {path} did not start in {timeout}s")
+            time.sleep(0.05)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Shut the shards down gracefully (finalizers run), then reap them."""
+        client = MemoryShardClient(self.socket_paths)
+        await client.shutdown_shards()
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
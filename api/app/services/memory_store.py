@@ -0,0 +1,566 @@
+"""
+Memory Store - Persistent backends for MemoryEngine
+
+Memories written through a MemoryStore survive restarts and are shared by
+every API worker. Writes are buffered and inserted in batches (flushed when
+`batch_size` records are pending or `flush_interval_ms` after the first one),
+and recall runs as a single SQL query that combines cosine similarity with the
+engine's time decay, so ranking happens in the database.
+
+A batch that fails is retried row by row; rows that still fail are moved to
+`dead_letters` (and logged) so one bad record cannot block later writes.
+Consolidation is persisted with `merge` (the survivor is rewritten and the
+other rows archived), and `load` returns a user's live rows so an engine can
+rebuild its per-process state. `version` is a cheap per-user fingerprint
+(rows written, rows archived) that changes with every insert and merge, so
+an engine can tell when another worker has changed a user's memories.
+
+Backends:
+- PgVectorMemoryStore: PostgreSQL + pgvector through an asyncpg connection
+  pool (see db/migrations/003_memory_vector_indexes.sql for the ANN indexes)
+- SQLiteMemoryStore: stdlib sqlite3 fallback for tests and single-node setups;
+  vectors are float32 blobs scored by a registered SQL function
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.vector_store import normalize
+
+logger = logging.getLogger(__name__)
+
+# Record fields persisted besides the embedding (see memory_engine.Memory)
+MEMORY_FIELDS = (
+    "id", "user_id", "summary", "full_text", "emotion_detected",
+    "emotion_confidence", "memory_type", "created_at", "recalled_count",
+)
+
+
+class MemoryStore:
+    """
+    Buffered-write interface of a persistent memory store
+
+    Subclasses implement connect, close, _insert_many, _search, _load,
+    _merge and _version, and override valid_user_id / new_id when the
+    backend constrains user or memory ids.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval_ms: float = 50.0, max_dead_letters: int = 1000):
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.dead_letters: Deque[Dict[str, Any]] = deque(maxlen=max_dead_letters)  # Rows that failed to insert
+        self.stats = {"inserted": 0, "insert_batches": 0, "searches": 0, "dead_lettered": 0}
+
+    async def connect(self) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        raise NotImplementedError
+
+    def valid_user_id(self, user_id: str) -> bool:
+        """Whether the backend can store memories for user_id."""
+        return True
+
+    def new_id(self, user_id: str, created_ts: float) -> str:
+        """Id for a new memory, kept unchanged by the store."""
+        return f"mem_{user_id}_{created_ts}"
+
+    async def add(self, record: Dict[str, Any], embedding: np.ndarray) -> None:
+        """
+        Queue a memory record (MEMORY_FIELDS) for the next batched insert.
+
+        Raises:
+            ValueError: If the backend cannot store the record's user_id
+        """
+        if not self.valid_user_id(record["user_id"]):
+            raise ValueError(f"Memory store cannot hold memories for user_id {record['user_id']!r}")
+        self._pending.append(dict(record, embedding=normalize(embedding)))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_after(self.flush_interval_ms / 1000.0))
+
+    async def flush(self) -> None:
+        """
+        Insert every pending record in one batch.
+
+        If the batch fails, its rows are inserted one at a time and the rows
+        that fail again go to dead_letters.
+        """
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            self.stats["insert_batches"] += 1
+            try:
+                await self._insert_many(batch)
+            except Exception as e:
+                logger.warning(f"Memory store batch of {len(batch)} failed ({e}); retrying row by row")
+                inserted = 0
+                for record in batch:
+                    try:
+                        await self._insert_many([record])
+                        inserted += 1
+                    except Exception as e:
+                        logger.error(f"Memory {record['id']} of user {record['user_id']} dropped: {e}")
+                        self.dead_letters.append(record)
+                        self.stats["dead_lettered"] += 1
+                self.stats["inserted"] += inserted
+                return
+            self.stats["inserted"] += len(batch)
+
+    async def search(
+        self,
+        user_id: str,
+        query: np.ndarray,
+        top_k: int = 5,
+        time_weight: float = 0.1,
+        candidates: int = 100,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Rank a user's memories by similarity * 0.7 + time decay * 0.3.
+
+        Pending writes are flushed first (a failed flush is logged, not
+        raised). `candidates` bounds the nearest neighbours fetched through
+        the vector index before time decay is applied (backends without an
+        index rank every row).
+
+        Returns:
+            List of (record, score) tuples, best first
+        """
+        await self._flush_logged()
+        if not self.valid_user_id(user_id):
+            return []
+        self.stats["searches"] += 1
+        return await self._search(
+            user_id, normalize(query), top_k, time_weight, max(candidates, top_k), datetime.now()
+        )
+
+    async def load(self, user_id: str) -> List[Tuple[Dict[str, Any], np.ndarray]]:
+        """A user's live (not archived) memories as (record, embedding), oldest first."""
+        await self._flush_logged()
+        if not self.valid_user_id(user_id):
+            return []
+        return await self._load(user_id)
+
+    async def version(self, user_id: str) -> Tuple[int, int]:
+        """(rows written, rows archived) for a user, after flushing pending writes."""
+        await self._flush_logged()
+        if not self.valid_user_id(user_id):
+            return (0, 0)
+        return await self._version(user_id)
+
+    async def merge(self, groups: Sequence[Tuple[Dict[str, Any], np.ndarray, Sequence[str]]]) -> None:
+        """
+        Persist consolidated memories.
+
+        Each group is (merged record, its new embedding, ids of the memories
+        merged into it): the record's row is rewritten and the others are
+        archived, so recall and load no longer return them.
+        """
+        await self._flush_logged()
+        await self._merge([(record, normalize(embedding), list(ids)) for record, embedding, ids in groups])
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Memory store flush failed ({len(self._pending)} records pending): {e}")
+
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self._flush_logged()
+
+    async def _insert_many(self, records: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    async def _search(
+        self,
+        user_id: str,
+        query: np.ndarray,
+        top_k: int,
+        time_weight: float,
+        candidates: int,
+        now: datetime,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        raise NotImplementedError
+
+    async def _load(self, user_id: str) -> List[Tuple[Dict[str, Any], np.ndarray]]:
+        raise NotImplementedError
+
+    async def _merge(self, groups: List[Tuple[Dict[str, Any], np.ndarray, List[str]]]) -> None:
+        raise NotImplementedError
+
+    async def _version(self, user_id: str) -> Tuple[int, int]:
+        raise NotImplementedError
+
+
+def _vector_literal(vector: np.ndarray) -> str:
+    """pgvector text representation, e.g. '[0.1,0.2]'"""
+    return "[" + ",".join(f"{x:.7g}" for x in vector.tolist()) + "]"
+
+
+def _parse_vector(literal: str) -> np.ndarray:
+    return np.array(literal.strip("[]").split(","), dtype=np.float32)
+
+
+def _version_tuple(version: Optional[str]) -> Tuple[int, ...]:
+    """'0.8.0' -> (0, 8, 0); missing extension -> ()"""
+    return tuple(int(part) for part in (version or "").split(".") if part.isdigit())
+
+
+def _row_id(memory_id: str) -> uuid.UUID:
+    """UUID row id of a memory: its own id if it is one, else a stable uuid5 of it"""
+    try:
+        return uuid.UUID(memory_id)
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_URL, f"memory:{memory_id}")
+
+
+class PgVectorMemoryStore(MemoryStore):
+    """
+    PostgreSQL/pgvector store over the user_memory table
+
+    user_id must reference user_profiles(id), so records whose user_id is
+    not a UUID are rejected by add. new_id hands out UUIDs, which are used as
+    row ids unchanged (other ids are mapped with _row_id). Vectors are sent in pgvector's text format, so only
+    asyncpg is needed on the client.
+    """
+
+    INSERT_SQL = """
+        INSERT INTO user_memory (
+            id, user_id, summary, full_text, emotion_detected, emotion_confidence,
+            memory_type, created_at, recalled_count, memory_vector
+        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10::text::vector)
+        ON CONFLICT (id) DO NOTHING
+    """
+
+    LOAD_SQL = """
+        SELECT id, user_id, summary, full_text, emotion_detected, emotion_confidence,
+               memory_type, created_at, recalled_count, memory_vector::text AS vector
+        FROM user_memory
+        WHERE user_id = $1 AND NOT is_archived
+        ORDER BY created_at
+    """
+
+    UPDATE_SQL = """
+        UPDATE user_memory
+        SET summary = $2, full_text = $3, emotion_detected = $4, emotion_confidence = $5,
+            recalled_count = $6, memory_vector = $7::text::vector, updated_at = CURRENT_TIMESTAMP
+        WHERE id = $1
+    """
+
+    ARCHIVE_SQL = """
+        UPDATE user_memory SET is_archived = TRUE, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ANY($1::uuid[])
+    """
+
+    VERSION_SQL = """
+        SELECT count(*) AS written, count(*) FILTER (WHERE is_archived) AS archived
+        FROM user_memory
+        WHERE user_id = $1
+    """
+
+    # Nearest neighbours via the HNSW index, then time-decay re-ranking. The
+    # index is shared by all users, so the user filter applies after the index
+    # scan: _search turns on iterative scans (pgvector >= 0.8) so the scan
+    # continues until enough of the user's rows are found.
+    SEARCH_SQL = """
+        WITH candidates AS (
+            SELECT id, user_id, summary, full_text, emotion_detected, emotion_confidence,
+                   memory_type, created_at, recalled_count,
+                   1 - (memory_vector <=> $2::text::vector) AS similarity
+            FROM user_memory
+            WHERE user_id = $1 AND NOT is_archived
+            ORDER BY memory_vector <=> $2::text::vector
+            LIMIT $3
+        )
+        SELECT *,
+               similarity * 0.7
+               + 0.3 / (1 + $4 * floor(extract(epoch FROM $5 - created_at) / 86400)) AS score
+        FROM candidates
+        ORDER BY score DESC
+        LIMIT $6
+    """
+
+    # Without iterative scans: rank the user's own rows exactly (bounded by
+    # max_memories_per_user), found through idx_user_memory_user_id
+    SEARCH_EXACT_SQL = """
+        WITH mine AS MATERIALIZED (
+            SELECT id, user_id, summary, full_text, emotion_detected, emotion_confidence,
+                   memory_type, created_at, recalled_count, memory_vector
+            FROM user_memory
+            WHERE user_id = $1 AND NOT is_archived
+        ), candidates AS (
+            SELECT id, user_id, summary, full_text, emotion_detected, emotion_confidence,
+                   memory_type, created_at, recalled_count,
+                   1 - (memory_vector <=> $2::text::vector) AS similarity
+            FROM mine
+            ORDER BY memory_vector <=> $2::text::vector
+            LIMIT $3
+        )
+        SELECT *,
+               similarity * 0.7
+               + 0.3 / (1 + $4 * floor(extract(epoch FROM $5 - created_at) / 86400)) AS score
+        FROM candidates
+        ORDER BY score DESC
+        LIMIT $6
+    """
+
+    # hnsw.ef_search bounds (pgvector default and maximum)
+    EF_SEARCH_MIN = 40
+    EF_SEARCH_MAX = 1000
+
+    def __init__(self, dsn: str, pool_size: int = 5, **kwargs):
+        super().__init__(**kwargs)
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.pool = None
+        self.iterative_scan = False  # Set by connect from the pgvector version
+
+    async def connect(self) -> None:
+        import asyncpg  # Optional dependency
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+        async with self.pool.acquire() as conn:
+            version = await conn.fetchval("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        self.iterative_scan = _version_tuple(version) >= (0, 8)
+        if not self.iterative_scan:
+            logger.info(f"pgvector {version} has no iterative index scans; recall ranks each user's rows exactly")
+
+    async def close(self) -> None:
+        await self.flush()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def valid_user_id(self, user_id: str) -> bool:
+        try:
+            uuid.UUID(user_id)
+        except (TypeError, ValueError):
+            return False
+        return True
+
+    def new_id(self, user_id: str, created_ts: float) -> str:
+        return str(uuid.uuid4())
+
+    async def _insert_many(self, records: List[Dict[str, Any]]) -> None:
+        rows = [
+            (
+                _row_id(r["id"]), uuid.UUID(r["user_id"]), r["summary"], r["full_text"], r["emotion_detected"],
+                r["emotion_confidence"], r["memory_type"], r["created_at"],
+                r["recalled_count"], _vector_literal(r["embedding"]),
+            )
+            for r in records
+        ]
+        async with self.pool.acquire() as conn:
+            await conn.executemany(self.INSERT_SQL, rows)
+
+    async def _search(self, user_id, query, top_k, time_weight, candidates, now):
+        args = (uuid.UUID(user_id), _vector_literal(query), candidates, time_weight, now, top_k)
+        async with self.pool.acquire() as conn:
+            if not self.iterative_scan:
+                rows = await conn.fetch(self.SEARCH_EXACT_SQL, *args)
+            else:
+                ef_search = min(max(candidates, self.EF_SEARCH_MIN), self.EF_SEARCH_MAX)
+                async with conn.transaction():
+                    # Transaction-local (SET LOCAL), so pooled connections keep their defaults
+                    await conn.execute(
+                        "SELECT set_config('hnsw.ef_search', $1, true), "
+                        "set_config('hnsw.iterative_scan', 'relaxed_order', true)",
+                        str(ef_search),
+                    )
+                    rows = await conn.fetch(self.SEARCH_SQL, *args)
+        return [(self._record(row), float(row["score"])) for row in rows]
+
+    async def _load(self, user_id):
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(self.LOAD_SQL, uuid.UUID(user_id))
+        return [(self._record(row), _parse_vector(row["vector"])) for row in rows]
+
+    async def _merge(self, groups):
+        updates = [
+            (
+                _row_id(r["id"]), r["summary"], r["full_text"], r["emotion_detected"],
+                r["emotion_confidence"], r["recalled_count"], _vector_literal(embedding),
+            )
+            for r, embedding, _ in groups
+        ]
+        archived = [_row_id(memory_id) for _, _, ids in groups for memory_id in ids]
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany(self.UPDATE_SQL, updates)
+                await conn.execute(self.ARCHIVE_SQL, archived)
+
+    async def _version(self, user_id):
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(self.VERSION_SQL, uuid.UUID(user_id))
+        return (row["written"], row["archived"])
+
+    @staticmethod
+    def _record(row) -> Dict[str, Any]:
+        record = {field: row[field] for field in MEMORY_FIELDS}
+        record["id"] = str(record["id"])
+        record["user_id"] = str(record["user_id"])
+        return record
+
+
+def _blob_dot(a: bytes, b: bytes) -> Optional[float]:
+    if a is None or b is None:
+        return None
+    return float(np.frombuffer(a, dtype=np.float32) @ np.frombuffer(b, dtype=np.float32))
+
+
+class SQLiteMemoryStore(MemoryStore):
+    """
+    SQLite store with the user_memory columns MemoryEngine needs
+
+    One connection is owned by a single worker thread (sqlite3 objects are
+    not thread-safe), so the "pool" is that thread. created_at is stored as
+    epoch seconds.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS user_memory (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            full_text TEXT,
+            emotion_detected TEXT,
+            emotion_confidence REAL DEFAULT 0.0,
+            memory_type TEXT DEFAULT 'note',
+            memory_vector BLOB,
+            is_archived INTEGER DEFAULT 0,
+            created_at REAL NOT NULL,
+            recalled_count INTEGER DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_user_memory_user_created ON user_memory(user_id, created_at);
+    """
+
+    SEARCH_SQL = """
+        SELECT id, user_id, summary, full_text, emotion_detected, emotion_confidence,
+               memory_type, created_at, recalled_count,
+               vec_dot(memory_vector, ?) * 0.7
+               + 0.3 / (1.0 + ? * CAST((? - created_at) / 86400 AS INTEGER)) AS score
+        FROM user_memory
+        WHERE user_id = ? AND NOT is_archived
+        ORDER BY score DESC
+        LIMIT ?
+    """
+
+    LOAD_SQL = """
+        SELECT id, user_id, summary, full_text, emotion_detected, emotion_confidence,
+               memory_type, created_at, recalled_count, memory_vector
+        FROM user_memory
+        WHERE user_id = ? AND NOT is_archived
+        ORDER BY created_at
+    """
+
+    VERSION_SQL = """
+        SELECT count(*), coalesce(sum(is_archived), 0)
+        FROM user_memory
+        WHERE user_id = ?
+    """
+
+    def __init__(self, path: str = ":memory:", **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def connect(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-sqlite")
+        await self._run(self._open)
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._executor is not None:
+            await self._run(self._conn.close)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _open(self) -> None:
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.create_function("vec_dot", 2, _blob_dot, deterministic=True)
+        self._conn.executescript(self.SCHEMA)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _insert_many(self, records: List[Dict[str, Any]]) -> None:
+        rows = [
+            (
+                r["id"], r["user_id"], r["summary"], r["full_text"], r["emotion_detected"],
+                r["emotion_confidence"], r["memory_type"],
+                np.asarray(r["embedding"], dtype=np.float32).tobytes(),
+                r["created_at"].timestamp(), r["recalled_count"],
+            )
+            for r in records
+        ]
+
+        def insert():
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO user_memory (id, user_id, summary, full_text, emotion_detected, "
+                    "emotion_confidence, memory_type, memory_vector, created_at, recalled_count) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        await self._run(insert)
+
+    async def _search(self, user_id, query, top_k, time_weight, candidates, now):
+        params = (query.astype(np.float32).tobytes(), time_weight, now.timestamp(), user_id, top_k)
+        rows = await self._run(lambda: self._conn.execute(self.SEARCH_SQL, params).fetchall())
+        return [(self._record(row), float(row[-1])) for row in rows]
+
+    async def _load(self, user_id):
+        rows = await self._run(lambda: self._conn.execute(self.LOAD_SQL, (user_id,)).fetchall())
+        return [(self._record(row), np.frombuffer(row[-1], dtype=np.float32).copy()) for row in rows]
+
+    async def _merge(self, groups):
+        updates = [
+            (
+                r["summary"], r["full_text"], r["emotion_detected"], r["emotion_confidence"],
+                r["recalled_count"], np.asarray(embedding, dtype=np.float32).tobytes(), r["id"],
+            )
+            for r, embedding, _ in groups
+        ]
+        archived = [(memory_id,) for _, _, ids in groups for memory_id in ids]
+
+        def merge():
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE user_memory SET summary = ?, full_text = ?, emotion_detected = ?, "
+                    "emotion_confidence = ?, recalled_count = ?, memory_vector = ? WHERE id = ?",
+                    updates,
+                )
+                self._conn.executemany("UPDATE user_memory SET is_archived = 1 WHERE id = ?", archived)
+        await self._run(merge)
+
+    async def _version(self, user_id):
+        row = await self._run(lambda: self._conn.execute(self.VERSION_SQL, (user_id,)).fetchone())
+        return (row[0], row[1])
+
+    @staticmethod
+    def _record(row) -> Dict[str, Any]:
+        record = dict(zip(MEMORY_FIELDS, row[:-1]))
+        record["created_at"] = datetime.fromtimestamp(record["created_at"])
+        return record
@@ -7,27 +7,76 @@ v3.0+
 """
 
 import numpy as np
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
 from datetime import datetime
 import logging
 import json
+import sys
+
+from app.services.ann_index import VectorIndex
+from app.services.memory_aggregates import UserAggregates
+from app.services.memory_shards import MemoryShardClient
+from app.services.quantization import VectorCodec, VectorFile
+from app.services.recall_cache import RecallCache
+from app.services.vector_store import CodeTable, UserVectorStore, VectorMatrix, top_k_indices
 
 logger = logging.getLogger(__name__)
 
+# Memory types, stored as small-int codes (unknown types are appended)
+MEMORY_TYPES = CodeTable(["conversation", "preference", "emotional_state", "health"])
+
+# Profile sections filled from the recent contents of each memory type
+PROFILE_SECTIONS = {
+    "preferences": "preference",
+    "emotional_arc": "emotional_state",
+    "health_notes": "health",
+    "interaction_history": "conversation",
+}
+
 
-@dataclass
 class MemoryEntry:
-    """Long-term memory entry with vector embedding"""
-    memory_id: str
-    user_id: str
-    content: str
-    embedding: List[float]  # 1536-dim OpenAI embedding
-    timestamp: datetime
-    memory_type: str  # "preference", "conversation", "emotional_state", "health"
-    importance_score: float = 0.5
-    access_count: int = 0
-    metadata: Dict = field(default_factory=dict)
+    """
+    Long-term memory entry
+    
+    Slotted record: the embedding lives only in the user's VectorMatrix,
+    memory_type is a MEMORY_TYPES code and the timestamp is epoch seconds.
+    """
+    __slots__ = (
+        "memory_id", "user_id", "content", "type_code", "created_ts",
+        "importance_score", "access_count", "metadata",
+    )
+
+    def __init__(
+        self,
+        memory_id: str,
+        user_id: str,
+        content: str,
+        memory_type: str,  # "preference", "conversation", "emotional_state", "health"
+        created_ts: float,
+        importance_score: float = 0.5,
+        access_count: int = 0,
+        metadata: Optional[Dict] = None,  # None when empty
+    ):
+        self.memory_id = memory_id
+        self.user_id = sys.intern(user_id)
+        self.content = content
+        self.type_code = MEMORY_TYPES.code(memory_type)
+        self.created_ts = created_ts
+        self.importance_score = importance_score
+        self.access_count = access_count
+        self.metadata = metadata or None
+
+    @property
+    def memory_type(self) -> str:
+        return MEMORY_TYPES.name(self.type_code)
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.created_ts)
+
+    def __repr__(self) -> str:
+        return f"MemoryEntry({self.memory_id!r}, {self.memory_type!r}, {self.content[:40]!r})"
 
 
 @dataclass
@@ -61,12 +110,48 @@ class LongTermMemoryEngine:
     """
     Vector Database for long-term memory storage and retrieval
     Remembers user preferences, conversations, and emotional states
+    
+    Each user's embeddings live in a VectorMatrix (normalised float32 rows
+    plus importance/access/type arrays), so retrieval is one matrix-vector
+    product over that user's memories. MemoryEntry records hold no vector.
+    With an index_factory, users past ann_min_size memories also get an ANN
+    index (see ann_index) that shortlists ann_candidates * top_k rows before
+    boosting.
+    
+    Results are cached per user (RecallCache, invalidated when the user
+    stores a memory) and access counts are applied in deferred batches, so
+    a repeated question costs a key lookup.
+    
+    With a codec (int8 or PQ, see quantization) embeddings are stored as
+    codes and scored asymmetrically. With a vector_file and
+    rerank_candidates, the best rerank_candidates * top_k approximate
+    candidates are re-scored from their exact vectors.
     """
     
-    def __init__(self, embedding_dim: int = 1536):
+    def __init__(
+        self,
+        embedding_dim: int = 1536,
+        index_factory: Optional[Callable[[int], VectorIndex]] = None,
+        ann_min_size: int = 10000,
+        ann_candidates: int = 4,
+        profile_recent_size: int = 50,
+        recall_cache: Optional[RecallCache] = None,
+        access_flush_size: int = 256,
+        codec: Optional[VectorCodec] = None,
+        vector_file: Optional[VectorFile] = None,
+        rerank_candidates: int = 0,
+    ):
         self.embedding_dim = embedding_dim  # OpenAI embedding size
         self.memories: List[MemoryEntry] = []
-        self.user_profiles: Dict[str, Dict] = {}
+        self.user_profiles: Dict[str, UserAggregates] = {}
+        self.profile_recent_size = profile_recent_size  # Contents kept per profile section
+        self.recall_cache = recall_cache or RecallCache()
+        self.access_flush_size = access_flush_size  # Pending access updates before a flush
+        self._pending_access: Dict[str, List[np.ndarray]] = {}  # user_id -> returned rows
+        self._pending_access_count = 0
+        self.vector_store = UserVectorStore(embedding_dim, index_factory, ann_min_size, codec, vector_file)
+        self.ann_candidates = ann_candidates
+        self.rerank_candidates = rerank_candidates  # Exactly re-scored candidates per result (0 = off)
         logger.info(f"Long-Term Memory Engine initialized ({embedding_dim}-dim vectors)")
     
     def store_memory(
@@ -96,31 +181,25 @@ class LongTermMemoryEngine:
             memory_id=memory_id,
             user_id=user_id,
             content=content,
-            embedding=embedding,
-            timestamp=datetime.now(),
             memory_type=memory_type,
-            metadata=metadata or {}
+            created_ts=datetime.now().timestamp(),
+            metadata=metadata
         )
         
+        self.vector_store.add(
+            user_id, memory, embedding,
+            importance=memory.importance_score,
+            type_code=memory.type_code,
+            timestamp=memory.created_ts,
+        )
         self.memories.append(memory)
         
-        # Update user profile
-        if user_id not in self.user_profiles:
-            self.user_profiles[user_id] = {
-                "preferences": [],
-                "emotional_arc": [],
-                "health_notes": [],
-                "interaction_history": []
-            }
-        
-        if memory_type == "preference":
-            self.user_profiles[user_id]["preferences"].append(content)
-        elif memory_type == "emotional_state":
-            self.user_profiles[user_id]["emotional_arc"].append(content)
-        elif memory_type == "health":
-            self.user_profiles[user_id]["health_notes"].append(content)
-        elif memory_type == "conversation":
-            self.user_profiles[user_id]["interaction_history"].append(content)
+        # Update user profile aggregates (O(1))
+        profile = self.user_profiles.get(user_id)
+        if profile is None:
+            profile = self.user_profiles[user_id] = UserAggregates(self.profile_recent_size)
+        profile.record(memory_type, content, memory.created_ts)
+        self.recall_cache.invalidate(user_id)
         
         logger.debug(f"Stored memory {memory_id} ({memory_type}) for user {user_id}")
         return memory_id
@@ -144,48 +223,99 @@ class LongTermMemoryEngine:
         Returns:
             List of (memory, similarity_score) tuples
         """
-        user_memories = [m for m in self.memories if m.user_id == user_id]
-        
-        if memory_type:
-            user_memories = [m for m in user_memories if m.memory_type == memory_type]
-        
-        if not user_memories:
+        matrix = self.vector_store.get(user_id)
+        if matrix is None or not len(matrix):
             return []
         
-        # Calculate cosine similarity
-        query_vec = np.array(query_embedding)
-        similarities = []
-        
-        for memory in user_memories:
-            mem_vec = np.array(memory.embedding)
-            
-            # Cosine similarity
-            dot_product = np.dot(query_vec, mem_vec)
-            magnitude = np.linalg.norm(query_vec) * np.linalg.norm(mem_vec)
-            similarity = dot_product / (magnitude + 1e-8)
-            
-            # Boost score by importance and access frequency
-            boosted_score = similarity * (1 + memory.importance_score * 0.5) * (1 + memory.access_count * 0.1)
-            
-            similarities.append((memory, boosted_score))
-            
-            # Increment access count
-            memory.access_count += 1
-        
-        # Sort and return top-k
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        
-        logger.debug(f"Retrieved {len(similarities[:top_k])} memories for user {user_id}")
-        return similarities[:top_k]
+        key = self.recall_cache.key(query_embedding, top_k, memory_type)
+        cached = self.recall_cache.get(user_id, key)
+        if cached is None:
+            cached = self._rank(user_id, matrix, query_embedding, top_k, memory_type)
+            self.recall_cache.put(user_id, key, cached)
+        best_rows, best_scores = cached
+        
+        # Access counts are applied in batches (see flush_access_counts)
+        if len(best_rows):
+            self._pending_access.setdefault(user_id, []).append(best_rows)
+            self._pending_access_count += len(best_rows)
+            if self._pending_access_count >= self.access_flush_size:
+                self.flush_access_counts()
+        
+        results = [(matrix.items[row], score) for row, score in zip(best_rows.tolist(), best_scores)]
+        logger.debug(f"Retrieved {len(results)} memories for user {user_id}")
+        return results
+    
+    def flush_access_counts(self) -> None:
+        """Apply the deferred access-count increments of returned memories."""
+        pending, self._pending_access = self._pending_access, {}
+        self._pending_access_count = 0
+        for user_id, batches in pending.items():
+            matrix = self.vector_store.get(user_id)
+            rows, counts = np.unique(np.concatenate(batches), return_counts=True)
+            matrix.access_count[rows] += counts.astype(matrix.access_count.dtype)
+            for row, count in zip(rows.tolist(), counts.tolist()):
+                matrix.items[row].access_count += count
+    
+    def _rank(
+        self,
+        user_id: str,
+        matrix: VectorMatrix,
+        query_embedding: List[float],
+        top_k: int,
+        memory_type: Optional[str],
+    ) -> Tuple[np.ndarray, List[float]]:
+        """Best rows and boosted scores for a query (uncached)."""
+        empty = (np.zeros(0, dtype=np.intp), [])
+        
+        rows = None
+        if memory_type:
+            type_code = MEMORY_TYPES.get(memory_type)
+            if type_code is None:
+                return empty
+            rows = np.flatnonzero(matrix.type_code == type_code)
+            if not len(rows):
+                return empty
+        else:
+            # Approximate shortlist for indexed users; the boost may reorder it
+            rows = self.vector_store.shortlist(user_id, query_embedding, top_k * self.ann_candidates)
+        
+        # Cosine similarity against all candidate rows at once
+        scores = matrix.similarities(query_embedding, rows)
+        
+        # Boost score by importance and access frequency
+        importance = matrix.importance if rows is None else matrix.importance[rows]
+        access = matrix.access_count if rows is None else matrix.access_count[rows]
+        boost = (1 + importance * 0.5) * (1 + access * 0.1)
+        scores *= boost
+        
+        if self.rerank_candidates and matrix.codec is not None and matrix.vector_file is not None:
+            # Re-score the best approximate candidates from their exact vectors
+            candidates = top_k_indices(scores, top_k * self.rerank_candidates)
+            rows = candidates if rows is None else rows[candidates]
+            scores = matrix.similarities(query_embedding, rows, exact=True) * boost[candidates]
+        
+        best = top_k_indices(scores, top_k)
+        best_rows = best if rows is None else rows[best]
+        return best_rows, scores[best].tolist()
     
     def get_user_profile(self, user_id: str) -> Dict:
-        """Get comprehensive user profile from memories"""
-        return self.user_profiles.get(user_id, {
-            "preferences": [],
-            "emotional_arc": [],
-            "health_notes": [],
-            "interaction_history": []
-        })
+        """
+        Get comprehensive user profile from memories
+        
+        Sections hold the most recent profile_recent_size contents of their
+        memory type; memory_counts covers the whole history.
+        """
+        profile = self.user_profiles.get(user_id) or UserAggregates(self.profile_recent_size)
+        result = {
+            section: profile.recent_contents(memory_type)
+            for section, memory_type in PROFILE_SECTIONS.items()
+        }
+        result["memory_counts"] = dict(profile.type_counts)
+        result["last_interaction"] = (
+            datetime.fromtimestamp(profile.last_interaction).isoformat()
+            if profile.last_interaction is not None else None
+        )
+        return result
 
 
 class AffectiveComputingEngine:
@@ -447,6 +577,7 @@ class NeuralPersonaService:
         self.memory_engine = LongTermMemoryEngine()
         self.affective_engine = AffectiveComputingEngine()
         self.bci_engine = BCIIntegrationEngine()
+        self.shards: Optional[MemoryShardClient] = None  # Memory calls go to the user's shard when set
         logger.info("Neural Persona Service initialized (Memory + Affect + BCI)")
     
     async def store_user_memory(
@@ -457,6 +588,10 @@ class NeuralPersonaService:
         memory_type: str = "conversation"
     ) -> Dict:
         """Store memory with embedding"""
+        if self.shards is not None:
+            return await self.shards.call(
+                user_id, "persona", "store_user_memory", user_id, content, embedding, memory_type
+            )
         memory_id = self.memory_engine.store_memory(
             user_id, content, embedding, memory_type
         )
@@ -473,6 +608,10 @@ class NeuralPersonaService:
         context: str = "general"
     ) -> Dict:
         """Get important memories to proactively share with user"""
+        if self.shards is not None:
+            return await self.shards.call(
+                user_id, "persona", "get_proactive_recall", user_id, query_embedding, context
+            )
         memories = self.memory_engine.retrieve_memories(
             user_id, query_embedding, top_k=3
         )
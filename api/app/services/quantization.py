@@ -0,0 +1,316 @@
+"""
+Vector Quantization - Compact codes for stored memory embeddings
+
+Codecs encode normalised float32 embeddings into small codes and score a
+float32 query directly against the codes (asymmetric distance computation,
+the query is never quantized):
+- Int8Codec: scalar quantization, one int8 per dimension plus a float32
+  scale per vector (~4x smaller). Needs no training.
+- PQCodec: product quantization. The vector is split into n_subspaces
+  chunks, each replaced by the id of its nearest of 256 k-means centroids
+  (one byte per subspace, e.g. 96 bytes for 1536 dims, ~64x smaller). A
+  query builds one (n_subspaces, 256) dot-product table, and a vector's
+  score is the sum of its table entries. The codebooks are trained once
+  train_size vectors have been stored.
+
+VectorFile keeps full-precision copies on disk (memory-mapped), so the best
+approximate candidates can be re-scored exactly without holding float32
+vectors in RAM. Replaced and deleted rows are released, and the file is
+rewritten without them once enough have piled up.
+"""
+
+import os
+import re
+from typing import Dict, Optional, Sequence, Type
+
+import numpy as np
+
+
+class VectorCodec:
+    """Interface of an embedding codec (rows are normalised float32 vectors)"""
+
+    train_size = 0  # Vectors needed by train(); 0 if the codec is ready as built
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    @property
+    def is_trained(self) -> bool:
+        return True
+
+    @property
+    def code_bytes(self) -> int:
+        """Bytes per encoded vector."""
+        return self.empty(1).nbytes
+
+    def train(self, vectors: np.ndarray) -> None:
+        pass
+
+    def empty(self, capacity: int) -> np.ndarray:
+        """Zeroed code array for capacity vectors."""
+        raise NotImplementedError
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Codes of vectors (n, dim)."""
+        raise NotImplementedError
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Approximate float32 vectors (n, dim) of codes."""
+        raise NotImplementedError
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate dot products of a float32 query with every code."""
+        raise NotImplementedError
+
+
+class Int8Codec(VectorCodec):
+    """Per-vector scaled int8 scalar quantization"""
+
+    def __init__(self, dim: int, block_size: int = 4096):
+        super().__init__(dim)
+        self.block_size = block_size  # Rows widened to float32 at a time when scoring
+        self.dtype = np.dtype([("scale", np.float32), ("q", np.int8, (dim,))])
+
+    def empty(self, capacity: int) -> np.ndarray:
+        return np.zeros(capacity, dtype=self.dtype)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        scale = np.abs(vectors).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        codes = self.empty(len(vectors))
+        codes["scale"] = scale
+        codes["q"] = np.round(vectors / scale[:, None])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes["q"].astype(np.float32) * codes["scale"][:, None]
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.block_size):
+            block = codes[start:start + self.block_size]
+            out[start:start + len(block)] = (block["q"].astype(np.float32) @ query) * block["scale"]
+        return out
+
+
+class PQCodec(VectorCodec):
+    """
+    Product quantizer with per-subspace k-means codebooks
+
+    Args:
+        dim: Embedding dimension (a multiple of n_subspaces)
+        n_subspaces: Code bytes per vector
+        n_centroids: Centroids per subspace (at most 256)
+        train_size: Vectors to collect before training
+        iterations: k-means iterations per subspace
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        n_subspaces: int = 96,
+        n_centroids: int = 256,
+        train_size: int = 10000,
+        iterations: int = 10,
+        seed: int = 0,
+        block_size: int = 65536,
+    ):
+        super().__init__(dim)
+        if dim % n_subspaces:
+            raise ValueError(f"{n_subspaces} subspaces do not divide {dim} dimensions")
+        if not 1 < n_centroids <= 256 or train_size < n_centroids:
+            raise ValueError("Need 2-256 centroids and at least that many training vectors")
+        self.n_subspaces = n_subspaces
+        self.sub_dim = dim // n_subspaces
+        self.n_centroids = n_centroids
+        self.train_size = train_size
+        self.iterations = iterations
+        self.block_size = block_size
+        self._rng = np.random.RandomState(seed)
+        self.codebooks: Optional[np.ndarray] = None  # (n_subspaces, n_centroids, sub_dim)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Fit the codebooks on a sample (n >= n_centroids) of vectors."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) > self.train_size:
+            vectors = vectors[self._rng.choice(len(vectors), self.train_size, replace=False)]
+        self.codebooks = np.stack([
+            self._kmeans(vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim])
+            for j in range(self.n_subspaces)
+        ])
+
+    def empty(self, capacity: int) -> np.ndarray:
+        return np.zeros((capacity, self.n_subspaces), dtype=np.uint8)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        codes = self.empty(len(vectors))
+        for j, centroids in enumerate(self.codebooks):
+            sub = vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+            codes[:, j] = self._nearest(sub, centroids)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = self.codebooks[np.arange(self.n_subspaces), codes]  # (n, n_subspaces, sub_dim)
+        return parts.reshape(len(codes), self.dim)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # Dot product of each query chunk with each centroid, then table lookups
+        table = np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.n_subspaces, self.sub_dim))
+        subspaces = np.arange(self.n_subspaces)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.block_size):
+            block = codes[start:start + self.block_size]
+            out[start:start + len(block)] = table[subspaces, block].sum(axis=1)
+        return out
+
+    def _kmeans(self, points: np.ndarray) -> np.ndarray:
+        centroids = points[self._rng.choice(len(points), self.n_centroids, replace=False)].copy()
+        for _ in range(self.iterations):
+            assign = self._nearest(points, centroids)
+            counts = np.bincount(assign, minlength=self.n_centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, points)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            # Re-seed empty clusters from random points
+            empty = int((~filled).sum())
+            if empty:
+                centroids[~filled] = points[self._rng.choice(len(points), empty)]
+        return centroids
+
+    def _nearest(self, points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # argmin ||p - c||^2 == argmin ||c||^2 - 2 p.c, chunked to bound the (n, k) matrix
+        sq_norms = (centroids ** 2).sum(axis=1)
+        out = np.empty(len(points), dtype=np.uint8)
+        for start in range(0, len(points), self.block_size):
+            block = points[start:start + self.block_size]
+            out[start:start + len(block)] = np.argmin(sq_norms - 2.0 * (block @ centroids.T), axis=1)
+        return out
+
+
+# Codecs selectable by name ("float32" means no codec)
+CODEC_TYPES: Dict[str, Type[VectorCodec]] = {"int8": Int8Codec, "pq": PQCodec}
+
+
+def make_codec(kind: str, dim: int, **options) -> Optional[VectorCodec]:
+    """Codec shared by a memory engine's users, e.g. make_codec("pq", 1536, n_subspaces=96)."""
+    if kind == "float32":
+        return None
+    if kind not in CODEC_TYPES:
+        raise ValueError(f"Unknown vector codec: {kind}")
+    return CODEC_TYPES[kind](dim, **options)
+
+
+class VectorFile:
+    """
+    Append-only float32 vector file, read through a memory map
+
+    Rows are addressed by the reference returned from append. Rows that are
+    no longer referenced are released; once they reach compact_ratio of the
+    file (and at least compact_min_rows), needs_compaction is set and the
+    owner rewrites the file with compact(), which renumbers the live rows.
+
+    The file belongs to one process: it is truncated when opened and deleted
+    on close. for_process names it after the pid and first removes files
+    left behind by processes that are gone.
+    """
+
+    _PROCESS_FILE = re.compile(r"vectors-(\d+)\.f32$")
+
+    def __init__(
+        self,
+        path: str,
+        dim: int,
+        compact_ratio: float = 0.5,
+        compact_min_rows: int = 4096,
+        block_rows: int = 4096,
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+        self.block_rows = block_rows  # Rows copied at a time when compacting
+        self.size = 0
+        self.orphaned = 0  # Released rows still taking up space
+        self._file = open(path, "w+b")
+        self._map: Optional[np.memmap] = None
+
+    @classmethod
+    def for_process(cls, directory: str, dim: int, **options) -> "VectorFile":
+        """Open this process's file in directory, removing those of dead processes."""
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                match = cls._PROCESS_FILE.match(name)
+                if match and not _pid_alive(int(match.group(1))):
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:
+                        pass  # Another process removed it first
+        return cls(os.path.join(directory, f"vectors-{os.getpid()}.f32"), dim, **options)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.orphaned >= max(self.compact_min_rows, self.compact_ratio * self.size)
+
+    def append(self, vectors: np.ndarray) -> np.ndarray:
+        """Write vectors (n, dim); returns their row references."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        self._file.write(vectors.tobytes())
+        refs = np.arange(self.size, self.size + len(vectors), dtype=np.int64)
+        self.size += len(vectors)
+        return refs
+
+    def read(self, refs: Sequence[int]) -> np.ndarray:
+        """Vectors at the given references (only their pages are touched)."""
+        if self._map is None or len(self._map) < self.size:
+            self._file.flush()
+            self._map = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.size, self.dim))
+        return np.asarray(self._map[np.asarray(refs, dtype=np.int64)])
+
+    def release(self, refs: Sequence[int]) -> None:
+        """Mark rows as no longer referenced."""
+        self.orphaned += len(refs)
+
+    def compact(self, refs: Sequence[int]) -> np.ndarray:
+        """
+        Rewrite the file with only the given rows, in order.
+
+        Returns:
+            The rows' new references (every other reference becomes invalid)
+        """
+        refs = np.asarray(refs, dtype=np.int64)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            for start in range(0, len(refs), self.block_rows):
+                out.write(self.read(refs[start:start + self.block_rows]).tobytes())
+        self._map = None
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "r+b")
+        self._file.seek(0, os.SEEK_END)
+        self.size = len(refs)
+        self.orphaned = 0
+        return np.arange(self.size, dtype=np.int64)
+
+    def close(self) -> None:
+        self._map = None
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+    return True
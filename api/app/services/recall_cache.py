@@ -0,0 +1,87 @@
+"""
+Recall Cache - Read-mostly cache of memory recall results
+
+Results are keyed by user, a quantized query embedding and the recall
+parameters (top_k, type filter, ...), so near-identical questions within a
+session hit the same entry. Each user has a generation counter: storing or
+consolidating memories bumps it, which invalidates all of that user's
+entries in O(1) (stale entries are dropped lazily). A TTL bounds staleness
+from writes made by other workers.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from app.services.vector_store import normalize
+
+
+class RecallCache:
+    """
+    LRU of recall results with per-user generation invalidation
+
+    Args:
+        max_entries: Entries kept across all users
+        ttl_seconds: Entry lifetime (0 disables expiry)
+        resolution: Quantization steps per unit of a normalised component;
+            lower values merge more queries into one key
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0, resolution: float = 64.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.resolution = resolution
+        self.generations: Dict[str, int] = {}
+        self._entries: "OrderedDict[Tuple[str, bytes], Tuple[int, float, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, query, *params: Hashable) -> bytes:
+        """Cache key of a query embedding plus recall parameters."""
+        q = normalize(query)
+        codes = np.clip(np.round(q * self.resolution), -127, 127).astype(np.int8)
+        h = hashlib.blake2b(codes.tobytes(), digest_size=16)
+        h.update(repr(params).encode())
+        return h.digest()
+
+    def get(self, user_id: str, key: bytes) -> Optional[Any]:
+        entry = self._entries.get((user_id, key))
+        if entry is not None:
+            generation, stored_at, value = entry
+            fresh = not self.ttl_seconds or time.monotonic() - stored_at < self.ttl_seconds
+            if generation == self.generations.get(user_id, 0) and fresh:
+                self._entries.move_to_end((user_id, key))
+                self.stats["hits"] += 1
+                return value
+            del self._entries[(user_id, key)]
+        self.stats["misses"] += 1
+        return None
+
+    def generation(self, user_id: str) -> int:
+        """Current generation of a user, to pass to put after an await."""
+        return self.generations.get(user_id, 0)
+
+    def put(self, user_id: str, key: bytes, value: Any, generation: Optional[int] = None) -> None:
+        """
+        Cache a result.
+
+        `generation` is the user's generation when the result was computed;
+        if the user was invalidated since, the result is stale and dropped.
+        """
+        current = self.generations.get(user_id, 0)
+        if generation is not None and generation != current:
+            return
+        self._entries[(user_id, key)] = (current, time.monotonic(), value)
+        self._entries.move_to_end((user_id, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop all of a user's cached results (bumps the user's generation)."""
+        self.generations[user_id] = self.generations.get(user_id, 0) + 1
+        self.stats["invalidations"] += 1
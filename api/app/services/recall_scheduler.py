@@ -0,0 +1,302 @@
+"""
+Recall Scheduler - Time-indexed proactive recall
+
+When a memory is stored, a date is extracted from its text ("June 5th",
+"2026-03-14", "tomorrow", "in 3 days", "on Friday") and a Reminder is
+scheduled at event time minus the memory type's lead time (recall_triggers).
+Birthdays and anniversaries recur yearly.
+
+Reminders sit in min-heaps keyed by trigger time:
+- one per user, so due(user_id) pops that user's due reminders in O(log n)
+- one global, fed only while the push task runs, so it sleeps until the
+  earliest trigger instead of scanning users
+
+A reminder popped from one heap (or cancelled) is marked delivered and
+skipped (lazily deleted) when it reaches the top of another. A heap is
+rebuilt once its delivered entries pass compact_threshold and outnumber
+its pending ones, and a user's heap is dropped when nothing is pending.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Memory types that repeat every year
+RECURRING_TYPES = {"birthday", "anniversary"}
+
+_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"),
+        ("may",), ("jun", "june"), ("jul", "july"), ("aug", "august"),
+        ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"), ("dec", "december"),
+    ], start=1)
+    for name in names
+}
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+_MONTH = r"(?P<month>" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+_DAY = r"(?P<day>\d{1,2})(?:st|nd|rd|th)?"
+_YEAR = r"(?:,?\s+(?P<year>\d{4}))?"
+_DATE_PATTERNS = [
+    re.compile(r"\b(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})\b"),
+    re.compile(r"\b" + _MONTH + r"\s+" + _DAY + r"\b" + _YEAR, re.IGNORECASE),
+    re.compile(r"\b" + _DAY + r"\s+(?:of\s+)?" + _MONTH + r"\b" + _YEAR, re.IGNORECASE),
+]
+_RELATIVE = re.compile(r"\b(?:(?P<today>today|tonight)|(?P<tomorrow>tomorrow)|in\s+(?P<n>\d+)\s+(?P<unit>day|week)s?)\b", re.IGNORECASE)
+_WEEKDAY = re.compile(r"\b(?:on|next|this)\s+(?P<weekday>" + "|".join(_WEEKDAYS) + r")\b", re.IGNORECASE)
+
+
+def extract_event_date(text: str, now: datetime, recurring: bool = False) -> Optional[datetime]:
+    """
+    Find the date a memory refers to (midnight of that day).
+
+    Dates without a year resolve to their next occurrence; with
+    recurring=True, past dates roll forward to the next anniversary.
+    """
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    for pattern in _DATE_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        month = match.group("month")
+        month = int(month) if month.isdigit() else _MONTHS[month.lower().rstrip(".")]
+        year = match.group("year")
+        try:
+            date = today.replace(year=int(year) if year else today.year, month=month, day=int(match.group("day")))
+        except ValueError:
+            continue
+        if date < today and (recurring or not year):
+            date = _next_year(date)
+        return date
+
+    match = _RELATIVE.search(text)
+    if match:
+        if match.group("today"):
+            return today
+        if match.group("tomorrow"):
+            return today + timedelta(days=1)
+        days = int(match.group("n")) * (7 if match.group("unit").lower() == "week" else 1)
+        return today + timedelta(days=days)
+
+    match = _WEEKDAY.search(text)
+    if match:
+        ahead = (_WEEKDAYS.index(match.group("weekday").lower()) - today.weekday()) % 7
+        return today + timedelta(days=ahead or 7)
+    return None
+
+
+def _next_year(date: datetime) -> datetime:
+    try:
+        return date.replace(year=date.year + 1)
+    except ValueError:  # Feb 29
+        return date.replace(year=date.year + 1, day=28)
+
+
+class Reminder:
+    """A scheduled proactive recall of one memory"""
+
+    __slots__ = ("trigger_ts", "event_ts", "user_id", "memory", "memory_type", "delivered")
+
+    def __init__(self, trigger_ts: float, event_ts: float, user_id: str, memory, memory_type: str):
+        self.trigger_ts = trigger_ts
+        self.event_ts = event_ts
+        self.user_id = user_id
+        self.memory = memory
+        self.memory_type = memory_type
+        self.delivered = False
+
+    @property
+    def event_at(self) -> datetime:
+        return datetime.fromtimestamp(self.event_ts)
+
+
+class RecallScheduler:
+    """
+    Per-user and global min-heaps of reminders keyed by trigger time
+
+    Args:
+        lead_hours: memory_type -> hours before the event to remind
+        compact_threshold: Delivered entries a heap may hold before it is rebuilt
+    """
+
+    def __init__(self, lead_hours: Dict[str, float], compact_threshold: int = 64):
+        self.lead_hours = lead_hours
+        self.compact_threshold = compact_threshold
+        self._user_heaps: Dict[str, List[Tuple[float, int, Reminder]]] = {}
+        self._global_heap: List[Tuple[float, int, Reminder]] = []  # Only while the push task runs
+        self._by_memory: Dict[str, Reminder] = {}  # memory id -> pending reminder
+        self._user_pending: Dict[str, int] = {}  # user_id -> pending reminders
+        self._seq = itertools.count()  # Tie-breaker, Reminders are not comparable
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._by_memory)
+
+    def schedule(
+        self,
+        user_id: str,
+        memory,
+        text: str,
+        memory_type: str,
+        now: Optional[datetime] = None,
+    ) -> Optional[Reminder]:
+        """Schedule a reminder for a memory if its type has a lead time and its text a date."""
+        if memory_type not in self.lead_hours:
+            return None
+        now = now or datetime.now()
+        event = extract_event_date(text, now, recurring=memory_type in RECURRING_TYPES)
+        if event is None or event < now.replace(hour=0, minute=0, second=0, microsecond=0):
+            return None
+        trigger = max(event - timedelta(hours=self.lead_hours[memory_type]), now)
+        reminder = Reminder(trigger.timestamp(), event.timestamp(), user_id, memory, memory_type)
+        self.cancel(memory.id)
+        self._push(reminder)
+        return reminder
+
+    def cancel(self, memory_id: str) -> None:
+        """Drop the pending reminder of a memory (lazily removed from the heaps)."""
+        reminder = self._by_memory.pop(memory_id, None)
+        if reminder is not None:
+            self._retire(reminder)
+            self._compact_user(reminder.user_id)
+            self._compact_global()
+
+    def due(self, user_id: str, now: Optional[datetime] = None, limit: Optional[int] = None) -> List[Reminder]:
+        """Pop up to limit reminders of a user whose trigger time has passed."""
+        heap = self._user_heaps.get(user_id)
+        if not heap:
+            return []
+        now_ts = (now or datetime.now()).timestamp()
+        reminders = self._pop_due(heap, now_ts, limit)
+        self._compact_user(user_id)
+        self._compact_global()
+        return reminders
+
+    def pop_all_due(self, now: Optional[datetime] = None) -> List[Reminder]:
+        """Pop every due reminder of every user (for push delivery)."""
+        now_ts = (now or datetime.now()).timestamp()
+        if self._task is None:
+            # No global heap without the push task; walk the user heaps
+            reminders = []
+            for user_id in list(self._user_heaps):
+                reminders.extend(self.due(user_id, now))
+            return reminders
+        reminders = self._pop_due(self._global_heap, now_ts, None)
+        for user_id in {reminder.user_id for reminder in reminders}:
+            self._compact_user(user_id)
+        return reminders
+
+    def next_trigger(self) -> Optional[float]:
+        """Earliest pending trigger time (epoch seconds), if any."""
+        heap = self._global_heap
+        while heap and heap[0][2].delivered:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def start(self, deliver: Callable[[Reminder], Awaitable[None]]) -> None:
+        """Start the background task that pushes reminders as they fall due."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run(deliver))
+            # Seed the global heap with everything already pending
+            self._global_heap = [
+                (reminder.trigger_ts, next(self._seq), reminder) for reminder in self._by_memory.values()
+            ]
+            heapq.heapify(self._global_heap)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+            self._global_heap = []
+
+    async def _run(self, deliver: Callable[[Reminder], Awaitable[None]]) -> None:
+        while True:
+            next_ts = self.next_trigger()
+            timeout = None if next_ts is None else max(0.0, next_ts - datetime.now().timestamp())
+            try:
+                # Woken early when an earlier reminder is scheduled
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            for reminder in self.pop_all_due():
+                try:
+                    await deliver(reminder)
+                except Exception as e:
+                    logger.error(f"Proactive recall delivery failed for {reminder.user_id}: {e}")
+
+    def _push(self, reminder: Reminder) -> None:
+        entry = (reminder.trigger_ts, next(self._seq), reminder)
+        heapq.heappush(self._user_heaps.setdefault(reminder.user_id, []), entry)
+        self._by_memory[reminder.memory.id] = reminder
+        self._user_pending[reminder.user_id] = self._user_pending.get(reminder.user_id, 0) + 1
+        if self._task is not None:
+            heapq.heappush(self._global_heap, entry)
+            if self._global_heap[0] is entry:
+                self._wakeup.set()
+
+    def _retire(self, reminder: Reminder) -> None:
+        reminder.delivered = True
+        remaining = self._user_pending[reminder.user_id] - 1
+        if remaining:
+            self._user_pending[reminder.user_id] = remaining
+        else:
+            del self._user_pending[reminder.user_id]
+
+    def _compact_user(self, user_id: str) -> None:
+        heap = self._user_heaps.get(user_id)
+        if heap is None:
+            return
+        pending = self._user_pending.get(user_id, 0)
+        if not pending:
+            del self._user_heaps[user_id]
+        elif self._needs_compaction(heap, pending):
+            self._user_heaps[user_id] = self._compacted(heap)
+
+    def _compact_global(self) -> None:
+        if self._task is not None and self._needs_compaction(self._global_heap, len(self._by_memory)):
+            self._global_heap = self._compacted(self._global_heap)
+
+    def _needs_compaction(self, heap: List[Tuple[float, int, Reminder]], pending: int) -> bool:
+        stale = len(heap) - pending
+        return stale >= self.compact_threshold and stale > pending
+
+    @staticmethod
+    def _compacted(heap: List[Tuple[float, int, Reminder]]) -> List[Tuple[float, int, Reminder]]:
+        live = [entry for entry in heap if not entry[2].delivered]
+        heapq.heapify(live)
+        return live
+
+    def _pop_due(self, heap: List[Tuple[float, int, Reminder]], now_ts: float, limit: Optional[int]) -> List[Reminder]:
+        reminders = []
+        while heap and heap[0][0] <= now_ts and (limit is None or len(reminders) < limit):
+            reminder = heapq.heappop(heap)[2]
+            if reminder.delivered:
+                continue
+            self._retire(reminder)
+            reminders.append(reminder)
+            self._by_memory.pop(reminder.memory.id, None)
+            if reminder.memory_type in RECURRING_TYPES:
+                self._reschedule_next_year(reminder)
+        return reminders
+
+    def _reschedule_next_year(self, reminder: Reminder) -> None:
+        event = _next_year(reminder.event_at)
+        trigger = event - timedelta(hours=self.lead_hours[reminder.memory_type])
+        again = Reminder(trigger.timestamp(), event.timestamp(), reminder.user_id, reminder.memory, reminder.memory_type)
+        self._push(again)
@@ -0,0 +1,432 @@
+"""
+Translation Cache - Two-tier cache for GlobalTranslator
+
+- Local tier: in-process LRU bounded by max_entries, entries expire after
+  ttl_seconds
+- Shared tier (optional): the translation_cache table (PostgresTranslationTier)
+  or a Redis-compatible store (RedisTranslationTier), shared by all workers
+
+Local misses are looked up in the shared tier and promoted. Shared-tier
+writes and hit counters are write-behind: new translations and per-entry
+hit increments are buffered and flushed in one batch when batch_size
+changes are pending or flush_interval_ms after the first one, so a hot
+phrase costs one cache_hits/last_used update per flush instead of one per
+request. Hits and misses are counted per language pair (see hit_ratios).
+"""
+
+import asyncio
+import hashlib
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (text, source_language, target_language)
+CacheKey = Tuple[str, str, str]
+# (translated_text, confidence)
+CacheValue = Tuple[str, float]
+
+
+class LocalTranslationCache:
+    """
+    LRU of translations with a TTL
+
+    Args:
+        max_entries: Entries kept (least recently used dropped first)
+        ttl_seconds: Entry lifetime (0 disables expiry)
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, Tuple[float, CacheValue]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> Optional[CacheValue]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self.ttl_seconds and time.monotonic() - stored_at >= self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: CacheKey, value: CacheValue) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SharedTranslationTier:
+    """
+    Interface of a cache tier shared by workers
+
+    Subclasses implement connect, close, get_many, put_many and add_hits.
+    """
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get_many(self, keys: List[CacheKey]) -> Dict[CacheKey, CacheValue]:
+        """Cached translations of the keys that are present."""
+        raise NotImplementedError
+
+    async def put_many(self, entries: Dict[CacheKey, CacheValue]) -> None:
+        """Insert or replace translations."""
+        raise NotImplementedError
+
+    async def add_hits(self, hits: Dict[CacheKey, Tuple[int, float]]) -> None:
+        """Add hit counts and set last-used times (epoch seconds) of existing entries."""
+        raise NotImplementedError
+
+
+class PostgresTranslationTier(SharedTranslationTier):
+    """translation_cache table through an asyncpg pool (one statement per batch)"""
+
+    GET_SQL = """
+        SELECT t.source_text, t.source_language, t.target_language, t.translated_text, t.confidence_score
+        FROM translation_cache t
+        JOIN unnest($1::text[], $2::text[], $3::text[]) AS k(source_text, source_language, target_language)
+          USING (source_text, source_language, target_language)
+    """
+
+    PUT_SQL = """
+        INSERT INTO translation_cache (source_text, source_language, target_language, translated_text, confidence_score)
+        SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::float8[])
+        ON CONFLICT (source_text, source_language, target_language) DO UPDATE
+        SET translated_text = EXCLUDED.translated_text,
+            confidence_score = EXCLUDED.confidence_score,
+            last_used = CURRENT_TIMESTAMP
+    """
+
+    HITS_SQL = """
+        UPDATE translation_cache t
+        SET cache_hits = t.cache_hits + u.hits,
+            last_used = GREATEST(t.last_used, u.last_used)
+        FROM unnest($1::text[], $2::text[], $3::text[], $4::int[], $5::timestamp[])
+          AS u(source_text, source_language, target_language, hits, last_used)
+        WHERE t.source_text = u.source_text
+          AND t.source_language = u.source_language
+          AND t.target_language = u.target_language
+    """
+
+    def __init__(self, dsn: str, pool_size: int = 5):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.pool = None
+
+    async def connect(self) -> None:
+        import asyncpg  # Optional dependency
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def get_many(self, keys):
+        texts, sources, targets = (list(column) for column in zip(*keys))
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(self.GET_SQL, texts, sources, targets)
+        return {
+            (row["source_text"], row["source_language"], row["target_language"]):
+                (row["translated_text"], row["confidence_score"])
+            for row in rows
+        }
+
+    async def put_many(self, entries):
+        keys = list(entries)
+        columns = [list(column) for column in zip(*keys)]
+        values = [entries[k] for k in keys]
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                self.PUT_SQL, *columns, [v[0] for v in values], [v[1] for v in values]
+            )
+
+    async def add_hits(self, hits):
+        keys = list(hits)
+        columns = [list(column) for column in zip(*keys)]
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                self.HITS_SQL, *columns,
+                [hits[k][0] for k in keys],
+                [datetime.fromtimestamp(hits[k][1]) for k in keys],
+            )
+
+
+class RedisTranslationTier(SharedTranslationTier):
+    """
+    Redis-compatible store (redis.asyncio API: pipeline, hmget, hset,
+    hincrby, expire); one hash per translation, expiring ttl_seconds after
+    its last write or hit
+
+    Args:
+        client: redis.asyncio client, or anything implementing that subset
+        ttl_seconds: Entry lifetime in the store
+    """
+
+    PREFIX = "translation:"
+
+    def __init__(self, client, ttl_seconds: int = 86400):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+
+    @classmethod
+    def from_url(cls, url: str, ttl_seconds: int = 86400) -> "RedisTranslationTier":
+        import redis.asyncio as redis  # Optional dependency
+
+        return cls(redis.from_url(url), ttl_seconds)
+
+    async def close(self) -> None:
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+    def _key(self, key: CacheKey) -> str:
+        return self.PREFIX + hashlib.md5("|".join(key).encode()).hexdigest()
+
+    async def get_many(self, keys):
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.hmget(self._key(key), "translated", "confidence")
+        rows = await pipe.execute()
+        found = {}
+        for key, (translated, confidence) in zip(keys, rows):
+            if translated is not None:
+                if isinstance(translated, bytes):
+                    translated = translated.decode()
+                found[key] = (translated, float(confidence))
+        return found
+
+    async def put_many(self, entries):
+        pipe = self.client.pipeline()
+        for key, (translated, confidence) in entries.items():
+            name = self._key(key)
+            pipe.hset(name, mapping={"translated": translated, "confidence": confidence})
+            pipe.expire(name, self.ttl_seconds)
+        await pipe.execute()
+
+    async def add_hits(self, hits):
+        pipe = self.client.pipeline()
+        for key, (count, last_used) in hits.items():
+            name = self._key(key)
+            pipe.hincrby(name, "hits", count)
+            pipe.hset(name, mapping={"last_used": last_used})
+            pipe.expire(name, self.ttl_seconds)
+        await pipe.execute()
+
+
+class TranslationCache:
+    """
+    Local LRU in front of an optional shared tier, with write-behind batching
+
+    Args:
+        local: In-process tier
+        shared: Tier shared by all workers (None = local only)
+        batch_size: Pending writes + hit updates that trigger a flush
+        flush_interval_ms: Delay before pending changes are flushed
+        max_pending_batches: Batches kept for retry while the shared tier
+            fails; beyond that, hit updates and then the oldest writes are
+            dropped (counted in stats)
+    """
+
+    def __init__(
+        self,
+        local: Optional[LocalTranslationCache] = None,
+        shared: Optional[SharedTranslationTier] = None,
+        batch_size: int = 100,
+        flush_interval_ms: float = 200.0,
+        max_pending_batches: int = 10,
+    ):
+        self.local = local or LocalTranslationCache()
+        self.shared = shared
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.max_pending = batch_size * max_pending_batches
+        self._pending_writes: Dict[CacheKey, CacheValue] = {}
+        self._pending_hits: Dict[CacheKey, List] = {}  # key -> [count, last used]
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_pinned = False  # The scheduled flush is immediate or a retry, don't replace it
+        self._flushing = 0  # Flushes running or waiting for the lock
+        self._flush_lock = asyncio.Lock()
+        self.pair_stats: Dict[str, Dict[str, int]] = {}  # "en->fr" -> local_hits / shared_hits / misses
+        self.stats = {
+            "shared_writes": 0, "shared_hit_updates": 0, "flushes": 0,
+            "dropped_writes": 0, "dropped_hit_updates": 0,
+        }
+
+    async def get(self, text: str, source: str, target: str) -> Optional[CacheValue]:
+        """Cached translation of text, from the local or the shared tier."""
+        return (await self.get_many([(text, source, target)])).get((text, source, target))
+
+    async def get_many(self, keys: Iterable[CacheKey]) -> Dict[CacheKey, CacheValue]:
+        """Cached translations of the keys present in either tier (one shared lookup)."""
+        found: Dict[CacheKey, CacheValue] = {}
+        missing: List[CacheKey] = []
+        for key in dict.fromkeys(keys):
+            value = self.local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+                self._count(key, "local_hits")
+                self._hit(key)
+
+        if missing and self.shared is not None:
+            try:
+                shared = await self.shared.get_many(missing)
+            except Exception as e:
+                logger.error(f"Shared translation cache lookup failed: {e}")
+                shared = {}
+            for key, value in shared.items():
+                self.local.put(key, value)
+                found[key] = value
+                self._count(key, "shared_hits")
+                self._hit(key)
+            missing = [key for key in missing if key not in shared]
+
+        for key in missing:
+            self._count(key, "misses")
+        self._schedule_flush()
+        return found
+
+    async def put(self, text: str, source: str, target: str, translated: str, confidence: float) -> None:
+        """Cache a new translation (written to the shared tier in the next flush)."""
+        key = (text, source, target)
+        self.local.put(key, (translated, confidence))
+        if self.shared is not None:
+            self._pending_writes[key] = (translated, confidence)
+            self._schedule_flush()
+
+    async def flush(self) -> None:
+        """
+        Write pending translations and hit counts to the shared tier.
+
+        Changes queued while it runs are flushed afterwards (immediately if
+        they fill a batch); after a failure, the retry waits flush_interval_ms.
+        """
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+            self._flush_pinned = False
+        self._flushing += 1
+        failed = True
+        try:
+            await self._write_pending()
+            failed = False
+        finally:
+            self._flushing -= 1
+            if not self._flushing:
+                self._schedule_flush(retry=failed)
+
+    async def _write_pending(self) -> None:
+        async with self._flush_lock:
+            writes, self._pending_writes = self._pending_writes, {}
+            hits, self._pending_hits = self._pending_hits, {}
+            if self.shared is None or not (writes or hits):
+                return
+            try:
+                if writes:
+                    await self.shared.put_many(writes)
+                if hits:
+                    await self.shared.add_hits({key: (count, last) for key, (count, last) in hits.items()})
+            except Exception:
+                # Keep the changes for the next flush (newer values win)
+                self._pending_writes = {**writes, **self._pending_writes}
+                for key, (count, last) in hits.items():
+                    self._add_hit(key, count, last)
+                self._trim_pending()
+                raise
+            self.stats["shared_writes"] += len(writes)
+            self.stats["shared_hit_updates"] += len(hits)
+            self.stats["flushes"] += 1
+
+    async def close(self) -> None:
+        await self.flush()
+        if self.shared is not None:
+            await self.shared.close()
+
+    def hit_ratios(self) -> Dict[str, Dict[str, float]]:
+        """Per language pair: lookups, hit ratio and the share served by each tier."""
+        ratios = {}
+        for pair, counts in self.pair_stats.items():
+            lookups = counts["local_hits"] + counts["shared_hits"] + counts["misses"]
+            ratios[pair] = {
+                "lookups": lookups,
+                "hit_ratio": (counts["local_hits"] + counts["shared_hits"]) / lookups,
+                "local_hit_ratio": counts["local_hits"] / lookups,
+                "shared_hit_ratio": counts["shared_hits"] / lookups,
+            }
+        return ratios
+
+    def _count(self, key: CacheKey, outcome: str) -> None:
+        pair = f"{key[1]}->{key[2]}"
+        counts = self.pair_stats.get(pair)
+        if counts is None:
+            counts = self.pair_stats[pair] = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+        counts[outcome] += 1
+
+    def _hit(self, key: CacheKey) -> None:
+        if self.shared is not None:
+            self._add_hit(key, 1, time.time())
+
+    def _add_hit(self, key: CacheKey, count: int, last_used: float) -> None:
+        pending = self._pending_hits.get(key)
+        if pending is None:
+            self._pending_hits[key] = [count, last_used]
+        else:
+            pending[0] += count
+            pending[1] = max(pending[1], last_used)
+
+    def _trim_pending(self) -> None:
+        """Bound the retained changes: hit updates go first, then the oldest writes"""
+        excess = len(self._pending_writes) + len(self._pending_hits) - self.max_pending
+        if excess <= 0:
+            return
+        hits = min(excess, len(self._pending_hits))
+        for key in list(itertools.islice(self._pending_hits, hits)):
+            del self._pending_hits[key]
+        writes = excess - hits
+        for key in list(itertools.islice(self._pending_writes, writes)):
+            del self._pending_writes[key]
+        self.stats["dropped_hit_updates"] += hits
+        self.stats["dropped_writes"] += writes
+        logger.warning(f"Translation cache dropped {writes} writes and {hits} hit updates (shared tier failing)")
+
+    def _schedule_flush(self, retry: bool = False) -> None:
+        if self.shared is None or not (self._pending_writes or self._pending_hits):
+            return
+        if self._flushing:
+            return  # The running flush schedules the next one when it ends
+        full = len(self._pending_writes) + len(self._pending_hits) >= self.batch_size
+        if self._flush_task is not None:
+            if self._flush_pinned or not full:
+                return
+            # Still sleeping the interval (it clears _flush_task before flushing)
+            self._flush_task.cancel()
+        self._flush_pinned = full or retry
+        delay = 0.0 if full and not retry else self.flush_interval_ms / 1000.0
+        self._flush_task = asyncio.ensure_future(self._flush_after(delay))
+
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        self._flush_pinned = False
+        try:
+            await self.flush()
+        except Exception as e:
+            pending = len(self._pending_writes) + len(self._pending_hits)
+            logger.error(f"Translation cache flush failed ({pending} changes pending): {e}")
@@ -0,0 +1,115 @@
+"""
+Translation Providers - Multi-segment translation backends for GlobalTranslator
+
+A provider translates a list of segments in one request. max_segments and
+max_chars are the per-request limits GlobalTranslator.batch_translate
+packs chunks against, and supports() tells it which language pairs the
+provider can serve.
+
+- PlaceholderProvider: simulated latency, no external calls (default)
+- DeepLProvider: DeepL API through the `deepl` SDK (up to 50 texts/request)
+- GoogleTranslateProvider: Cloud Translation v2 REST API through httpx
+  (up to 128 segments/request)
+"""
+
+import asyncio
+from typing import List
+
+
+class TranslationProvider:
+    """Interface of a batch translation backend"""
+
+    name = "base"
+    max_segments = 50  # Segments per request
+    max_chars = 5000  # Characters per request
+
+    def supports(self, source: str, target: str) -> bool:
+        """Whether the provider translates from source to target (Language codes)."""
+        return True
+
+    async def translate_batch(self, texts: List[str], source: str, target: str) -> List[str]:
+        """Translations of texts, in order, from one provider request."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class PlaceholderProvider(TranslationProvider):
+    """Simulated provider: one round-trip of `latency_seconds` per request"""
+
+    name = "placeholder"
+
+    def __init__(self, latency_seconds: float = 0.1):
+        self.latency_seconds = latency_seconds
+
+    async def translate_batch(self, texts, source, target):
+        await asyncio.sleep(self.latency_seconds)  # Simulate API call
+        return [f"[Translated from {source} to {target}]: {text}" for text in texts]
+
+
+class DeepLProvider(TranslationProvider):
+    """DeepL through its SDK; the blocking client runs on a worker thread"""
+
+    name = "deepl"
+    max_segments = 50
+    max_chars = 30000  # Requests are limited to 128 KiB
+
+    # Language codes -> DeepL source codes (regional variants are not sources)
+    SOURCE_LANGUAGES = {
+        "ar": "AR", "cs": "CS", "da": "DA", "de": "DE", "el": "EL", "en": "EN",
+        "es": "ES", "fi": "FI", "fr": "FR", "hu": "HU", "id": "ID", "it": "IT",
+        "ja": "JA", "ko": "KO", "nl": "NL", "no": "NB", "pl": "PL", "pt": "PT",
+        "ro": "RO", "ru": "RU", "sv": "SV", "tr": "TR", "zh-CN": "ZH", "zh-TW": "ZH",
+    }
+    # Language codes -> DeepL target codes ("EN" and "PT" alone are deprecated)
+    TARGET_LANGUAGES = {
+        **SOURCE_LANGUAGES,
+        "en": "EN-US", "pt": "PT-PT", "zh-CN": "ZH-HANS", "zh-TW": "ZH-HANT",
+    }
+
+    def __init__(self, api_key: str):
+        import deepl  # Optional dependency
+
+        self.client = deepl.Translator(api_key)
+
+    def supports(self, source, target):
+        return source in self.SOURCE_LANGUAGES and target in self.TARGET_LANGUAGES
+
+    async def translate_batch(self, texts, source, target):
+        if not self.supports(source, target):
+            raise ValueError(f"DeepL does not translate {source} -> {target}")
+        results = await asyncio.to_thread(
+            self.client.translate_text,
+            texts,
+            source_lang=self.SOURCE_LANGUAGES[source],
+            target_lang=self.TARGET_LANGUAGES[target],
+        )
+        return [result.text for result in results]
+
+
+class GoogleTranslateProvider(TranslationProvider):
+    """Google Cloud Translation v2 (API key auth)"""
+
+    name = "google"
+    max_segments = 128
+    max_chars = 5000  # Recommended maximum per request
+    URL = "https://translation.googleapis.com/language/translate/v2"
+
+    def __init__(self, api_key: str, timeout_seconds: float = 10.0):
+        import httpx  # Optional dependency
+
+        self.api_key = api_key
+        self.client = httpx.AsyncClient(timeout=timeout_seconds)
+
+    async def translate_batch(self, texts, source, target):
+        response = await self.client.post(
+            self.URL,
+            params={"key": self.api_key},
+            json={"q": texts, "source": source, "target": target, "format": "text"},
+        )
+        response.raise_for_status()
+        return [t["translatedText"] for t in response.json()["data"]["translations"]]
+
+    async def close(self) -> None:
+        await self.client.aclose()
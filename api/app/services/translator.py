@@ -4,11 +4,15 @@ Supports 100+ languages with Speech-to-Speech (S2S) translation
 Target latency: < 500ms for real-time conversation feel
 """
 
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import asyncio
+import functools
 from enum import Enum
 import hashlib
 
+from app.services.translation_cache import TranslationCache
+from app.services.translation_providers import PlaceholderProvider, TranslationProvider
+
 class Language(str, Enum):
     """Supported languages for translation"""
     # Major languages
@@ -54,7 +58,11 @@ class GlobalTranslator:
     """
     Real-time translator for 100+ languages
     Features:
-    - Caching for performance
+    - Caching for performance (local LRU + shared tier, see translation_cache)
+    - Single-flight provider calls: concurrent misses for the same
+      (text, source, target) share one in-flight request
+    - Batched provider requests (see batch_translate), at most
+      provider_slots requests in flight
     - Sentiment preservation
     - Accent cloning
     - Low latency optimization
@@ -62,7 +70,12 @@ class GlobalTranslator:
 
     def __init__(self):
         self.supported_languages = [lang.value for lang in Language]
-        self.cache: Dict[str, str] = {}
+        self.cache = TranslationCache()  # main.py attaches the shared tier
+        self.provider: TranslationProvider = PlaceholderProvider()  # main.py picks the configured one
+        self.provider_slots = asyncio.Semaphore(4)  # Concurrent provider requests
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self._requests = set()  # Running batch requests (keeps the tasks referenced)
+        self.stats = {"provider_calls": 0, "provider_segments": 0, "coalesced_calls": 0}
         self.latency_target_ms = 500
         self.sentiment_preservation = True
         
@@ -108,30 +121,63 @@ class GlobalTranslator:
         """
         
         # Check cache first
-        cache_key = self.get_cache_key(text, source_language, target_language)
-        if cache_key in self.cache:
-            return self.cache[cache_key], 0.95, True
+        cached = await self.cache.get(text, source_language, target_language)
+        if cached is not None:
+            return cached[0], 0.95, True
         
         # Validate languages
         if source_language not in self.supported_languages:
             raise ValueError(f"Unsupported source language: {source_language}")
         if target_language not in self.supported_languages:
             raise ValueError(f"Unsupported target language: {target_language}")
+        if source_language != target_language and not self.provider.supports(source_language, target_language):
+            raise ValueError(
+                f"{self.provider.name} does not translate {source_language} -> {target_language}"
+            )
         
         # If same language, return as-is
         if source_language == target_language:
             return text, 1.0, False
         
+        # Concurrent misses for the same key join the request already in flight.
+        # Callers await it shielded, so a cancelled caller does not cancel the others.
+        key = (text, source_language, target_language)
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._translate_uncached(*key))
+            self._inflight[key] = flight
+            flight.add_done_callback(lambda task: self._land(key, task))
+        else:
+            self.stats["coalesced_calls"] += 1
+        translated = await asyncio.shield(flight)
+        
+        return translated, 0.92, False
+
+    async def _translate_uncached(self, text: str, source: str, target: str) -> str:
+        """Provider call for a cache miss, then cache the result"""
         # In production, would call actual translation API (Google Translate, etc.)
         # For now, return placeholder with high confidence
-        translated = await self._call_translation_api(
-            text, source_language, target_language
-        )
+        async with self.provider_slots:
+            self.stats["provider_calls"] += 1
+            self.stats["provider_segments"] += 1
+            translated = await self._call_translation_api(text, source, target)
         
         # Cache result
-        self.cache[cache_key] = translated
-        
-        return translated, 0.92, False
+        await self.cache.put(text, source, target, translated, 0.92)
+        return translated
+
+    @staticmethod
+    def _abandon(futures: List[asyncio.Future], request: asyncio.Future) -> None:
+        # A request cancelled (even before it started) leaves futures unresolved:
+        # cancel them so waiters fail and _land clears their keys
+        for future in futures:
+            future.cancel()
+
+    def _land(self, key: Tuple[str, str, str], task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved even if every caller was cancelled
 
     async def speech_to_speech(
         self,
@@ -213,13 +259,87 @@ class GlobalTranslator:
         """
         Translate multiple texts efficiently
         Useful for translating conversation history
+        
+        Duplicates are translated once and cache hits are not sent. The
+        misses are packed into chunks within the provider's max_segments
+        and max_chars, one provider request per chunk, and texts already in
+        flight join that request. Results are in input order.
         """
-        tasks = [
-            self.translate(text, source_language, target_language)
-            for text in texts
-        ]
-        results = await asyncio.gather(*tasks)
-        return [(result[0], result[1]) for result in results]
+        if source_language not in self.supported_languages:
+            raise ValueError(f"Unsupported source language: {source_language}")
+        if target_language not in self.supported_languages:
+            raise ValueError(f"Unsupported target language: {target_language}")
+        if source_language != target_language and not self.provider.supports(source_language, target_language):
+            raise ValueError(
+                f"{self.provider.name} does not translate {source_language} -> {target_language}"
+            )
+        if source_language == target_language:
+            return [(text, 1.0) for text in texts]
+        
+        keys = [(text, source_language, target_language) for text in dict.fromkeys(texts)]
+        cached = await self.cache.get_many(keys)
+        
+        flights: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        misses = []
+        for key in keys:
+            if key in cached:
+                continue
+            flight = self._inflight.get(key)
+            if flight is None:
+                misses.append(key)
+            else:
+                self.stats["coalesced_calls"] += 1
+                flights[key] = flight
+        
+        loop = asyncio.get_running_loop()
+        for chunk in self._chunks(misses):
+            futures = [loop.create_future() for _ in chunk]
+            for key, future in zip(chunk, futures):
+                self._inflight[key] = flights[key] = future
+                future.add_done_callback(functools.partial(self._land, key))
+            request = asyncio.ensure_future(self._translate_chunk(chunk, futures))
+            self._requests.add(request)
+            request.add_done_callback(self._requests.discard)
+            request.add_done_callback(functools.partial(self._abandon, futures))
+        
+        translated = await asyncio.gather(*(asyncio.shield(f) for f in flights.values()))
+        translated = dict(zip(flights, translated))
+        results = []
+        for text in texts:
+            key = (text, source_language, target_language)
+            results.append((cached[key][0], 0.95) if key in cached else (translated[key], 0.92))
+        return results
+
+    def _chunks(self, keys: List[Tuple[str, str, str]]) -> Iterator[List[Tuple[str, str, str]]]:
+        """Split keys into runs within the provider's per-request limits"""
+        chunk, chars = [], 0
+        for key in keys:
+            size = len(key[0])
+            if chunk and (len(chunk) >= self.provider.max_segments or chars + size > self.provider.max_chars):
+                yield chunk
+                chunk, chars = [], 0
+            chunk.append(key)
+            chars += size
+        if chunk:
+            yield chunk
+
+    async def _translate_chunk(self, chunk: List[Tuple[str, str, str]], futures: List[asyncio.Future]) -> None:
+        """One multi-segment provider request; resolves each segment's future"""
+        _, source, target = chunk[0]
+        try:
+            async with self.provider_slots:
+                self.stats["provider_calls"] += 1
+                self.stats["provider_segments"] += len(chunk)
+                translations = await self.provider.translate_batch([key[0] for key in chunk], source, target)
+            if len(translations) != len(chunk):
+                raise RuntimeError(f"Provider returned {len(translations)} translations for {len(chunk)} texts")
+            for key, translated, future in zip(chunk, translations, futures):
+                await self.cache.put(*key, translated, 0.92)
+                future.set_result(translated)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
 
     async def detect_language(self, text: str) -> Tuple[str, float]:
         """
@@ -244,10 +364,9 @@ class GlobalTranslator:
         - Google Translate API
         - Microsoft Translator
         - DeepL
+        (see translation_providers)
         """
-        # Placeholder implementation
-        await asyncio.sleep(0.1)  # Simulate API call
-        return f"[Translated from {source} to {target}]: {text}"
+        return (await self.provider.translate_batch([text], source, target))[0]
 
     async def _speech_recognition(
         self,
@@ -0,0 +1,401 @@
+"""
+Vector Store - Contiguous embedding storage for memory recall
+
+Embeddings are kept L2-normalised in one preallocated float32 matrix per
+user (grown by doubling), with per-row metadata in parallel numpy arrays.
+A query is then a single matrix-vector product and an argpartition instead
+of a Python loop over memory objects.
+
+UserVectorStore keeps one matrix per user and, past a size threshold, an
+ANN index (see ann_index) that shortlists rows before exact scoring. With a
+codec (see quantization), rows are stored as int8 or PQ codes instead of
+float32 and scored asymmetrically; a VectorFile can keep exact copies on
+disk for reranking.
+
+CodeTable interns small enumerations (memory types, emotions) as int codes,
+so memory records and metadata columns store an int instead of a string.
+"""
+
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.services.quantization import VectorCodec, VectorFile
+
+
+def normalize(vector: Sequence[float]) -> np.ndarray:
+    """Return a float32 copy of vector scaled to unit length (zero stays zero)."""
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else v.copy()
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.intp)
+    if k < len(scores):
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class CodeTable:
+    """Interned name <-> small-int code mapping; unknown names get the next code"""
+
+    def __init__(self, names: Sequence[str] = ()):
+        self.names: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for name in names:
+            self.code(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def code(self, name: str) -> int:
+        """Code of name, registering it if new."""
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def get(self, name: str) -> Optional[int]:
+        """Code of name, or None if it was never registered."""
+        return self.codes.get(name)
+
+    def name(self, code: int) -> str:
+        return self.names[code]
+
+
+class VectorMatrix:
+    """
+    Growable matrix of normalised embeddings with parallel metadata
+
+    Row i holds the embedding of items[i]; importance, access_count,
+    type_code and timestamp (epoch seconds) are numpy arrays aligned with
+    the rows. Capacity doubles when full, so appends are amortised O(dim).
+    
+    With a codec the rows hold codes: `vectors` decodes them and
+    `similarities` scores the codes directly. With a vector_file each row
+    also keeps a reference to its exact vector there (see similarities).
+    """
+
+    _COLUMNS = ("_vectors", "_importance", "_access_count", "_type_code", "_timestamp", "_ref")
+
+    def __init__(
+        self,
+        dim: int,
+        initial_capacity: int = 64,
+        codec: Optional[VectorCodec] = None,
+        vector_file: Optional[VectorFile] = None,
+    ):
+        self.dim = dim
+        self.size = 0
+        self.items: List[Any] = []
+        self.codec = codec
+        self.vector_file = vector_file
+        if codec is None:
+            self._vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+        else:
+            self._vectors = codec.empty(initial_capacity)
+        self._importance = np.zeros(initial_capacity, dtype=np.float32)
+        self._access_count = np.zeros(initial_capacity, dtype=np.int32)
+        self._type_code = np.zeros(initial_capacity, dtype=np.int16)
+        self._timestamp = np.zeros(initial_capacity, dtype=np.float64)
+        self._ref = np.zeros(initial_capacity, dtype=np.int64)  # Row in vector_file
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Row embeddings (decoded approximations when a codec is set)."""
+        if self.codec is None:
+            return self._vectors[:self.size]
+        return self.codec.decode(self._vectors[:self.size])
+
+    @property
+    def refs(self) -> np.ndarray:
+        """Rows' references into the vector_file (a writable view)."""
+        return self._ref[:self.size]
+
+    def vectors_at(self, rows: Sequence[int]) -> np.ndarray:
+        """Vectors (n, dim) of the given rows, decoding only those rows."""
+        vectors = self._vectors[np.asarray(rows, dtype=np.intp)]
+        return vectors if self.codec is None else self.codec.decode(vectors)
+
+    @property
+    def importance(self) -> np.ndarray:
+        return self._importance[:self.size]
+
+    @property
+    def access_count(self) -> np.ndarray:
+        return self._access_count[:self.size]
+
+    @property
+    def type_code(self) -> np.ndarray:
+        return self._type_code[:self.size]
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        return self._timestamp[:self.size]
+
+    def append(
+        self,
+        item: Any,
+        embedding: Sequence[float],
+        importance: float = 0.5,
+        type_code: int = 0,
+        timestamp: float = 0.0,
+    ) -> int:
+        """
+        Add a row.
+
+        Returns:
+            Row index of the new item
+        """
+        vector = normalize(embedding)
+        if vector.shape != (self.dim,):
+            raise ValueError(f"Expected a {self.dim}-dim embedding, got shape {vector.shape}")
+        if self.size == len(self._vectors):
+            self._grow(2 * len(self._vectors))
+
+        row = self.size
+        self._set_row(row, vector)
+        self._importance[row] = importance
+        self._access_count[row] = 0
+        self._type_code[row] = type_code
+        self._timestamp[row] = timestamp
+        self.items.append(item)
+        self.size += 1
+        return row
+
+    def set_vector(self, row: int, embedding: Sequence[float]) -> None:
+        """Replace the embedding of an existing row."""
+        vector = normalize(embedding)
+        if vector.shape != (self.dim,):
+            raise ValueError(f"Expected a {self.dim}-dim embedding, got shape {vector.shape}")
+        if self.vector_file is not None:
+            self.vector_file.release(self._ref[row:row + 1])
+        self._set_row(row, vector)
+
+    def quantize(self, codec: VectorCodec) -> None:
+        """Re-encode the stored float32 rows with a trained codec."""
+        codes = codec.empty(len(self._vectors))
+        codes[:self.size] = codec.encode(self.vectors)
+        self._vectors = codes
+        self.codec = codec
+
+    def compact(self, keep: np.ndarray) -> None:
+        """Drop the rows where keep is False, preserving the order of the rest."""
+        rows = np.flatnonzero(keep)
+        if self.vector_file is not None:
+            self.vector_file.release(self._ref[:self.size][~keep])
+        for name in self._COLUMNS:
+            arr = getattr(self, name)
+            arr[:len(rows)] = arr[rows]
+        self.items = [self.items[row] for row in rows.tolist()]
+        self.size = len(rows)
+
+    def similarities(
+        self,
+        query: Sequence[float],
+        rows: Optional[np.ndarray] = None,
+        exact: bool = False,
+    ) -> np.ndarray:
+        """
+        Cosine similarity of the query with every row (or the given rows).
+
+        Coded rows are scored approximately; exact=True reads the rows'
+        float32 vectors from the vector_file instead, when there is one.
+        """
+        q = normalize(query)
+        if exact and self.codec is not None and self.vector_file is not None:
+            refs = self._ref[:self.size] if rows is None else self._ref[rows]
+            return self.vector_file.read(refs) @ q
+        vectors = self._vectors[:self.size] if rows is None else self._vectors[rows]
+        if self.codec is None:
+            return vectors @ q
+        return self.codec.scores(q, vectors)
+
+    def _set_row(self, row: int, vector: np.ndarray) -> None:
+        if self.codec is None:
+            self._vectors[row] = vector
+        else:
+            self._vectors[row] = self.codec.encode(vector)[0]
+        if self.vector_file is not None:
+            self._ref[row] = self.vector_file.append(vector)[0]
+
+    def _grow(self, capacity: int) -> None:
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+
+class UserVectorStore:
+    """
+    Per-user VectorMatrix collection with optional ANN shortlisting
+
+    With an index_factory (dim -> VectorIndex), a user's matrix gets an
+    index once it reaches ann_min_size rows; the index is keyed by row.
+    
+    A codec is shared by all users. One that needs training (PQ) leaves
+    rows in float32 until codec.train_size rows are stored across users,
+    then trains on them and re-encodes every matrix. An ANN index keeps
+    its own float32 copies of the (decoded) vectors.
+
+    The vector_file is the store's own: rows released by update, remove and
+    drop are compacted away once it needs_compaction, and every matrix's
+    references are renumbered.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        index_factory: Optional[Callable[[int], Any]] = None,
+        ann_min_size: int = 10000,
+        codec: Optional[VectorCodec] = None,
+        vector_file: Optional[VectorFile] = None,
+    ):
+        self.dim = dim
+        self.index_factory = index_factory
+        self.ann_min_size = ann_min_size
+        self.codec = codec
+        self.vector_file = vector_file
+        self.matrices: Dict[str, VectorMatrix] = {}
+        self.indexes: Dict[str, Any] = {}
+        self._untrained_rows = 0  # Rows stored before the codec was trained
+
+    def get(self, user_id: str) -> Optional[VectorMatrix]:
+        return self.matrices.get(user_id)
+
+    def add(self, user_id: str, item: Any, embedding: Sequence[float], **metadata) -> int:
+        """
+        Append an item to the user's matrix (and index).
+
+        Args:
+            metadata: importance, type_code, timestamp (see VectorMatrix.append)
+
+        Returns:
+            Row index of the new item
+        """
+        matrix = self.matrices.get(user_id)
+        if matrix is None:
+            codec = self.codec if self.codec is not None and self.codec.is_trained else None
+            matrix = self.matrices[user_id] = VectorMatrix(self.dim, codec=codec, vector_file=self.vector_file)
+        row = matrix.append(item, embedding, **metadata)
+        if self.codec is not None and not self.codec.is_trained:
+            self._untrained_rows += 1
+            if self._untrained_rows >= self.codec.train_size:
+                self._train_codec()
+
+        if user_id in self.indexes:
+            self.indexes[user_id].add(np.array([row]), matrix.vectors_at([row]))
+        elif self.index_factory is not None and len(matrix) >= self.ann_min_size:
+            index = self.index_factory(self.dim)
+            index.add(np.arange(len(matrix)), matrix.vectors)
+            self.indexes[user_id] = index
+        return row
+
+    def _train_codec(self) -> None:
+        self.codec.train(np.concatenate([m.vectors for m in self.matrices.values()]))
+        for matrix in self.matrices.values():
+            matrix.quantize(self.codec)
+
+    def update(self, user_id: str, row: int, embedding: Sequence[float]) -> None:
+        """Replace the embedding of a stored row (and re-index it)."""
+        matrix = self.matrices[user_id]
+        matrix.set_vector(row, embedding)
+        if user_id in self.indexes:
+            self.indexes[user_id].add(np.array([row]), matrix.vectors_at([row]))
+        self._compact_vector_file()
+
+    def remove(self, user_id: str, rows: Sequence[int]) -> None:
+        """
+        Delete rows from the user's matrix in one compaction pass.
+
+        Rows after a deleted row move up, so an existing index is rebuilt.
+        """
+        matrix = self.matrices.get(user_id)
+        if matrix is None or not len(rows):
+            return
+        keep = np.ones(len(matrix), dtype=bool)
+        keep[np.asarray(rows, dtype=np.intp)] = False
+        matrix.compact(keep)
+        if user_id in self.indexes:
+            index = self.index_factory(self.dim)
+            index.add(np.arange(len(matrix)), matrix.vectors)
+            self.indexes[user_id] = index
+        self._compact_vector_file()
+
+    def drop(self, user_id: str) -> None:
+        """Forget every row of a user (and its index)."""
+        matrix = self.matrices.pop(user_id, None)
+        self.indexes.pop(user_id, None)
+        if matrix is not None and matrix.vector_file is not None:
+            matrix.vector_file.release(matrix.refs)
+            self._compact_vector_file()
+
+    def _compact_vector_file(self) -> None:
+        vector_file = self.vector_file
+        if vector_file is None or not vector_file.needs_compaction:
+            return
+        matrices = [m for m in self.matrices.values() if m.vector_file is vector_file]
+        refs = vector_file.compact(np.concatenate([m.refs for m in matrices] + [np.zeros(0, np.int64)]))
+        start = 0
+        for matrix in matrices:
+            matrix.refs[:] = refs[start:start + len(matrix)]
+            start += len(matrix)
+
+    def similar_pairs(
+        self,
+        user_id: str,
+        rows: np.ndarray,
+        threshold: float,
+        k: int = 16,
+        block_size: int = 1024,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find stored rows with cosine similarity >= threshold to the given rows.
+
+        Indexed users look up the k nearest neighbours of each row in the ANN
+        index; smaller users are compared exactly, block by block.
+
+        Returns:
+            (rows, neighbours) arrays of matching pairs, self-pairs excluded
+        """
+        matrix = self.matrices.get(user_id)
+        if matrix is None or not len(rows):
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+        index = self.indexes.get(user_id)
+        pairs_a, pairs_b = [], []
+        if index is not None:
+            for row in np.asarray(rows).tolist():
+                ids, sims = index.search(matrix.vectors_at([row])[0], k + 1)
+                hits = ids[(sims >= threshold) & (ids != row)]
+                pairs_a.append(np.full(len(hits), row, dtype=np.intp))
+                pairs_b.append(hits.astype(np.intp))
+        else:
+            rows = np.asarray(rows, dtype=np.intp)
+            stored = matrix.vectors  # Decoded once for all blocks
+            for start in range(0, len(rows), block_size):
+                block = rows[start:start + block_size]
+                sims = stored[block] @ stored.T
+                sims[np.arange(len(block)), block] = -1.0
+                a, b = np.nonzero(sims >= threshold)
+                pairs_a.append(block[a])
+                pairs_b.append(b.astype(np.intp))
+        return np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+    def shortlist(self, user_id: str, query: Sequence[float], n: int) -> Optional[np.ndarray]:
+        """Rows of the n approximate nearest items, or None if the user has no index."""
+        index = self.indexes.get(user_id)
+        if index is None:
+            return None
+        rows, _ = index.search(np.asarray(query, dtype=np.float32), n)
+        return rows
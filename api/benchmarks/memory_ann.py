@@ -0,0 +1,94 @@
+"""
+Memory ANN index benchmark
+
+Builds an IVFFlatIndex over clustered synthetic embeddings (10k, 100k and 1M
+vectors by default) and reports recall@k against exact search, together with
+query latency for a range of n_probe settings.
+
+Run from api/: python -m benchmarks.memory_ann [--sizes 10000 100000] [--dim 128]
+    [--k 10] [--n-probe 1 4 16 64] [--json results.json]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.services.ann_index import IVFFlatIndex
+from app.services.vector_store import top_k_indices
+
+
+def clustered_embeddings(n: int, dim: int, n_topics: int = 1000, spread: float = 0.6, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around random topic directions, like real memories."""
+    rng = np.random.RandomState(seed)
+    topics = rng.randn(n_topics, dim).astype(np.float32)
+    x = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100000):
+        stop = min(n, start + 100000)
+        x[start:stop] = topics[rng.randint(0, n_topics, stop - start)]
+        x[start:stop] += spread * rng.randn(stop - start, dim).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def run(sizes, dim, k, n_probes, n_queries):
+    results = []
+    for n in sizes:
+        data = clustered_embeddings(n + n_queries, dim)
+        base, queries = data[:n], data[n:]
+
+        start = time.perf_counter()
+        index = IVFFlatIndex(dim)
+        index.add(np.arange(n), base)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        exact = [set(top_k_indices(base @ q, k).tolist()) for q in queries]
+        exact_ms = 1000 * (time.perf_counter() - start) / n_queries
+
+        for n_probe in n_probes:
+            index.n_probe = n_probe
+            start = time.perf_counter()
+            found = [index.search(q, k)[0] for q in queries]
+            ivf_ms = 1000 * (time.perf_counter() - start) / n_queries
+            recall = np.mean([len(truth & set(ids.tolist())) / k for truth, ids in zip(exact, found)])
+
+            results.append({
+                "n": n,
+                "dim": dim,
+                "n_lists": len(index.centroids),
+                "n_probe": n_probe,
+                f"recall_at_{k}": float(recall),
+                "exact_ms": exact_ms,
+                "ivf_ms": ivf_ms,
+                "speedup": exact_ms / ivf_ms,
+                "build_s": build_s,
+            })
+            print(
+                f"{n:>8} lists {len(index.centroids):>5} n_probe {n_probe:>4}  "
+                f"recall@{k} {recall:.3f}  exact {exact_ms:7.2f} ms  ivf {ivf_ms:7.2f} ms  "
+                f"({exact_ms / ivf_ms:5.1f}x)  build {build_s:.1f}s"
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.dim, args.k, args.n_probe, args.queries)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
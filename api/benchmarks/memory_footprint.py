@@ -0,0 +1,127 @@
+"""
+Memory record footprint benchmark
+
+Reports traced bytes per memory for the long-term memory layouts:
+- before: the original dataclass record holding a Python list of floats,
+  a datetime, free-form strings and a metadata dict
+- after: LongTermMemoryEngine.store_memory (slotted MemoryEntry, embedding
+  only in the user's float32 VectorMatrix, int type codes, epoch seconds)
+
+The "before" layout costs ~50 KB per 1536-dim memory, so it is measured on
+--before-count memories (default 2000) and scaled; "after" stores --count
+memories (default 100k) for real.
+
+Run from api/: python -m benchmarks.memory_footprint [--count 100000]
+    [--before-count 2000] [--dim 1536] [--users 100] [--json results.json]
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.neural_persona import LongTermMemoryEngine
+
+MEMORY_TYPES = ["conversation", "preference", "emotional_state", "health"]
+
+
+@dataclass
+class LegacyMemoryEntry:
+    """The record layout before slotting (embedding kept as a list)"""
+    memory_id: str
+    user_id: str
+    content: str
+    embedding: List[float]
+    timestamp: datetime
+    memory_type: str
+    importance_score: float = 0.5
+    access_count: int = 0
+    metadata: Dict = field(default_factory=dict)
+
+
+def traced_bytes(build) -> int:
+    """Bytes still allocated after build() returns (the result is kept alive)."""
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def build_before(count: int, dim: int, users: int, seed: int = 0):
+    rng = np.random.RandomState(seed)
+    return [
+        LegacyMemoryEntry(
+            memory_id=f"mem_user_{i % users}_{i}",
+            user_id=f"user_{i % users}",
+            content=f"memory {i}",
+            embedding=rng.standard_normal(dim).tolist(),
+            timestamp=datetime.now(),
+            memory_type=MEMORY_TYPES[i % len(MEMORY_TYPES)],
+        )
+        for i in range(count)
+    ]
+
+
+def build_after(count: int, dim: int, users: int, seed: int = 0):
+    rng = np.random.RandomState(seed)
+    engine = LongTermMemoryEngine(embedding_dim=dim)
+    for i in range(count):
+        engine.store_memory(
+            f"user_{i % users}",
+            f"memory {i}",
+            rng.standard_normal(dim).astype(np.float32),
+            MEMORY_TYPES[i % len(MEMORY_TYPES)],
+        )
+    return engine
+
+
+def run(count: int, before_count: int, dim: int, users: int) -> Dict:
+    before = traced_bytes(lambda: build_before(before_count, dim, users)) / before_count
+    after = traced_bytes(lambda: build_after(count, dim, users)) / count
+    # The matrix part includes the doubling slack of each user's VectorMatrix
+    return {
+        "count": count,
+        "dim": dim,
+        "users": users,
+        "before_bytes_per_memory": before,
+        "after_bytes_per_memory": after,
+        "embedding_float32_bytes": 4 * dim,
+        "reduction": before / after,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--before-count", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    result = run(args.count, args.before_count, args.dim, args.users)
+    print(
+        f"{result['count']} memories x {result['dim']} dims: "
+        f"before {result['before_bytes_per_memory'] / 1024:.1f} KB/memory, "
+        f"after {result['after_bytes_per_memory'] / 1024:.1f} KB/memory "
+        f"(float32 embedding {result['embedding_float32_bytes'] / 1024:.1f} KB), "
+        f"{result['reduction']:.1f}x smaller"
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
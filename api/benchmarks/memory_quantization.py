@@ -0,0 +1,149 @@
+"""
+Memory vector quantization benchmark
+
+Stores --count memories for one user in LongTermMemoryEngine with each
+vector codec and reports, per configuration:
+- vector bytes per memory (the user's VectorMatrix rows)
+- retrieve_memories throughput (queries/s, distinct queries so every
+  lookup misses the recall cache)
+- recall@k against exact float32 search
+
+Configurations: float32, int8, pq, and int8 / pq with exact rerank of
+--rerank candidates per result from a VectorFile.
+
+The synthetic embeddings are clustered in a low-rank subspace (like real
+text embeddings; isotropic noise is incompressible and makes PQ look far
+worse); queries are noisy copies of stored vectors.
+
+Run from api/: python -m benchmarks.memory_quantization [--count 10000]
+    [--dim 1536] [--queries 200] [--top-k 10] [--pq-subspaces 96]
+    [--rerank 4] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.neural_persona import LongTermMemoryEngine
+from app.services.quantization import VectorFile, make_codec
+from app.services.vector_store import normalize
+
+
+def make_embeddings(count: int, dim: int, rank: int = 64, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Clustered points in a rank-dimensional subspace, plus a little full-rank noise."""
+    rng = np.random.RandomState(seed)
+    basis = rng.standard_normal((rank, dim)) / np.sqrt(rank)
+    centers = rng.standard_normal((clusters, rank))
+    latent = centers[rng.randint(clusters, size=count)] + 0.5 * rng.standard_normal((count, rank))
+    return (latent @ basis + 0.05 * rng.standard_normal((count, dim))).astype(np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    sims = np.stack([normalize(q) for q in queries]) @ normed.T
+    return [set(np.argsort(-row, kind="stable")[:k].tolist()) for row in sims]
+
+
+def run_config(
+    name: str,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: List[set],
+    top_k: int,
+    codec_kind: str,
+    codec_options: Dict,
+    rerank: int,
+    workdir: str,
+) -> Dict:
+    dim = vectors.shape[1]
+    codec = make_codec(codec_kind, dim, **codec_options)
+    vector_file: Optional[VectorFile] = None
+    if rerank:
+        vector_file = VectorFile(os.path.join(workdir, f"{name}.f32"), dim)
+    engine = LongTermMemoryEngine(
+        embedding_dim=dim,
+        codec=codec,
+        vector_file=vector_file,
+        rerank_candidates=rerank,
+        access_flush_size=1 << 30,  # Keep the importance boost constant
+    )
+
+    start = time.perf_counter()
+    for i, v in enumerate(vectors):
+        engine.store_memory("user_0", str(i), v)
+    store_seconds = time.perf_counter() - start
+
+    matrix = engine.vector_store.get("user_0")
+    start = time.perf_counter()
+    results = [engine.retrieve_memories("user_0", q, top_k=top_k) for q in queries]
+    query_seconds = time.perf_counter() - start
+
+    hits = sum(len({int(m.content) for m, _ in found} & expected) for found, expected in zip(results, truth))
+    if vector_file is not None:
+        vector_file.close()
+    return {
+        "config": name,
+        "vector_bytes_per_memory": matrix._vectors[:len(matrix)].nbytes / len(matrix),
+        "store_seconds": store_seconds,
+        "queries_per_second": len(queries) / query_seconds,
+        f"recall_at_{top_k}": hits / (top_k * len(queries)),
+    }
+
+
+def run(count: int, dim: int, n_queries: int, top_k: int, pq_subspaces: int, rerank: int) -> List[Dict]:
+    vectors = make_embeddings(count, dim)
+    rng = np.random.RandomState(1)
+    picks = rng.choice(count, n_queries, replace=False)
+    queries = vectors[picks] + 0.05 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    truth = exact_top_k(vectors, queries, top_k)
+
+    pq = {"n_subspaces": pq_subspaces, "train_size": min(count, 10000)}
+    configs = [
+        ("float32", "float32", {}, 0),
+        ("int8", "int8", {}, 0),
+        (f"int8+rerank{rerank}", "int8", {}, rerank),
+        (f"pq{pq_subspaces}", "pq", pq, 0),
+        (f"pq{pq_subspaces}+rerank{rerank}", "pq", pq, rerank),
+    ]
+    with tempfile.TemporaryDirectory() as workdir:
+        return [
+            run_config(name, vectors, queries, truth, top_k, kind, options, r, workdir)
+            for name, kind, options, r in configs
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--pq-subspaces", type=int, default=96)
+    parser.add_argument("--rerank", type=int, default=4)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.count, args.dim, args.queries, args.top_k, args.pq_subspaces, args.rerank)
+    baseline = results[0]["vector_bytes_per_memory"]
+    recall_key = f"recall_at_{args.top_k}"
+    print(f"{args.count} memories x {args.dim} dims, {args.queries} queries, top {args.top_k}")
+    for r in results:
+        print(
+            f"{r['config']:>18}: {r['vector_bytes_per_memory']:7.0f} B/memory "
+            f"({baseline / r['vector_bytes_per_memory']:5.1f}x smaller), "
+            f"{r['queries_per_second']:7.0f} queries/s, recall {r[recall_key]:.3f}, "
+            f"store {r['store_seconds']:.1f}s"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Trickster audio benchmark suite
+
+Times every stage of TricksterAudioProcessor on synthetic voiced signals
+(1 s, 30 s and 600 s by default): decoding, each chain stage, the whole
+chain, the fused engine and the streaming renderer. For every stage it
+records wall time (best of --repeats), real-time factor (wall time / audio
+duration) and peak traced memory.
+
+Results are written as JSON; pass an earlier file as --baseline to compare
+and exit non-zero when a stage regressed by more than --max-regression.
+
+Run from api/: python -m benchmarks.trickster_suite [--durations 1 30 600]
+    [--json results.json] [--baseline baseline.json] [--max-regression 0.25]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import librosa
+import soundfile as sf
+
+from app.services.audio_processor import TricksterAudioProcessor
+from benchmarks.trickster_fused import synthetic_voice
+
+# Input files are written at a typical upload rate so "load" includes resampling
+SOURCE_SR = 44100
+
+# Differences below these are noise, whatever the relative change
+MIN_WALL_DELTA_S = 0.02
+MIN_PEAK_DELTA_MB = 1.0
+
+
+def stages(processor, path, y, pitch_shift=4.0, formant_shift=0.65, tempo_rate=1.1):
+    """(name, callable) pairs; each callable runs one stage on prepared input."""
+    sr = processor.sr
+    pitched = processor.pitch_shift(y, pitch_shift, sr)
+    formanted = processor.formant_shift(pitched, formant_shift, sr)
+    out_path = path + ".out.wav"
+    return [
+        ("load", lambda: processor.load_audio(path)),
+        ("pitch_shift", lambda: processor.pitch_shift(y, pitch_shift, sr)),
+        ("formant_shift", lambda: processor.formant_shift(pitched, formant_shift, sr)),
+        ("time_stretch", lambda: processor.time_stretch(formanted, tempo_rate)),
+        ("chain", lambda: processor.process_array(y, sr, pitch_shift, formant_shift, tempo_rate, "chain")),
+        ("fused", lambda: processor.process_array(y, sr, pitch_shift, formant_shift, tempo_rate, "fused")),
+        ("streaming", lambda: processor.process_streaming(
+            path, out_path, pitch_shift, formant_shift, tempo_rate, "chain"
+        )),
+    ]
+
+
+def measure(fn, repeats):
+    """Best wall time over repeats, then one traced run for peak memory."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 2 ** 20
+
+
+def run(durations, repeats):
+    processor = TricksterAudioProcessor()
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Warm up numba/FFT plans so the first timing is not an outlier
+        warm_path = os.path.join(tmp_dir, "warm.wav")
+        sf.write(warm_path, synthetic_voice(1.0, SOURCE_SR), SOURCE_SR)
+        for _, fn in stages(processor, warm_path, synthetic_voice(1.0, processor.sr)):
+            fn()
+
+        for seconds in durations:
+            path = os.path.join(tmp_dir, f"voice_{seconds:g}s.wav")
+            sf.write(path, synthetic_voice(seconds, SOURCE_SR), SOURCE_SR)
+            y = synthetic_voice(seconds, processor.sr)
+            for name, fn in stages(processor, path, y):
+                wall, peak_mb = measure(fn, repeats)
+                results.append({
+                    "duration_s": seconds,
+                    "stage": name,
+                    "wall_s": wall,
+                    "rtf": wall / seconds,
+                    "peak_mb": peak_mb,
+                })
+                print(f"{seconds:>6g}s {name:<14} {wall:>8.3f}s  rtf {wall / seconds:>6.3f}  peak {peak_mb:>8.1f} MB")
+
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "librosa": librosa.__version__,
+            "sample_rate": processor.sr,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, max_regression):
+    """
+    Compare two result sets stage by stage.
+
+    Returns:
+        List of (duration_s, stage, metric, baseline, current) regressions
+    """
+    previous = {(r["duration_s"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'dur':>7} {'stage':<14} {'wall':>16} {'peak MB':>18}")
+    for r in current["results"]:
+        key = (r["duration_s"], r["stage"])
+        if key not in previous:
+            continue
+        old = previous[key]
+        print(
+            f"{r['duration_s']:>6g}s {r['stage']:<14} "
+            f"{old['wall_s']:>6.3f}->{r['wall_s']:<6.3f}s {old['peak_mb']:>7.1f}->{r['peak_mb']:<7.1f}"
+        )
+        for metric, min_delta in (("wall_s", MIN_WALL_DELTA_S), ("peak_mb", MIN_PEAK_DELTA_MB)):
+            limit = old[metric] * (1.0 + max_regression)
+            if r[metric] > limit and r[metric] - old[metric] > min_delta:
+                regressions.append((*key, metric, old[metric], r[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--durations", type=float, nargs="+", default=[1.0, 30.0, 600.0])
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed relative slowdown / memory growth (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run(args.durations, args.repeats)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        for seconds, stage, metric, old, new in regressions:
+            print(f"REGRESSION {seconds:g}s {stage} {metric}: {old:.3f} -> {new:.3f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,16 +6,142 @@ v3.0+ - AI Physicality, Multi-Avatar Social, Health & Wellness
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
+import signal
+import sys
+import threading
 from app.config.settings import settings
 from app.routes import audio, projects, advanced
-from app.routes.advanced_v3 import all_routers as v3_routers
+from app.routes.advanced_v3 import all_routers as v3_routers, persona_service
+from app.services.ann_index import index_factory
+from app.services.embeddings import EmbeddingProvider, HashingEmbeddingBackend, OpenAIEmbeddingBackend
+from app.services.audio_cache import RenderCache
+from app.services.audio_processor import processor
+from app.services.audio_workers import worker_pool
+from app.services.memory_engine import memory_engine
+from app.services.memory_shards import MemoryShardClient, MemoryShardPool, wait_for_shards
+from app.services.memory_store import PgVectorMemoryStore, SQLiteMemoryStore
+from app.services.quantization import VectorFile, make_codec
+from app.services.recall_cache import RecallCache
+from app.services.translation_cache import (
+    LocalTranslationCache, PostgresTranslationTier, RedisTranslationTier, TranslationCache,
+)
+from app.services.translation_providers import (
+    DeepLProvider, GoogleTranslateProvider, PlaceholderProvider,
+)
+from app.services.translator import translator
 
 # Configure logging
 logging.basicConfig(level=settings.log_level)
 logger = logging.getLogger(__name__)
 
 
+async def deliver_proactive_recall(reminder) -> None:
+    """Push hook for due reminders; replace with the notification channel."""
+    logger.info(
+        f"Proactive recall for {reminder.user_id}: {reminder.memory.summary} "
+        f"({reminder.memory_type} on {reminder.event_at.date()})"
+    )
+
+
+async def setup_memory_engines(memory_engine, persona_memory_engine) -> None:
+    """Apply settings to a MemoryEngine / LongTermMemoryEngine pair (per worker or per shard)."""
+    if settings.embedding_backend == "openai" and settings.openai_api_key:
+        backend = OpenAIEmbeddingBackend(
+            settings.openai_api_key, settings.openai_model_embeddings, settings.openai_embedding_dimension
+        )
+    else:
+        backend = HashingEmbeddingBackend(memory_engine.embedding_dimension)
+    memory_engine.embedding_provider = EmbeddingProvider(
+        backend,
+        batch_window_ms=settings.embedding_batch_window_ms,
+        cache_dir=settings.embedding_cache_dir,
+        cache_max_bytes=settings.embedding_cache_max_bytes,
+    )
+    logger.info(f"✓ Embeddings: {backend.name}")
+    if settings.memory_ann_index != "none":
+        options = {"n_probe": settings.memory_ann_n_probe} if settings.memory_ann_index == "ivf" else {}
+        for store in (persona_memory_engine.vector_store, memory_engine.vector_store):
+            store.index_factory = index_factory(settings.memory_ann_index, **options)
+            store.ann_min_size = settings.memory_ann_min_size
+    if settings.memory_vector_codec != "float32":
+        dim = persona_memory_engine.embedding_dim
+        options = {
+            "n_subspaces": settings.memory_pq_subspaces, "train_size": settings.memory_pq_train_size,
+        } if settings.memory_vector_codec == "pq" else {}
+        persona_memory_engine.vector_store.codec = make_codec(settings.memory_vector_codec, dim, **options)
+        if settings.memory_rerank_candidates > 0:
+            persona_memory_engine.vector_store.vector_file = VectorFile.for_process(
+                settings.memory_rerank_dir, dim
+            )
+            persona_memory_engine.rerank_candidates = settings.memory_rerank_candidates
+        logger.info(f"✓ Memory vector codec: {settings.memory_vector_codec}")
+    for engine in (persona_memory_engine, memory_engine):
+        engine.recall_cache = RecallCache(
+            settings.memory_recall_cache_size, settings.memory_recall_cache_ttl_seconds
+        )
+    if settings.memory_store_backend == "postgres":
+        memory_engine.store = PgVectorMemoryStore(
+            settings.database_url,
+            pool_size=settings.database_pool_size,
+            batch_size=settings.memory_store_batch_size,
+        )
+    elif settings.memory_store_backend == "sqlite":
+        memory_engine.store = SQLiteMemoryStore(
+            settings.memory_store_sqlite_path, batch_size=settings.memory_store_batch_size
+        )
+    if memory_engine.store is not None:
+        await memory_engine.store.connect()
+        logger.info(f"✓ Memory store: {settings.memory_store_backend}")
+    if settings.memory_proactive_push:
+        memory_engine.recall_scheduler.start(deliver_proactive_recall)
+        logger.info("✓ Proactive recall push")
+
+
+async def teardown_memory_engines(memory_engine, persona_memory_engine) -> None:
+    await memory_engine.recall_scheduler.stop()
+    if memory_engine.store is not None:
+        await memory_engine.store.close()
+        memory_engine.store = None
+    if persona_memory_engine.vector_store.vector_file is not None:
+        persona_memory_engine.vector_store.vector_file.close()
+        persona_memory_engine.vector_store.vector_file = None
+
+
+shard_pool = MemoryShardPool(settings.memory_shards, settings.memory_shard_socket_dir)
+
+
+def start_memory_shards() -> threading.Event:
+    """
+    Start the memory shards and a thread that restarts any that die.
+
+    Runs in the supervising process, never in an API worker. Set the
+    returned event, then stop_memory_shards(), to shut them down.
+    """
+    shard_pool.start(setup_memory_engines, teardown_memory_engines)
+    stopped = threading.Event()
+    threading.Thread(target=shard_pool.supervise, args=(stopped,), name="memory-shards", daemon=True).start()
+    return stopped
+
+
+def stop_memory_shards(stopped: threading.Event) -> None:
+    stopped.set()
+    asyncio.run(shard_pool.stop())
+
+
+def run_memory_shards() -> None:
+    """`python main.py shards`: supervise the shards for `uvicorn --workers` deployments until SIGTERM/SIGINT."""
+    stopped = start_memory_shards()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    try:
+        while not stopped.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    stop_memory_shards(stopped)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -29,6 +155,58 @@ async def lifespan(app: FastAPI):
     logger.info(f"Vector DB Type: {settings.vector_db_type}")
     
     # Initialize services
+    processor.stream_threshold_seconds = settings.audio_stream_threshold_seconds
+    processor.stream_block_seconds = settings.audio_stream_block_seconds
+    processor.max_duration_seconds = settings.audio_max_duration
+    if settings.audio_worker_processes > 0:
+        worker_pool.max_workers = settings.audio_worker_processes
+        worker_pool.max_queue = settings.audio_worker_queue_size
+        worker_pool.start({
+            "stream_threshold_seconds": processor.stream_threshold_seconds,
+            "stream_block_seconds": processor.stream_block_seconds,
+        })
+        processor.worker_pool = worker_pool
+        logger.info(f"✓ Audio worker pool ({settings.audio_worker_processes} processes)")
+    if settings.audio_render_cache_enabled:
+        processor.render_cache = RenderCache(
+            settings.audio_render_cache_dir, settings.audio_render_cache_max_bytes
+        )
+        logger.info(f"✓ Audio render cache at {settings.audio_render_cache_dir}")
+    if settings.audio_decode_cache_enabled:
+        processor.decode_cache = RenderCache(
+            settings.librosa_cache_dir, settings.audio_decode_cache_max_bytes, suffix=".npy"
+        )
+        logger.info(f"✓ Decoded audio cache at {settings.librosa_cache_dir}")
+    if settings.deepl_api_key:
+        translator.provider = DeepLProvider(settings.deepl_api_key)
+    elif settings.google_translate_api_key:
+        translator.provider = GoogleTranslateProvider(settings.google_translate_api_key)
+    else:
+        translator.provider = PlaceholderProvider()
+    translator.provider_slots = asyncio.Semaphore(settings.translation_max_concurrent_requests)
+    logger.info(f"✓ Translation provider: {translator.provider.name}")
+    shared_tier = None
+    if settings.translation_cache_backend == "postgres":
+        shared_tier = PostgresTranslationTier(settings.database_url, settings.database_pool_size)
+    elif settings.translation_cache_backend == "redis":
+        shared_tier = RedisTranslationTier.from_url(settings.redis_url, settings.redis_cache_ttl)
+    translator.cache = TranslationCache(
+        LocalTranslationCache(settings.translation_cache_size, settings.translation_cache_ttl_seconds),
+        shared_tier,
+        batch_size=settings.translation_cache_batch_size,
+        flush_interval_ms=settings.translation_cache_flush_interval_ms,
+    )
+    if shared_tier is not None:
+        await shared_tier.connect()
+        logger.info(f"✓ Shared translation cache: {settings.translation_cache_backend}")
+    if settings.memory_shards > 0:
+        # Started by the supervising process (see run_memory_shards)
+        await wait_for_shards(shard_pool.socket_paths, settings.memory_shard_startup_timeout)
+        client = MemoryShardClient(shard_pool.socket_paths)
+        memory_engine.shards = persona_service.shards = client
+        logger.info(f"✓ Memory shards: {settings.memory_shards}")
+    else:
+        await setup_memory_engines(memory_engine, persona_service.memory_engine)
     if settings.feature_memory_engine:
         logger.info("✓ Memory Engine enabled")
     if settings.feature_translator:
@@ -47,6 +225,15 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown
+    await translator.cache.close()
+    await translator.provider.close()
+    if memory_engine.shards is not None:
+        await memory_engine.shards.close()
+        memory_engine.shards = persona_service.shards = None
+    else:
+        await teardown_memory_engines(memory_engine, persona_service.memory_engine)
+    processor.worker_pool = None
+    worker_pool.shutdown()
     logger.info("👋 Shutting down AuraStudio Omni")
 
 
@@ -127,11 +314,20 @@ async def api_info():
 
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["shards"]:
+        run_memory_shards()
+        sys.exit(0)
     import uvicorn
-    uvicorn.run(
-        "main:app",
-        host=settings.api_host,
-        port=settings.api_port,
-        workers=settings.api_workers,
-        reload=settings.api_debug,
-    )
+    # Shards outlive every worker: start them before uvicorn forks
+    shards_stopped = start_memory_shards() if settings.memory_shards > 0 else None
+    try:
+        uvicorn.run(
+            "main:app",
+            host=settings.api_host,
+            port=settings.api_port,
+            workers=settings.api_workers,
+            reload=settings.api_debug,
+        )
+    finally:
+        if shards_stopped is not None:
+            stop_memory_shards(shards_stopped)
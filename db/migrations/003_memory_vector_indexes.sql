@@ -0,0 +1,27 @@
+-- AuraStudio AI Database Schema
+-- Vector indexes for memory recall (pgvector >= 0.5.0)
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Memory recall: nearest neighbours by cosine distance (<=>), filtered by user.
+-- HNSW needs no training data and keeps recall high as rows are inserted.
+-- The index covers every user and the user filter applies after the index
+-- scan, so recall sets hnsw.iterative_scan (pgvector >= 0.8) and raises
+-- hnsw.ef_search per query; on older pgvector it ranks a user's rows exactly
+-- through idx_user_memory_user_id instead (see PgVectorMemoryStore).
+CREATE INDEX IF NOT EXISTS idx_user_memory_vector_hnsw
+    ON user_memory USING hnsw (memory_vector vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+-- Alternative for very large tables with a tight build budget
+-- (create after loading data; lists ~ rows / 1000):
+-- CREATE INDEX idx_user_memory_vector_ivfflat
+--     ON user_memory USING ivfflat (memory_vector vector_cosine_ops) WITH (lists = 100);
+
+-- Time-decay ranking and per-user scans
+CREATE INDEX IF NOT EXISTS idx_user_memory_user_created ON user_memory(user_id, created_at DESC);
+
+-- Conversation context search
+CREATE INDEX IF NOT EXISTS idx_conversation_history_context_hnsw
+    ON conversation_history USING hnsw (context_vectors vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
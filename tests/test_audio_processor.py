@@ -0,0 +1,550 @@
+"""
+Tests for the Trickster audio processing engine
+
+Run with: pytest tests/test_audio_processor.py -v --tb=short
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+import pytest
+import numpy as np
+import soundfile as sf
+from app.services.audio_processor import TricksterAudioProcessor, _StreamingStage
+
+
+def _write_tone(path, seconds, sr=44100, freq=220.0):
+    t = np.arange(int(seconds * sr)) / sr
+    sf.write(str(path), (0.3 * np.sin(2 * np.pi * freq * t)).astype(np.float32), sr)
+    return str(path)
+
+
+class TestStreamingStage:
+    """Test suite for the block-wise overlap-add stage"""
+
+    def test_identity_stage_is_lossless(self):
+        """Crossfading identical blocks reproduces the input"""
+        x = np.random.RandomState(0).randn(50000).astype(np.float32)
+        stage = _StreamingStage(lambda s: s, 1.0, block=7000, context=1000, fade=300)
+
+        out = [stage.push(x[i:i + 3333]) for i in range(0, len(x), 3333)]
+        out = np.concatenate(out + [stage.flush()])
+
+        assert len(out) == len(x)
+        assert np.allclose(out, x, atol=1e-5)
+
+    def test_rate_change_and_max_output(self):
+        """Output length follows the ratio and is capped at max_output"""
+        x = np.ones(40000, dtype=np.float32)
+        stage = _StreamingStage(
+            lambda s: np.repeat(s, 2), 2.0, block=5000, context=500, fade=100, max_output=60000
+        )
+
+        out = np.concatenate([stage.push(x), stage.flush()])
+
+        assert len(out) == 60000
+        assert np.allclose(out, 1.0)
+
+
+class TestTricksterStreaming:
+    """Test suite for streaming Trickster rendering"""
+
+    @pytest.fixture
+    def processor(self):
+        return TricksterAudioProcessor()
+
+    def test_streaming_matches_chain_length(self, processor, tmp_path):
+        """Streaming output has the same length as the whole-file chain"""
+        path = _write_tone(tmp_path / "tone.wav", 6.0)
+
+        full = processor.apply_trickster_effect(path)
+        blocks = list(processor.stream_trickster_effect(path, block_seconds=1.0))
+        streamed = np.concatenate(blocks)
+
+        assert len(blocks) > 1
+        assert len(streamed) == len(full)
+        assert np.all(np.isfinite(streamed))
+        assert np.abs(streamed).max() > 0.01
+
+    def test_process_streaming_writes_file(self, processor, tmp_path):
+        """Streaming render writes a readable WAV at the processor rate"""
+        path = _write_tone(tmp_path / "tone.wav", 3.0)
+        output = str(tmp_path / "out.wav")
+
+        written = processor.process_streaming(path, output)
+        info = sf.info(output)
+
+        assert info.samplerate == processor.sr
+        assert info.frames == written
+
+    def test_inline_streaming_response(self, tmp_path, monkeypatch):
+        """Inline streaming WAV is produced block by block and matches the file render"""
+        import asyncio
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.routes.audio import router
+        from app.services.audio_processor import processor as shared
+        monkeypatch.setattr(shared, "stream_block_seconds", 1.0)
+        monkeypatch.setattr(shared, "worker_pool", None)
+        path = _write_tone(tmp_path / "tone.wav", 6.0)
+        shared.process_streaming(path, str(tmp_path / "out.wav"))
+
+        async def collect():
+            return [chunk async for chunk in shared.stream_wav_async(path)]
+        chunks = asyncio.run(collect())
+        app = FastAPI()
+        app.include_router(router)
+        response = TestClient(app).post(
+            "/api/audio/trickster", json={"audio_url": path, "inline": True, "streaming": True}
+        )
+
+        assert len(chunks) > 2 and chunks[0][:4] == b"RIFF" and len(chunks[0]) == 44
+        assert response.status_code == 200 and response.headers["content-type"] == "audio/wav"
+        assert response.content == b"".join(chunks)
+        streamed = np.frombuffer(response.content[44:], dtype="<i2")
+        expected, _ = sf.read(str(tmp_path / "out.wav"), dtype="int16")
+        assert len(streamed) == len(expected)
+        assert np.abs(streamed.astype(np.int32) - expected).max() <= 1
+
+    def test_should_stream_threshold(self, processor, tmp_path):
+        """Only files longer than the threshold are streamed"""
+        path = _write_tone(tmp_path / "tone.wav", 2.0)
+
+        processor.stream_threshold_seconds = 5.0
+        assert not processor.should_stream(path)
+        processor.stream_threshold_seconds = 1.0
+        assert processor.should_stream(path)
+
+
+class TestFusedEngine:
+    """Test suite for the single-pass fused Trickster engine"""
+
+    @pytest.fixture
+    def processor(self):
+        return TricksterAudioProcessor()
+
+    def test_fused_identity(self, processor):
+        """No pitch, formant or tempo change leaves the signal intact"""
+        sr = processor.sr
+        t = np.arange(sr * 2) / sr
+        y = (0.2 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+        out = processor.fused_effect(y, 0, 1.0, 1.0)
+
+        assert len(out) == len(y)
+        assert np.allclose(out[2048:-2048], y[2048:-2048], atol=1e-3)
+
+    def test_fused_pitch_and_tempo(self, processor):
+        """Pitch moves by the requested semitones and length follows the rate"""
+        import librosa
+        sr = processor.sr
+        t = np.arange(sr * 2) / sr
+        y = sum(np.sin(2 * np.pi * 220 * h * t) / h for h in range(1, 6)).astype(np.float32) * 0.2
+
+        out = processor.fused_effect(y, 12, 1.0, 1.25)
+        f0 = np.median(librosa.yin(out, fmin=100, fmax=1000, sr=sr))
+
+        assert len(out) == round(len(y) / 1.25)
+        assert abs(f0 - 440) < 10
+
+    def test_fused_mode_on_file(self, processor, tmp_path):
+        """apply_trickster_effect accepts mode='fused' and rejects unknown modes"""
+        path = _write_tone(tmp_path / "tone.wav", 2.0)
+
+        out = processor.apply_trickster_effect(path, mode="fused")
+
+        assert len(out) == round(2.0 * processor.sr / processor.default_tempo_rate)
+        with pytest.raises(ValueError):
+            processor.apply_trickster_effect(path, mode="unknown")
+
+
+class TestRenderCache:
+    """Test suite for the content-addressed Trickster render cache"""
+
+    def _render(self, tmp_path, name, size):
+        path = tmp_path / name
+        path.write_bytes(b"\0" * size)
+        return str(path)
+
+    def test_key_depends_on_audio_and_params(self, tmp_path):
+        """Same bytes and preset hash equal; any difference changes the key"""
+        from app.services.audio_cache import RenderCache
+        a = _write_tone(tmp_path / "a.wav", 0.5)
+        b = _write_tone(tmp_path / "b.wav", 0.5, freq=330.0)
+        params = {"pitch_shift": 4, "formant_shift": 0.65, "tempo_rate": 1.1, "mode": "chain"}
+
+        key = RenderCache.make_key(a, params)
+
+        assert RenderCache.make_key(a, dict(params)) == key
+        assert RenderCache.make_key(b, params) != key
+        assert RenderCache.make_key(a, {**params, "pitch_shift": 5}) != key
+
+    def test_lru_eviction_by_bytes(self, tmp_path):
+        """Least recently used entries are evicted once max_bytes is exceeded"""
+        from app.services.audio_cache import RenderCache
+        cache = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+
+        cache.put("a", self._render(tmp_path, "a", 100))
+        cache.put("b", self._render(tmp_path, "b", 100))
+        assert cache.get("a") is not None  # "b" is now least recent
+        cache.put("c", self._render(tmp_path, "c", 100))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["bytes"] == 200
+        assert (stats["hits"], stats["misses"]) == (2, 1)
+
+    def test_index_survives_restart(self, tmp_path):
+        """A new cache over the same directory sees existing renders"""
+        from app.services.audio_cache import RenderCache
+        cache_dir = str(tmp_path / "cache")
+        RenderCache(cache_dir).put("k", self._render(tmp_path, "k", 10))
+
+        assert RenderCache(cache_dir).get("k") is not None
+
+    def test_workers_share_renders(self, tmp_path):
+        """A render cached by one worker is a hit for another already running"""
+        from app.services.audio_cache import RenderCache
+        cache_dir = str(tmp_path / "cache")
+        first, second = RenderCache(cache_dir), RenderCache(cache_dir)
+
+        path = first.put("k", self._render(tmp_path, "k", 10))
+
+        assert second.get("k") == path
+        assert second.stats()["entries"] == 1 and second.stats()["bytes"] == 10
+        assert (second.stats()["hits"], second.stats()["misses"]) == (1, 0)
+        os.remove(path)  # Evicted by the first worker
+        assert second.get("k") is None and second.stats()["entries"] == 0
+
+    def test_cache_hit_skips_rendering(self, tmp_path):
+        """A repeated request is served from the cache without librosa"""
+        import asyncio
+        from app.services.audio_cache import RenderCache
+        processor = TricksterAudioProcessor()
+        processor.render_cache = RenderCache(str(tmp_path / "cache"))
+        path = _write_tone(tmp_path / "tone.wav", 1.0)
+
+        first = asyncio.run(processor.process_async(path, str(tmp_path / "out1.wav"), mode="fused"))
+        processor.process_array = None  # any render attempt would now fail
+        second = asyncio.run(processor.process_async(path, str(tmp_path / "out2.wav"), mode="fused"))
+
+        assert first["success"] and not first["cache_hit"]
+        assert second["success"] and second["cache_hit"]
+        assert second["output_path"] == first["output_path"]
+        assert second["samples_processed"] == first["samples_processed"]
+
+
+class TestBatchProcessing:
+    """Test suite for bucketed multi-clip rendering"""
+
+    @pytest.fixture
+    def processor(self):
+        return TricksterAudioProcessor()
+
+    def test_bucket_by_length(self):
+        """Buckets respect the length ratio and the clip limit"""
+        lengths = [100, 1000, 110, 120, 1050, 130]
+
+        buckets = TricksterAudioProcessor.bucket_by_length(lengths, max_clips=3, max_ratio=1.25)
+
+        assert sorted(i for b in buckets for i in b) == list(range(len(lengths)))
+        assert buckets[0] == [0, 2, 3]
+        for bucket in buckets:
+            assert len(bucket) <= 3
+            assert max(lengths[i] for i in bucket) <= 1.25 * min(lengths[i] for i in bucket)
+
+    @pytest.mark.parametrize("mode", ["chain", "fused"])
+    def test_apply_batch_matches_single_clips(self, processor, mode):
+        """Padded, stacked rendering gives each clip its own result"""
+        sr = processor.sr
+        clips = [
+            (0.2 * np.sin(2 * np.pi * f * np.arange(n) / sr)).astype(np.float32)
+            for f, n in ((220, sr), (330, int(sr * 1.1)), (440, sr * 3))
+        ]
+
+        results = dict(r for bucket in processor.apply_batch(clips, sr, mode=mode) for r in bucket)
+
+        assert sorted(results) == [0, 1, 2]
+        for i, clip in enumerate(clips):
+            single = processor.process_array(clip, sr, mode=mode)
+            assert len(results[i]) == len(single)
+            # Only the padded tail may differ from a single-clip render
+            body = len(single) - 4096
+            assert np.allclose(results[i][:body], single[:body], atol=1e-3)
+
+    def test_batch_async_checks_limits_then_loads_per_bucket(self, processor, tmp_path):
+        """Over-limit clips fail from the header; clips decode one bucket at a time"""
+        import asyncio
+        sr = processor.sr
+        paths = []
+        for i, seconds in enumerate((1.0, 1.05, 3.0, 6.0)):
+            paths.append(str(tmp_path / f"clip{i}.wav"))
+            sf.write(paths[-1], 0.1 * np.ones(int(seconds * sr), dtype=np.float32), sr)
+        processor.max_duration_seconds = 5.0
+        decoded = []
+        load_audio = processor.load_audio
+
+        def tracking_load(path):
+            decoded.append(path)
+            return load_audio(path)
+        processor.load_audio = tracking_load
+
+        async def run():
+            events = []
+            async for result in processor.process_batch_async(paths, mode="fused"):
+                events.append((len(decoded), result))
+            return events
+        events = asyncio.run(run())
+
+        assert events[0][0] == 0 and not events[0][1]["success"] and "too long" in events[0][1]["error"]
+        by_index = {r["index"]: (n, r) for n, r in events}
+        assert by_index[0][0] == by_index[1][0] == 2  # First bucket rendered before clip 2 was decoded
+        assert by_index[2][0] == 3 and by_index[2][1]["success"]
+        assert 3 not in [paths.index(p) for p in decoded]
+        for _, result in events[1:]:
+            os.remove(result["output_path"])
+
+
+class TestUploadProbe:
+    """Test header-only metadata checks for uploads"""
+
+    @pytest.fixture
+    def processor(self):
+        return TricksterAudioProcessor()
+
+    def test_probe_reads_header_from_file_object(self, processor, tmp_path):
+        """Metadata comes from the header and the file is rewound"""
+        path = _write_tone(tmp_path / "tone.wav", 2.0)
+
+        with open(path, "rb") as f:
+            f.read(100)
+            metadata = processor.probe_audio(f)
+            assert f.tell() == 0
+
+        assert metadata["channels"] == 1
+        assert metadata["sample_rate"] == 44100
+        assert metadata["duration"] == pytest.approx(2.0)
+
+    def test_probe_unreadable_returns_none(self, processor, tmp_path):
+        """Unknown formats are left to the decoder"""
+        path = tmp_path / "junk.bin"
+        path.write_bytes(b"not audio" * 100)
+
+        assert processor.probe_audio(str(path)) is None
+
+    def test_check_limits(self, processor):
+        """Over-limit duration, channels or sample rate are reported"""
+        processor.max_duration_seconds = 10.0
+        ok = {"duration": 5.0, "channels": 2, "sample_rate": 48000}
+
+        assert processor.check_limits(ok) is None
+        assert "too long" in processor.check_limits({**ok, "duration": 11.0})
+        assert "channels" in processor.check_limits({**ok, "channels": 16})
+        assert "Sample rate" in processor.check_limits({**ok, "sample_rate": 384000})
+
+    def test_upload_rejects_unprobeable_files(self, tmp_path):
+        """Uploads without a readable header are refused instead of skipping the limits"""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.routes.audio import router
+        app = FastAPI()
+        app.include_router(router)
+        client = TestClient(app)
+        path = _write_tone(tmp_path / "tone.wav", 1.0)
+
+        junk = client.post("/api/audio/upload", files={"file": ("junk.mp3", b"not audio" * 100)})
+        with open(path, "rb") as f:
+            ok = client.post("/api/audio/upload", files={"file": ("tone.wav", f)})
+
+        assert junk.status_code == 415
+        assert ok.status_code == 200 and ok.json()["metadata"]["channels"] == 1
+        os.remove(ok.json()["path"])
+
+
+class TestDecodeCache:
+    """Test the memory-mapped decoded-audio cache behind load_audio"""
+
+    @pytest.fixture
+    def processor(self, tmp_path):
+        from app.services.audio_cache import RenderCache
+        processor = TricksterAudioProcessor()
+        processor.decode_cache = RenderCache(str(tmp_path / "decoded"), suffix=".npy")
+        return processor
+
+    def test_reuse_is_memory_mapped_and_skips_decoding(self, processor, tmp_path, monkeypatch):
+        """The second load maps the stored PCM instead of calling librosa"""
+        import librosa
+        path = _write_tone(tmp_path / "tone.wav", 1.0)
+
+        y1, sr1 = processor.load_audio(path)
+        monkeypatch.setattr(librosa, "load", None)  # decoding again would fail
+        y2, sr2 = processor.load_audio(path)
+
+        assert isinstance(y2, np.memmap)
+        assert sr1 == sr2 == processor.sr
+        assert np.array_equal(y1, y2)
+        assert processor.decode_cache.stats()["hits"] == 1
+
+    def test_entries_evicted_by_bytes(self, processor, tmp_path):
+        """Only the most recently used decodes are kept within max_bytes"""
+        paths = [_write_tone(tmp_path / f"t{i}.wav", 1.0, freq=200.0 + i) for i in range(3)]
+        processor.decode_cache.max_bytes = 2 * (processor.sr * 4 + 128)
+
+        for path in paths:
+            processor.load_audio(path)
+
+        stats = processor.decode_cache.stats()
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 1
+        assert len(os.listdir(processor.decode_cache.cache_dir)) == 2
+
+    def test_rendering_from_mapped_audio(self, processor, tmp_path):
+        """Read-only mapped input renders the same as a fresh decode"""
+        path = _write_tone(tmp_path / "tone.wav", 1.0)
+        fresh = processor.apply_trickster_effect(path, mode="fused")
+
+        mapped = processor.apply_trickster_effect(path, mode="fused")
+
+        assert np.allclose(fresh, mapped)
+
+
+class TestRealtimeVoiceChanger:
+    """Test the stateful real-time vocoder and its WebSocket endpoint"""
+
+    @pytest.fixture
+    def processor(self):
+        return TricksterAudioProcessor()
+
+    def _noise(self, n):
+        return (0.1 * np.random.RandomState(0).randn(n)).astype(np.float32)
+
+    def test_identity_is_a_pure_delay(self, processor):
+        """With no shift the output is the input delayed by the latency"""
+        vocoder = processor.realtime_session()
+        vocoder.set_params(0.0, 1.0)
+        x = self._noise(processor.sr)
+
+        y = np.concatenate([vocoder.process(x[i:i + 300]) for i in range(0, len(x), 300)])
+
+        lag = vocoder.latency_samples
+        assert len(y) == len(x)
+        assert 1000.0 * lag / processor.sr < 50.0
+        assert np.allclose(y[lag + 512:], x[512:len(x) - lag], atol=1e-2)
+
+    def test_block_size_does_not_change_output(self, processor):
+        """Phase state carries over, so any framing gives the same stream"""
+        x = self._noise(processor.sr)
+        a = processor.realtime_session().process(x)
+        b_vocoder = processor.realtime_session()
+        b = np.concatenate([b_vocoder.process(x[i:i + 441]) for i in range(0, len(x), 441)])
+
+        assert np.allclose(a, b, atol=1e-5)
+
+    def test_pitch_moves_fundamental(self, processor):
+        """An octave up doubles a steady tone's frequency"""
+        sr = processor.sr
+        tone = (0.3 * np.sin(2 * np.pi * 220 * np.arange(2 * sr) / sr)).astype(np.float32)
+        vocoder = processor.realtime_session(pitch_shift=12.0, formant_shift=1.0)
+
+        y = vocoder.process(tone)[sr:]
+
+        freqs = np.fft.rfftfreq(len(y), 1.0 / sr)
+        peak = freqs[np.argmax(np.abs(np.fft.rfft(y * np.hanning(len(y)))))]
+        assert peak == pytest.approx(440.0, abs=5.0)
+
+    def test_websocket_round_trip(self):
+        """Frames come back with the same length, followed by stats"""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.routes.audio import router
+
+        app = FastAPI()
+        app.include_router(router)
+        frame = (self._noise(441) * 32767).astype("<i2")
+
+        with TestClient(app).websocket_connect(
+            "/api/audio/trickster/live?sample_format=int16&stats_every=2"
+        ) as ws:
+            config = ws.receive_json()
+            replies = []
+            for _ in range(2):
+                ws.send_bytes(frame.tobytes())
+                replies.append(ws.receive_bytes())
+            stats = ws.receive_json()
+
+        assert config["type"] == "config" and config["latency_ms"] < 50.0
+        assert all(len(r) == frame.nbytes for r in replies)
+        assert stats["type"] == "stats" and stats["frames"] == 2
+        assert stats["budget_ms"] == pytest.approx(40.0)
+
+
+class TestOutputFormats:
+    """Test encoded output formats and ranged responses"""
+
+    @pytest.fixture
+    def processor(self):
+        return TricksterAudioProcessor()
+
+    @pytest.mark.parametrize("fmt,container,rate", [
+        ("wav", "WAV", 44100), ("flac", "FLAC", 44100), ("opus", "OGG", 24000),
+    ])
+    def test_encode_file(self, processor, tmp_path, fmt, container, rate):
+        """Renders re-encode block-wise, resampling where the codec needs it"""
+        if fmt not in processor.available_output_formats():
+            pytest.skip(f"libsndfile without {fmt} support")
+        path = _write_tone(tmp_path / "tone.wav", 3.0)
+
+        encoded = processor.encode_file(path, fmt, block_seconds=1.0)
+
+        info = sf.info(encoded)
+        os.remove(encoded)
+        assert info.format == container
+        assert info.samplerate == rate
+        assert info.duration == pytest.approx(3.0, abs=0.05)
+
+    def test_save_audio_writes_16_bit_pcm(self, processor, tmp_path):
+        """WAV output is 16-bit PCM, not float"""
+        path = str(tmp_path / "out.wav")
+
+        processor.save_audio(np.zeros(1000, dtype=np.float32), path, 22050)
+
+        assert sf.info(path).subtype == "PCM_16"
+
+    def test_parse_range(self):
+        """Single byte ranges parse; multi-range is ignored; bad ranges raise"""
+        from app.routes.audio import _parse_range
+
+        assert _parse_range("bytes=0-99", 1000) == (0, 99)
+        assert _parse_range("bytes=900-", 1000) == (900, 999)
+        assert _parse_range("bytes=-100", 1000) == (900, 999)
+        assert _parse_range("bytes=0-5000", 1000) == (0, 999)
+        assert _parse_range("bytes=0-1,5-6", 1000) is None
+        assert _parse_range("", 1000) is None
+        with pytest.raises(ValueError):
+            _parse_range("bytes=1000-", 1000)
+
+
+class TestBenchmarkSuite:
+    """Test baseline comparison in the audio benchmark suite"""
+
+    def _results(self, wall, peak):
+        return {"results": [{"duration_s": 30.0, "stage": "chain", "wall_s": wall, "rtf": wall / 30, "peak_mb": peak}]}
+
+    def test_compare_flags_regressions_over_threshold(self):
+        """Slowdowns and memory growth beyond the threshold are reported"""
+        from benchmarks.trickster_suite import compare
+        baseline = self._results(1.0, 100.0)
+
+        assert compare(self._results(1.2, 110.0), baseline, 0.25) == []
+        regressions = compare(self._results(1.5, 200.0), baseline, 0.25)
+
+        assert [r[2] for r in regressions] == ["wall_s", "peak_mb"]
+
+    def test_compare_ignores_noise_on_tiny_stages(self):
+        """Relative jumps below the absolute noise floor are not regressions"""
+        from benchmarks.trickster_suite import compare
+
+        assert compare(self._results(0.004, 0.2), self._results(0.002, 0.1), 0.25) == []
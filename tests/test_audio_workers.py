@@ -0,0 +1,147 @@
+"""
+Tests for the Trickster audio worker pool
+
+Run with: pytest tests/test_audio_workers.py -v --tb=short
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+import pytest
+import asyncio
+import numpy as np
+from app.services.audio_processor import TricksterAudioProcessor
+from app.services.audio_workers import AudioWorkerPool, WorkerPoolFull
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = AudioWorkerPool(max_workers=1, max_queue=1)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def _tone(seconds, sr=22050):
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.2 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+class TestAudioWorkerPool:
+    """Test suite for the process pool behind /api/audio/trickster"""
+
+    def test_run_array_matches_in_process(self, pool):
+        """Worker output equals rendering in this process"""
+        y = _tone(1.0)
+        params = {"pitch_shift": 4, "formant_shift": 0.65, "tempo_rate": 1.1, "mode": "fused"}
+
+        remote = asyncio.run(pool.run_array(y, 22050, **params))
+        local = TricksterAudioProcessor().process_array(y, 22050, **params)
+
+        assert len(remote) == len(local)
+        assert np.allclose(remote, local, atol=1e-5)
+        assert pool.pending == 0
+
+    def test_queue_full_rejects(self, pool):
+        """Jobs beyond workers + queue are rejected with WorkerPoolFull"""
+        y = _tone(3.0)
+
+        async def burst():
+            jobs = [asyncio.ensure_future(pool.run_array(y, 22050, mode="chain")) for _ in range(3)]
+            return await asyncio.gather(*jobs, return_exceptions=True)
+
+        results = asyncio.run(burst())
+
+        assert sum(isinstance(r, WorkerPoolFull) for r in results) == 1
+        assert sum(isinstance(r, np.ndarray) for r in results) == 2
+
+    def test_cancelled_job_releases_slot(self, pool):
+        """Cancelling the caller frees its slot for the next job"""
+        y = _tone(120.0)
+
+        async def cancel_then_run():
+            job = asyncio.ensure_future(pool.run_array(y, 22050, mode="chain"))
+            await asyncio.sleep(0.3)
+            job.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await job
+            return await pool.run_array(_tone(0.5), 22050, mode="fused")
+
+        out = asyncio.run(cancel_then_run())
+
+        assert len(out) > 0
+        assert pool.stats["cancelled"] >= 1
+
+    def test_cancelled_job_holds_slot_until_worker_stops(self, pool):
+        """A running job's slot and shared memory outlive the cancel until the worker returns"""
+        from multiprocessing.shared_memory import SharedMemory
+        y = _tone(120.0)
+        segments = []
+        alloc = pool._alloc
+        pool._alloc = lambda size: segments.append(alloc(size)) or segments[-1]
+
+        async def cancel():
+            job = asyncio.ensure_future(pool.run_array(y, 22050, mode="chain"))
+            await asyncio.sleep(0.3)
+            job.cancel()
+            await asyncio.sleep(0.01)
+            held = pool.pending
+            with pytest.raises(asyncio.CancelledError):
+                await job
+            return held
+        try:
+            held = asyncio.run(cancel())
+        finally:
+            pool._alloc = alloc
+
+        assert held == 1 and pool.pending == 0
+        for segment in segments:
+            with pytest.raises(FileNotFoundError):
+                SharedMemory(name=segment.name)
+
+    def test_full_pool_rejects_before_decoding(self, pool, tmp_path):
+        """process_async takes a queue slot before it decodes the upload"""
+        import soundfile as sf
+        path = str(tmp_path / "in.wav")
+        sf.write(path, _tone(0.5), 22050)
+        processor = TricksterAudioProcessor()
+        processor.worker_pool = pool
+        decoded = []
+        load_audio = processor.load_audio
+        processor.load_audio = lambda p: decoded.append(p) or load_audio(p)
+
+        async def run():
+            with pool.reserve(), pool.reserve():
+                with pytest.raises(WorkerPoolFull):
+                    await processor.process_async(path, str(tmp_path / "out.wav"), streaming=False)
+            return await processor.process_async(path, str(tmp_path / "out.wav"), streaming=False)
+
+        result = asyncio.run(run())
+
+        assert decoded == [path] and result["success"]
+        assert pool.pending == 0
+
+    def test_streamed_wav_renders_in_a_worker(self, pool, tmp_path):
+        """stream_wav_async renders through the pool and frees the slot when closed early"""
+        import soundfile as sf
+        path = str(tmp_path / "in.wav")
+        sf.write(path, _tone(12.0), 22050)
+        processor = TricksterAudioProcessor()
+        processor.worker_pool = pool
+        processor.process_streaming(path, str(tmp_path / "local.wav"))
+        completed = pool.stats["completed"]
+
+        async def run():
+            chunks = [chunk async for chunk in processor.stream_wav_async(path)]
+            stream = processor.stream_wav_async(path)
+            await stream.__anext__()
+            in_flight = pool.pending
+            await stream.aclose()
+            return chunks, in_flight
+        chunks, in_flight = asyncio.run(run())
+
+        expected, _ = sf.read(str(tmp_path / "local.wav"), dtype="int16")
+        assert np.array_equal(np.frombuffer(b"".join(chunks[1:]), dtype="<i2"), expected)
+        assert pool.stats["completed"] == completed + 1
+        assert in_flight == 1 and pool.pending == 0
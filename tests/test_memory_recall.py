@@ -0,0 +1,1173 @@
+"""
+Tests for vector-based memory storage and recall
+
+Run with: pytest tests/test_memory_recall.py -v --tb=short
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+import pytest
+import numpy as np
+from app.services.neural_persona import LongTermMemoryEngine
+from app.services.vector_store import VectorMatrix, top_k_indices
+
+
+def _embeddings(n, dim=32, seed=0):
+    return np.random.RandomState(seed).randn(n, dim).astype(np.float32)
+
+
+class TestVectorMatrix:
+    """Test suite for the growable normalised embedding matrix"""
+
+    def test_rows_are_normalised_and_grow(self):
+        """Appends past the initial capacity keep every row, unit length"""
+        matrix = VectorMatrix(dim=32, initial_capacity=4)
+        vectors = _embeddings(10)
+
+        for i, v in enumerate(vectors):
+            assert matrix.append(f"item{i}", v, importance=i / 10) == i
+
+        assert len(matrix) == 10
+        assert matrix.items[7] == "item7"
+        assert np.allclose(np.linalg.norm(matrix.vectors, axis=1), 1.0, atol=1e-5)
+        assert np.allclose(matrix.importance, np.arange(10) / 10)
+
+    def test_dimension_mismatch_rejected(self):
+        """Embeddings of the wrong size raise ValueError"""
+        matrix = VectorMatrix(dim=32)
+
+        with pytest.raises(ValueError):
+            matrix.append("x", np.ones(16))
+
+    def test_top_k_indices_sorted(self):
+        """Top-k returns the highest scores, best first"""
+        scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+
+        assert list(top_k_indices(scores, 3)) == [1, 3, 2]
+        assert list(top_k_indices(scores, 10)) == [1, 3, 2, 4, 0]
+        assert len(top_k_indices(scores, 0)) == 0
+
+
+class TestLongTermMemoryRetrieval:
+    """Test suite for vectorised LongTermMemoryEngine retrieval"""
+
+    @pytest.fixture
+    def engine(self):
+        return LongTermMemoryEngine(embedding_dim=32)
+
+    def test_matches_exact_cosine_ranking(self, engine):
+        """Results equal a brute-force cosine ranking"""
+        vectors = _embeddings(200)
+        for i, v in enumerate(vectors):
+            engine.store_memory("user_1", f"memory {i}", v.tolist())
+        query = _embeddings(1, seed=1)[0]
+
+        results = engine.retrieve_memories("user_1", query.tolist(), top_k=5)
+
+        cos = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+        expected = [f"memory {i}" for i in np.argsort(-cos)[:5]]
+        assert [m.content for m, _ in results] == expected
+        assert results[0][1] == pytest.approx(cos.max() * 1.25, rel=1e-4)
+
+    def test_type_filter_and_user_isolation(self, engine):
+        """Only the requested user's memories of the requested type come back"""
+        vectors = _embeddings(6)
+        engine.store_memory("user_1", "pref", vectors[0], "preference")
+        engine.store_memory("user_1", "chat", vectors[1], "conversation")
+        engine.store_memory("user_2", "other pref", vectors[2], "preference")
+
+        results = engine.retrieve_memories("user_1", vectors[0], top_k=5, memory_type="preference")
+
+        assert [m.content for m, _ in results] == ["pref"]
+        assert engine.retrieve_memories("user_1", vectors[0], memory_type="health") == []
+        assert engine.retrieve_memories("nobody", vectors[0]) == []
+
+    def test_access_count_only_for_returned(self, engine):
+        """Returned memories are marked accessed; the rest are untouched"""
+        vectors = _embeddings(10)
+        ids = [engine.store_memory("user_1", f"m{i}", v) for i, v in enumerate(vectors)]
+
+        results = engine.retrieve_memories("user_1", vectors[3], top_k=1)
+        engine.flush_access_counts()
+
+        assert results[0][0].memory_id == ids[3]
+        assert results[0][0].access_count == 1
+        assert sum(m.access_count for m in engine.memories) == 1
+        assert engine.vector_store.get("user_1").access_count[3] == 1
+
+
+class TestANNIndex:
+    """Test suite for the pluggable ANN indexes"""
+
+    def _clustered(self, n, dim=32, seed=0):
+        rng = np.random.RandomState(seed)
+        topics = rng.randn(50, dim)
+        return (topics[rng.randint(0, 50, n)] + 0.3 * rng.randn(n, dim)).astype(np.float32)
+
+    def test_ivf_recall_against_exact(self):
+        """IVF finds nearly all exact neighbours, more with a higher n_probe"""
+        from app.services.ann_index import FlatIndex, IVFFlatIndex
+        data = self._clustered(5000)
+        exact, ivf = FlatIndex(32), IVFFlatIndex(32, n_probe=1, train_threshold=1000)
+        for start in range(0, 5000, 500):
+            ids = np.arange(start, start + 500)
+            exact.add(ids, data[ids])
+            ivf.add(ids, data[ids])
+        queries = self._clustered(50, seed=1)
+
+        def recall(n_probe):
+            ivf.n_probe = n_probe
+            hits = [len(set(exact.search(q, 10)[0]) & set(ivf.search(q, 10)[0])) for q in queries]
+            return np.mean(hits) / 10
+
+        assert ivf.is_trained and len(ivf) == 5000
+        low, high = recall(1), recall(8)
+        assert high > 0.9 and high >= low
+        assert recall(len(ivf.centroids)) == 1.0
+
+    def test_remove_and_reinsert(self):
+        """Deleted ids are never returned; ids moved by deletion stay findable"""
+        from app.services.ann_index import IVFFlatIndex
+        data = self._clustered(2000)
+        index = IVFFlatIndex(32, train_threshold=500)
+        index.add(np.arange(2000), data)
+
+        index.remove(np.arange(0, 2000, 2))
+
+        assert len(index) == 1000
+        for i in (1, 501, 1999):
+            assert index.search(data[i], 1)[0][0] == i
+        assert index.search(data[0], 1)[0][0] != 0
+        index.add(np.array([0]), data[0])
+        assert index.search(data[0], 1)[0][0] == 0
+
+    def test_engine_uses_index_past_min_size(self):
+        """Large users get an index and still find the closest memory"""
+        from app.services.ann_index import index_factory
+        engine = LongTermMemoryEngine(
+            embedding_dim=32, index_factory=index_factory("ivf", train_threshold=200), ann_min_size=100
+        )
+        data = self._clustered(600)
+        for i, v in enumerate(data):
+            engine.store_memory("user_1", f"m{i}", v)
+        engine.store_memory("user_2", "small", data[0])
+
+        results = engine.retrieve_memories("user_1", data[123], top_k=3)
+
+        indexes = engine.vector_store.indexes
+        assert "user_1" in indexes and "user_2" not in indexes
+        assert len(indexes["user_1"]) == 600
+        assert results[0][0].content == "m123"
+
+
+class TestMemoryEngineRecall:
+    """Test suite for vectorised MemoryEngine.recall_memory"""
+
+    @pytest.fixture
+    def engine(self):
+        from app.services.memory_engine import MemoryEngine
+        return MemoryEngine()
+
+    def _store(self, engine, user_id, texts):
+        import asyncio
+
+        async def store_all():
+            return [await engine.store_memory(user_id, t, emotion="calm") for t in texts]
+        return asyncio.run(store_all())
+
+    def test_exact_match_ranks_first(self, engine):
+        """The memory whose text matches the query scores highest"""
+        import asyncio
+        texts = [f"note number {i}" for i in range(500)]
+        self._store(engine, "user_1", texts)
+
+        results = asyncio.run(engine.recall_memory("user_1", "note number 321", top_k=3))
+
+        assert len(results) == 3
+        assert results[0][0].full_text == "note number 321"
+        assert results[0][1] == pytest.approx(1.0, abs=1e-4)
+        assert results[0][1] > results[1][1] >= results[2][1]
+
+    def test_time_decay_prefers_recent(self, engine):
+        """Between equally similar memories the newer one wins"""
+        import asyncio
+        old, new = self._store(engine, "user_1", ["same words", "same words"])
+        matrix = engine.vector_store.get("user_1")
+        matrix.timestamp[0] -= 30 * 86400  # first memory is a month old
+
+        results = asyncio.run(engine.recall_memory("user_1", "same words", top_k=2))
+
+        assert [m.id for m, _ in results] == [new.id, old.id]
+        assert results[0][1] - results[1][1] == pytest.approx(0.3 * (1 - 1 / 4.0), abs=1e-4)
+
+    def test_unknown_user(self, engine):
+        """Users without memories get an empty result"""
+        import asyncio
+
+        assert asyncio.run(engine.recall_memory("nobody", "anything")) == []
+
+
+class TestEmbeddingProvider:
+    """Test suite for the batched, cached EmbeddingProvider"""
+
+    class CountingBackend:
+        name = "counting"
+        dim = 16
+
+        def __init__(self):
+            self.batches = []
+
+        async def embed_batch(self, texts):
+            self.batches.append(list(texts))
+            return np.ones((len(texts), self.dim), dtype=np.float32)
+
+    def test_hashing_backend_deterministic(self):
+        """Hashing embeddings are repeatable, unit length and word-sensitive"""
+        from app.services.embeddings import HashingEmbeddingBackend
+        backend = HashingEmbeddingBackend(dim=256)
+
+        a, a2, b, c = backend.embed_sync([
+            "my dog likes the park", "my dog likes the park", "the dog went to the park", "quarterly tax filing"
+        ])
+
+        assert np.array_equal(a, a2)
+        assert np.linalg.norm(a) == pytest.approx(1.0, abs=1e-5)
+        assert a @ b > a @ c
+
+    def test_concurrent_calls_share_one_batch(self):
+        """Calls inside the batch window go to the backend together, duplicates once"""
+        import asyncio
+        from app.services.embeddings import EmbeddingProvider
+        backend = self.CountingBackend()
+        provider = EmbeddingProvider(backend, batch_window_ms=20)
+
+        async def run():
+            return await asyncio.gather(*(provider.embed(t) for t in ["a", "b", "a", "c"]))
+        vectors = asyncio.run(run())
+
+        assert backend.batches == [["a", "b", "c"]]
+        assert provider.stats["coalesced"] == 1
+        assert all(v.dtype == np.float32 and v.shape == (16,) for v in vectors)
+        assert not vectors[0].flags.writeable
+
+    def test_memory_and_disk_cache(self, tmp_path):
+        """Repeats are served from the LRU, and from disk after a restart"""
+        import asyncio
+        from app.services.embeddings import EmbeddingProvider, HashingEmbeddingBackend
+        backend = HashingEmbeddingBackend(dim=64)
+        provider = EmbeddingProvider(backend, cache_dir=str(tmp_path))
+
+        async def embed_and_persist():
+            vector = await provider.embed("hello world")
+            others = asyncio.all_tasks() - {asyncio.current_task()}
+            await asyncio.gather(*others)  # Let the flush finish its disk write
+            return vector
+        first = asyncio.run(embed_and_persist())
+        again = asyncio.run(provider.embed("hello world"))
+        restarted = EmbeddingProvider(backend, cache_dir=str(tmp_path))
+        from_disk = asyncio.run(restarted.embed("hello world"))
+
+        assert provider.stats["backend_calls"] == 1 and provider.stats["memory_hits"] == 1
+        assert restarted.stats["disk_hits"] == 1 and restarted.stats["backend_calls"] == 0
+        assert np.array_equal(first, again) and np.array_equal(first, from_disk)
+
+    def test_backend_errors_reach_every_caller(self):
+        """A failed batch raises in each waiting call"""
+        import asyncio
+        from app.services.embeddings import EmbeddingProvider
+
+        class FailingBackend(self.CountingBackend):
+            async def embed_batch(self, texts):
+                raise RuntimeError("backend down")
+        provider = EmbeddingProvider(FailingBackend())
+
+        async def run():
+            return await asyncio.gather(provider.embed("x"), provider.embed("y"), return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in asyncio.run(run()))
+
+    def test_cancelled_caller_does_not_strand_full_batch(self):
+        """The caller that fills a batch can be cancelled; the others still get vectors"""
+        import asyncio
+        from app.services.embeddings import EmbeddingProvider
+
+        class SlowBackend(self.CountingBackend):
+            async def embed_batch(self, texts):
+                await asyncio.sleep(0.01)
+                return await super().embed_batch(texts)
+        backend = SlowBackend()
+        provider = EmbeddingProvider(backend, batch_window_ms=1000, max_batch_size=3)
+
+        async def run():
+            first = [asyncio.ensure_future(provider.embed(t)) for t in ["a", "b"]]
+            await asyncio.sleep(0)
+            filler = asyncio.ensure_future(provider.embed("c"))
+            await asyncio.sleep(0)
+            filler.cancel()
+            return await asyncio.wait_for(asyncio.gather(*first), timeout=1)
+        vectors = asyncio.run(run())
+
+        assert backend.batches == [["a", "b", "c"]] and len(vectors) == 2
+        assert provider._cache_get(provider.key("c")) is not None
+
+    def test_disk_cache_is_bounded(self, tmp_path):
+        """The .npy tier evicts least recently used vectors past cache_max_bytes"""
+        import asyncio
+        from app.services.embeddings import EmbeddingProvider, HashingEmbeddingBackend
+        provider = EmbeddingProvider(
+            HashingEmbeddingBackend(dim=64), cache_dir=str(tmp_path), cache_max_bytes=3 * 400
+        )
+
+        async def run():
+            for i in range(10):
+                await provider.embed(f"text {i}")
+                await asyncio.gather(*(asyncio.all_tasks() - {asyncio.current_task()}))
+        asyncio.run(run())
+
+        stats = provider.disk_cache.stats()
+        assert stats["entries"] <= 3 and stats["bytes"] <= 3 * 400 and stats["evictions"] >= 7
+        assert len([n for n in os.listdir(tmp_path) if n.endswith(".npy")]) == stats["entries"]
+
+
+class TestMemoryConsolidation:
+    """Test suite for incremental batch consolidation"""
+
+    @pytest.fixture
+    def engine(self):
+        from app.services.memory_engine import MemoryEngine
+        return MemoryEngine()
+
+    def _store(self, engine, user_id, texts):
+        import asyncio
+
+        async def store_all():
+            return [await engine.store_memory(user_id, t, emotion="calm") for t in texts]
+        return asyncio.run(store_all())
+
+    def test_groups_merged_in_place(self, engine):
+        """Near-duplicates merge into the oldest memory; others are untouched"""
+        import asyncio
+        first, _, other, _ = self._store(engine, "user_1", [
+            "I love pepperoni pizza", "I love pepperoni pizza!", "My sister lives in Lisbon", "i LOVE pepperoni pizza",
+        ])
+
+        count = asyncio.run(engine.consolidate_memories("user_1"))
+
+        assert count == 1
+        assert engine.memories["user_1"] == [first, other]
+        assert first.full_text.count("pepperoni") == 3
+        matrix = engine.vector_store.get("user_1")
+        assert matrix.items == [first, other]
+        results = asyncio.run(engine.recall_memory("user_1", first.full_text, top_k=1))
+        assert results[0][0] is first and results[0][1] == pytest.approx(1.0, abs=1e-4)
+
+    def test_incremental_runs(self, engine):
+        """A second run only looks at memories stored since the first"""
+        import asyncio
+        self._store(engine, "user_1", ["walk the dog", "buy milk"])
+        assert asyncio.run(engine.consolidate_memories("user_1")) == 0
+
+        pairs = []
+        similar_pairs = engine.vector_store.similar_pairs
+        engine.vector_store.similar_pairs = lambda user_id, rows, *a, **kw: (
+            pairs.append(rows.tolist()) or similar_pairs(user_id, rows, *a, **kw)
+        )
+        self._store(engine, "user_1", ["walk the dog"])
+
+        assert asyncio.run(engine.consolidate_memories("user_1")) == 1
+        assert pairs == [[2]]
+        assert [m.full_text for m in engine.memories["user_1"]] == ["walk the dog walk the dog", "buy milk"]
+        assert asyncio.run(engine.consolidate_memories("user_1")) == 0
+
+    def test_memories_stored_during_a_run_are_checked_next_time(self, engine):
+        """A memory stored while a run awaits re-embedding is compared by the next run"""
+        import asyncio
+        self._store(engine, "user_1", ["walk the dog", "walk the dog", "buy milk"])
+        embed_many = engine.embedding_provider.embed_many
+
+        async def run():
+            async def slow_embed_many(texts):
+                await engine.store_memory("user_1", "buy milk", emotion="calm")
+                return await embed_many(texts)
+            engine.embedding_provider.embed_many = slow_embed_many
+            first = await engine.consolidate_memories("user_1")
+            engine.embedding_provider.embed_many = embed_many
+            return first, await engine.consolidate_memories("user_1")
+
+        assert asyncio.run(run()) == (1, 1)
+        assert [m.full_text for m in engine.memories["user_1"]] == ["walk the dog walk the dog", "buy milk buy milk"]
+
+    def test_concurrent_runs_for_one_user(self, engine):
+        """Overlapping runs are serialised: the second finds nothing left to merge"""
+        import asyncio
+        self._store(engine, "u1", ["I love pizza"] * 3 + ["cats are great"] * 2 + ["my flight is on friday"])
+
+        async def run():
+            return await asyncio.gather(engine.consolidate_memories("u1"), engine.consolidate_memories("u1"))
+
+        assert asyncio.run(run()) == [2, 0]
+        assert [m.full_text for m in engine.memories["u1"]] == [
+            "I love pizza I love pizza I love pizza", "cats are great cats are great", "my flight is on friday",
+        ]
+        assert len(engine.vector_store.get("u1")) == 3
+
+    def test_indexed_users_use_ann_lookup(self, engine):
+        """Users with an ANN index merge through index neighbour search"""
+        import asyncio
+        from app.services.ann_index import index_factory
+        engine.vector_store.index_factory = index_factory("flat")
+        engine.vector_store.ann_min_size = 5
+        self._store(engine, "user_1", [f"topic {i} notes" for i in range(8)] + ["topic 3 notes"])
+
+        assert asyncio.run(engine.consolidate_memories("user_1")) == 1
+        index = engine.vector_store.indexes["user_1"]
+        assert len(index) == len(engine.memories["user_1"]) == 8
+        assert index.search(engine.vector_store.get("user_1").vectors[7], 1)[0][0] == 7
+
+
+class TestSQLiteMemoryStore:
+    """Test suite for the persistent memory store (SQLite fallback)"""
+
+    def _record(self, i, user_id="user_1", days_old=0):
+        from datetime import datetime, timedelta
+        return {
+            "id": f"m{i}", "user_id": user_id, "summary": f"memory {i}", "full_text": f"memory {i}",
+            "emotion_detected": "calm", "emotion_confidence": 0.5, "memory_type": "note",
+            "created_at": datetime.now() - timedelta(days=days_old), "recalled_count": 0,
+        }
+
+    def test_batched_inserts_and_sql_ranking(self, tmp_path):
+        """Writes go in batches and SQL ranking matches similarity * 0.7 + decay * 0.3"""
+        import asyncio
+        from app.services.memory_store import SQLiteMemoryStore
+        vectors = _embeddings(25)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        store = SQLiteMemoryStore(str(tmp_path / "mem.db"), batch_size=10)
+
+        async def run():
+            await store.connect()
+            for i, v in enumerate(vectors):
+                await store.add(self._record(i, days_old=i % 3), v)
+            await store.add(self._record(99, user_id="user_2"), vectors[0])
+            results = await store.search("user_1", vectors[4], top_k=3)
+            await store.close()
+            return results
+        results = asyncio.run(run())
+
+        assert store.stats["inserted"] == 26 and store.stats["insert_batches"] == 3
+        days = np.arange(25) % 3
+        expected = vectors @ vectors[4] * 0.7 + 0.3 / (1 + 0.1 * days)
+        assert [r["id"] for r, _ in results] == [f"m{i}" for i in np.argsort(-expected)[:3]]
+        assert results[0][1] == pytest.approx(expected.max(), abs=1e-4)
+
+    def test_engine_memories_survive_restart(self, tmp_path):
+        """A new engine on the same database recalls earlier memories"""
+        import asyncio
+        from app.services.memory_engine import MemoryEngine
+        from app.services.memory_store import SQLiteMemoryStore
+        path = str(tmp_path / "mem.db")
+
+        async def session(texts, query):
+            engine = MemoryEngine()
+            engine.store = SQLiteMemoryStore(path)
+            await engine.store.connect()
+            for t in texts:
+                await engine.store_memory("user_1", t, emotion="calm")
+            results = await engine.recall_memory("user_1", query, top_k=2)
+            await engine.store.close()
+            return results
+
+        asyncio.run(session(["my cat is called Miso", "I work as a nurse"], "cat"))
+        results = asyncio.run(session([], "my cat is called Miso"))
+
+        assert len(results) == 2
+        assert results[0][0].full_text == "my cat is called Miso"
+        assert results[0][1] == pytest.approx(1.0, abs=1e-4)
+
+    def test_bad_row_is_dead_lettered(self, tmp_path):
+        """A failing record is retried alone and set aside; the rest are inserted"""
+        import asyncio
+        from app.services.memory_store import SQLiteMemoryStore
+        vectors = _embeddings(5)
+        store = SQLiteMemoryStore(str(tmp_path / "mem.db"), batch_size=10)
+
+        async def run():
+            await store.connect()
+            for i, v in enumerate(vectors):
+                record = self._record(i)
+                if i == 2:
+                    record["summary"] = None  # NOT NULL violation
+                await store.add(record, v)
+            results = await store.search("user_1", vectors[0], top_k=10)
+            await store.close()
+            return results
+        results = asyncio.run(run())
+
+        assert sorted(r["id"] for r, _ in results) == ["m0", "m1", "m3", "m4"]
+        assert [r["id"] for r in store.dead_letters] == ["m2"]
+        assert store.stats["inserted"] == 4 and store.stats["dead_lettered"] == 1
+
+    def test_postgres_store_rejects_non_uuid_users(self):
+        """user_memory.user_id is a user_profiles UUID, so other ids are refused before queuing"""
+        import asyncio
+        from app.services.memory_store import PgVectorMemoryStore
+        store = PgVectorMemoryStore("postgresql://unused")
+
+        assert store.valid_user_id("6f1c2a8e-3b5d-4c1e-9a7f-0d2b4e6f8a1c")
+        with pytest.raises(ValueError):
+            asyncio.run(store.add(self._record(0), _embeddings(1)[0]))
+        assert store._pending == []
+        assert asyncio.run(store.search("user_1", _embeddings(1)[0])) == []
+
+    def test_consolidation_and_state_survive_restart(self, tmp_path):
+        """Merged memories are archived in the store; a new engine rebuilds reminders and aggregates"""
+        import asyncio
+        from datetime import datetime, timedelta
+        from app.services.memory_engine import MemoryEngine
+        from app.services.memory_store import SQLiteMemoryStore
+        path = str(tmp_path / "mem.db")
+        soon = (datetime.now() + timedelta(hours=2)).strftime("%B %d")
+
+        async def first_session():
+            engine = MemoryEngine()
+            engine.store = SQLiteMemoryStore(path)
+            await engine.store.connect()
+            await engine.store_memory("user_1", "I love pizza", emotion="happy")
+            await engine.store_memory("user_1", "I love pizza", emotion="calm")
+            await engine.store_memory("user_1", f"Mum's birthday is {soon}", memory_type="birthday")
+            merged = await engine.consolidate_memories("user_1")
+            results = await engine.recall_memory("user_1", "pizza", top_k=5)
+            await engine.store.close()
+            return merged, results
+
+        async def second_session():
+            engine = MemoryEngine()
+            engine.store = SQLiteMemoryStore(path)
+            await engine.store.connect()
+            due = await engine.proactive_recall("user_1")
+            response = await engine.emotional_response_synthesis("user_1", "calm")
+            total = engine.aggregates["user_1"].total
+            await engine.store.close()
+            return due, response, total
+
+        merged, results = asyncio.run(first_session())
+        assert merged == 1 and len(results) == 2
+        assert results[0][0].full_text == "I love pizza I love pizza"
+
+        due, response, total = asyncio.run(second_session())
+        assert [m.memory_type for m in due] == ["birthday"]
+        assert total == 2 and response["tone"] == "friendly"
+
+
+    def test_workers_resync_from_the_store(self, tmp_path):
+        """An engine rebuilds a user's state after another engine writes; ids survive the round trip"""
+        import asyncio
+        from app.services.memory_engine import MemoryEngine
+        from app.services.memory_store import SQLiteMemoryStore
+        path = str(tmp_path / "mem.db")
+
+        async def run():
+            first, second = MemoryEngine(), MemoryEngine()
+            for engine in (first, second):
+                engine.store = SQLiteMemoryStore(path)
+                await engine.store.connect()
+            stored = await first.store_memory("user_1", "I love pizza", emotion="happy")
+            await first.emotional_response_synthesis("user_1", "calm")
+            await second.store_memory("user_1", "I love pizza", emotion="calm")
+            await second.store_memory("user_1", "My sister lives in Lisbon", emotion="calm")
+            await second.store.flush()  # Batched writes reach other workers once flushed
+
+            merged = await first.consolidate_memories("user_1")
+            seen_by_first = [m.id for m in first.memories["user_1"]]
+            await second.emotional_response_synthesis("user_1", "calm")
+            for engine in (first, second):
+                await engine.store.close()
+            return stored, merged, seen_by_first, first, second
+        stored, merged, seen_by_first, first, second = asyncio.run(run())
+
+        assert merged == 1 and seen_by_first[0] == stored.id and len(seen_by_first) == 2
+        assert first.aggregates["user_1"].total == 2
+        assert [m.id for m in second.memories["user_1"]] == seen_by_first
+        assert second.memories["user_1"][0].full_text == "I love pizza I love pizza"
+
+    def test_postgres_ids_round_trip(self):
+        """Memory ids handed out by the Postgres store come back unchanged"""
+        from app.services.memory_store import PgVectorMemoryStore, _row_id
+        store = PgVectorMemoryStore("postgresql://unused")
+        memory_id = store.new_id("6f1c2a8e-3b5d-4c1e-9a7f-0d2b4e6f8a1c", 0.0)
+
+        assert str(_row_id(memory_id)) == memory_id
+        assert PgVectorMemoryStore._record({"id": _row_id(memory_id), "user_id": "u", **{
+            field: None for field in ("summary", "full_text", "emotion_detected", "emotion_confidence",
+                                      "memory_type", "created_at", "recalled_count")
+        }})["id"] == memory_id
+
+
+class FakePgConnection:
+    """Records the statements PgVectorMemoryStore sends; fetch returns no rows"""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, sql, *args):
+        self.statements.append((sql, args))
+
+    async def fetch(self, sql, *args):
+        self.statements.append((sql, args))
+        return []
+
+    def transaction(self):
+        return _null_async_context()
+
+    def acquire(self):
+        return _null_async_context(self)
+
+
+def _null_async_context(value=None):
+    import contextlib
+
+    @contextlib.asynccontextmanager
+    async def context():
+        yield value
+    return context()
+
+
+class TestPgVectorMemoryStore:
+    """Test suite for pgvector recall across many users sharing one HNSW index"""
+
+    USER = "6f1c2a8e-3b5d-4c1e-9a7f-0d2b4e6f8a1c"
+
+    def test_search_widens_the_shared_index_scan(self):
+        """Iterative scans with ef_search >= candidates, or an exact per-user ranking on old pgvector"""
+        import asyncio
+        from app.services.memory_store import PgVectorMemoryStore
+        store = PgVectorMemoryStore("postgresql://unused")
+        store.pool = conn = FakePgConnection()
+
+        store.iterative_scan = True
+        asyncio.run(store.search(self.USER, _embeddings(1)[0], top_k=5, candidates=200))
+        (settings, args), (sql, _) = conn.statements
+        assert "hnsw.iterative_scan" in settings and args == ("200",)
+        assert sql == store.SEARCH_SQL
+
+        conn.statements.clear()
+        store.iterative_scan = False
+        asyncio.run(store.search(self.USER, _embeddings(1)[0], top_k=5, candidates=20))
+        assert [sql for sql, _ in conn.statements] == [store.SEARCH_EXACT_SQL]
+
+    @pytest.mark.skipif(not os.environ.get("MEMORY_STORE_TEST_DSN"), reason="needs MEMORY_STORE_TEST_DSN")
+    def test_small_user_among_many_users(self):
+        """A user with two memories gets both back while thousands of other users' rows share the index"""
+        import asyncio
+        import uuid
+        from datetime import datetime
+        from app.services.memory_store import PgVectorMemoryStore
+        vectors = np.random.RandomState(1).randn(4002, 1536).astype(np.float32)
+        users = [str(uuid.uuid4()) for _ in range(201)]
+        store = PgVectorMemoryStore(os.environ["MEMORY_STORE_TEST_DSN"], batch_size=500)
+
+        async def run():
+            await store.connect()
+            async with store.pool.acquire() as conn:
+                await conn.executemany(
+                    "INSERT INTO user_profiles (id, email) VALUES ($1, $2)",
+                    [(uuid.UUID(u), f"{u}@test.invalid") for u in users],
+                )
+            try:
+                for i, vector in enumerate(vectors):
+                    user = users[0] if i < 2 else users[1 + i % 200]
+                    record = {
+                        "id": str(uuid.uuid4()), "user_id": user, "summary": f"m{i}", "full_text": f"m{i}",
+                        "emotion_detected": "calm", "emotion_confidence": 0.5, "memory_type": "note",
+                        "created_at": datetime.now(), "recalled_count": 0,
+                    }
+                    await store.add(record, vector)
+                return await store.search(users[0], vectors[3000], top_k=5)
+            finally:
+                async with store.pool.acquire() as conn:
+                    await conn.execute("DELETE FROM user_profiles WHERE id = ANY($1::uuid[])", users)
+                await store.close()
+        results = asyncio.run(run())
+
+        assert sorted(r["summary"] for r, _ in results) == ["m0", "m1"]
+
+
+class TestCompactRecords:
+    """Test suite for the slotted memory record layout"""
+
+    def test_memory_entry_holds_no_vector(self):
+        """MemoryEntry is slotted, with int type codes and epoch timestamps"""
+        from app.services.neural_persona import MEMORY_TYPES
+        engine = LongTermMemoryEngine(embedding_dim=32)
+        engine.store_memory("user_1", "likes tea", _embeddings(1)[0], "preference")
+        entry = engine.memories[0]
+
+        assert not hasattr(entry, "__dict__") and not hasattr(entry, "embedding")
+        assert entry.type_code == MEMORY_TYPES.get("preference")
+        assert entry.memory_type == "preference"
+        assert isinstance(entry.created_ts, float)
+        assert entry.timestamp.timestamp() == pytest.approx(entry.created_ts)
+        assert entry.user_id is engine.vector_store.get("user_1").items[0].user_id
+
+    def test_memory_codes_round_trip(self):
+        """Memory keeps codes but reads and serialises as strings and datetimes"""
+        from datetime import datetime
+        from app.services.memory_engine import Memory, MEMORY_TYPES
+        now = datetime.now()
+        memory = Memory("m1", "user_1", "s", "text", "happy", 0.9, "birthday", now)
+
+        assert not hasattr(memory, "__dict__")
+        assert memory.type_code == MEMORY_TYPES.get("birthday")
+        assert memory.created_at == now
+        memory.emotion_detected = "sad"
+        record = memory.to_dict()
+        assert record["emotion_detected"] == "sad" and record["memory_type"] == "birthday"
+        assert Memory(**record).created_ts == memory.created_ts
+
+    def test_footprint_benchmark_runs(self):
+        """The footprint benchmark reports a smaller after layout"""
+        from benchmarks.memory_footprint import run
+
+        result = run(count=300, before_count=100, dim=256, users=3)
+
+        assert result["after_bytes_per_memory"] < result["before_bytes_per_memory"]
+
+
+class TestUserAggregates:
+    """Test suite for incrementally maintained per-user aggregates"""
+
+    def test_profile_sections_are_bounded(self):
+        """Profiles keep the newest N contents per type but count everything"""
+        engine = LongTermMemoryEngine(embedding_dim=32, profile_recent_size=3)
+        vectors = _embeddings(6)
+        for i, v in enumerate(vectors[:5]):
+            engine.store_memory("user_1", f"pref {i}", v, "preference")
+        engine.store_memory("user_1", "slept badly", vectors[5], "health")
+
+        profile = engine.get_user_profile("user_1")
+
+        assert profile["preferences"] == ["pref 2", "pref 3", "pref 4"]
+        assert profile["health_notes"] == ["slept badly"]
+        assert profile["memory_counts"] == {"preference": 5, "health": 1}
+        assert profile["last_interaction"] is not None
+        assert engine.get_user_profile("nobody")["preferences"] == []
+
+    def test_emotion_counts_follow_store_and_consolidation(self):
+        """Emotion histogram is updated on store and when memories merge"""
+        import asyncio
+        from app.services.memory_engine import MemoryEngine
+        engine = MemoryEngine()
+
+        async def run():
+            await engine.store_memory("user_1", "rainy day again", emotion="sad")
+            await engine.store_memory("user_1", "rainy day again", emotion="calm", emotion_confidence=0.9)
+            await engine.store_memory("user_1", "won the match", emotion="happy")
+            before = dict(engine.aggregates["user_1"].emotion_counts)
+            await engine.consolidate_memories("user_1")
+            return before
+        before = asyncio.run(run())
+
+        aggregates = engine.aggregates["user_1"]
+        assert before == {"sad": 1, "calm": 1, "happy": 1}
+        assert aggregates.emotion_counts == {"sad": 0, "calm": 1, "happy": 1}
+        assert aggregates.total == len(engine.memories["user_1"]) == 2
+        response = asyncio.run(engine.emotional_response_synthesis("user_1", "sad"))
+        assert response["tone"] == "supportive"
+
+
+class TestRecallScheduler:
+    """Test suite for date extraction and the proactive recall heaps"""
+
+    NOW = __import__("datetime").datetime(2026, 6, 5, 15, 30)
+
+    class Mem:
+        def __init__(self, id):
+            self.id = id
+
+    @pytest.mark.parametrize("text,expected", [
+        ("Mom's birthday is June 10th", (2026, 6, 10)),
+        ("dentist on 14 Sept", (2026, 9, 14)),
+        ("conference 2026-11-02 in Berlin", (2026, 11, 2)),
+        ("party March 3", (2027, 3, 3)),
+        ("call the bank tomorrow", (2026, 6, 6)),
+        ("exam in 2 weeks", (2026, 6, 19)),
+        ("dinner on Friday", (2026, 6, 12)),
+    ])
+    def test_extract_event_date(self, text, expected):
+        """Absolute, relative and weekday dates resolve to their next occurrence"""
+        from datetime import datetime
+        from app.services.recall_scheduler import extract_event_date
+
+        assert extract_event_date(text, self.NOW) == datetime(*expected)
+
+    def test_due_respects_lead_time_and_recurs(self):
+        """Reminders come due lead hours before the event, once, then recur yearly"""
+        from datetime import datetime
+        from app.services.recall_scheduler import RecallScheduler
+        scheduler = RecallScheduler({"birthday": 24, "event": 168})
+
+        reminder = scheduler.schedule("user_1", self.Mem("m1"), "Ana's birthday June 10", "birthday", self.NOW)
+        assert scheduler.schedule("user_1", self.Mem("m2"), "no date here", "event", self.NOW) is None
+        assert scheduler.schedule("user_1", self.Mem("m3"), "June 10", "note", self.NOW) is None
+
+        assert datetime.fromtimestamp(reminder.trigger_ts) == datetime(2026, 6, 9)
+        assert scheduler.due("user_1", datetime(2026, 6, 8, 23)) == []
+        assert scheduler.due("user_1", datetime(2026, 6, 9, 8)) == [reminder]
+        assert scheduler.due("user_1", datetime(2026, 6, 9, 9)) == []
+        assert len(scheduler) == 1
+        assert scheduler.due("user_2", datetime(2027, 6, 9, 8)) == []
+        assert scheduler.pop_all_due(datetime(2027, 6, 9, 8))[0].event_at == datetime(2027, 6, 10)
+
+    def test_engine_proactive_recall(self):
+        """Memories with a near date are recalled once; cancelled ones never"""
+        import asyncio
+        from app.services.memory_engine import MemoryEngine
+        engine = MemoryEngine()
+
+        async def run():
+            due = await engine.store_memory("user_1", "pick up the cake tomorrow", memory_type="reminder")
+            await engine.store_memory("user_1", "concert next month sometime", memory_type="event")
+            cancelled = await engine.store_memory("user_1", "dentist tomorrow", memory_type="reminder")
+            engine.recall_scheduler.cancel(cancelled.id)
+            return due, await engine.proactive_recall("user_1"), await engine.proactive_recall("user_1")
+        due, first, second = asyncio.run(run())
+
+        assert first == [due]
+        assert second == []
+
+    def test_push_delivery(self):
+        """The background task delivers reminders when they fall due"""
+        import asyncio
+        from datetime import datetime
+        from app.services.recall_scheduler import RecallScheduler
+        scheduler = RecallScheduler({"reminder": 24})
+        delivered = []
+
+        async def deliver(reminder):
+            delivered.append(reminder.memory.id)
+
+        async def run():
+            scheduler.start(deliver)
+            await asyncio.sleep(0)
+            scheduler.schedule("user_1", self.Mem("m1"), "call Sam tomorrow", "reminder", datetime.now())
+            for _ in range(50):
+                if delivered:
+                    break
+                await asyncio.sleep(0.01)
+            await scheduler.stop()
+        asyncio.run(run())
+
+        assert delivered == ["m1"]
+
+    def test_heaps_stay_bounded(self):
+        """The global heap is only fed while pushing; delivered entries are compacted away"""
+        import asyncio
+        from datetime import datetime, timedelta
+        from app.services.recall_scheduler import RecallScheduler
+        scheduler = RecallScheduler({"reminder": 24}, compact_threshold=8)
+        later = datetime.now() + timedelta(days=30)
+
+        for i in range(100):
+            scheduler.schedule("user_1", self.Mem(f"m{i}"), "call Sam tomorrow", "reminder")
+        assert scheduler._global_heap == [] and len(scheduler._user_heaps["user_1"]) == 100
+        for i in range(90):
+            scheduler.cancel(f"m{i}")
+        assert len(scheduler._user_heaps["user_1"]) <= 10 + 8
+
+        async def run():
+            scheduler.start(lambda reminder: asyncio.sleep(0))
+            assert len(scheduler._global_heap) == 10
+            scheduler.schedule("user_2", self.Mem("x"), "call Jo tomorrow", "reminder")
+            delivered = scheduler.pop_all_due(later)
+            await scheduler.stop()
+            return delivered
+        assert len(asyncio.run(run())) == 11
+        assert scheduler._user_heaps == {} and scheduler._global_heap == [] and len(scheduler) == 0
+
+
+class TestRecallCache:
+    """Test suite for cached recall and deferred access counts"""
+
+    def test_near_identical_queries_share_an_entry(self):
+        """Tiny query perturbations hit; other parameters and users miss"""
+        from app.services.recall_cache import RecallCache
+        cache = RecallCache()
+        query = _embeddings(1, dim=256)[0]
+        cache.put("user_1", cache.key(query, 5, None), "result")
+
+        assert cache.get("user_1", cache.key(query * 1.0001, 5, None)) == "result"
+        assert cache.get("user_1", cache.key(query, 3, None)) is None
+        assert cache.get("user_2", cache.key(query, 5, None)) is None
+        cache.invalidate("user_1")
+        assert cache.get("user_1", cache.key(query, 5, None)) is None
+        assert cache.stats["hits"] == 1 and len(cache) == 0
+
+    def test_store_invalidates_and_access_is_deferred(self):
+        """Cached reads skip scoring; new memories show up; counts land in batches"""
+        engine = LongTermMemoryEngine(embedding_dim=32, access_flush_size=4)
+        vectors = _embeddings(5)
+        for i, v in enumerate(vectors[:4]):
+            engine.store_memory("user_1", f"m{i}", v)
+
+        first = engine.retrieve_memories("user_1", vectors[4], top_k=2)
+        engine.vector_store.get("user_1").vectors[:] = 0  # Would change any fresh ranking
+        second = engine.retrieve_memories("user_1", vectors[4], top_k=2)
+        assert [m.memory_id for m, _ in first] == [m.memory_id for m, _ in second]
+        assert engine.recall_cache.stats["hits"] == 1
+
+        # Two lookups of two rows reached access_flush_size
+        assert sum(m.access_count for m in engine.memories) == 4
+        engine.store_memory("user_1", "exact", vectors[4])
+        results = engine.retrieve_memories("user_1", vectors[4], top_k=1)
+        assert results[0][0].content == "exact"
+        assert sum(m.access_count for m in engine.memories) == 4
+        engine.flush_access_counts()
+        assert results[0][0].access_count == 1
+
+    def test_memory_engine_recall_cached_until_store(self):
+        """MemoryEngine serves repeats from cache and re-ranks after a write"""
+        import asyncio
+        from app.services.memory_engine import MemoryEngine
+        engine = MemoryEngine()
+
+        async def run():
+            await engine.store_memory("user_1", "I play the violin", emotion="calm")
+            a = await engine.recall_memory("user_1", "violin lessons")
+            b = await engine.recall_memory("user_1", "violin lessons")
+            await engine.store_memory("user_1", "violin lessons on Tuesday", emotion="calm")
+            c = await engine.recall_memory("user_1", "violin lessons")
+            return a, b, c
+        a, b, c = asyncio.run(run())
+
+        assert a == b and engine.recall_cache.stats["hits"] == 1
+        assert c[0][0].full_text == "violin lessons on Tuesday"
+
+
+    def test_write_during_recall_is_not_cached_stale(self, tmp_path):
+        """A store that lands while recall awaits the store's search does not leave a stale entry"""
+        import asyncio
+        from app.services.memory_engine import MemoryEngine
+        from app.services.memory_store import SQLiteMemoryStore
+        engine = MemoryEngine()
+        engine.store = SQLiteMemoryStore(str(tmp_path / "mem.db"))
+
+        async def run():
+            await engine.store.connect()
+            await engine.store_memory("user_1", "I play the violin", emotion="calm")
+            search = engine.store.search
+
+            async def search_while_storing(*args, **kwargs):
+                results = await search(*args, **kwargs)
+                await engine.store_memory("user_1", "violin lessons on Tuesday", emotion="calm")
+                return results
+            engine.store.search = search_while_storing
+            stale = await engine.recall_memory("user_1", "violin lessons")
+            engine.store.search = search
+            fresh = await engine.recall_memory("user_1", "violin lessons")
+            await engine.store.close()
+            return stale, fresh
+        stale, fresh = asyncio.run(run())
+
+        assert len(stale) == 1 and len(fresh) == 2
+        assert engine.recall_cache.stats["hits"] == 0
+
+
+class TestMemoryShards:
+    """Test suite for consistent-hash routing to memory shard processes"""
+
+    def test_ring_balances_and_moves_few_keys(self):
+        """Users spread evenly, and a new shard takes over only its share"""
+        from app.services.memory_shards import HashRing
+        users = [f"user_{i}" for i in range(4000)]
+        ring = HashRing([f"shard-{i}" for i in range(4)])
+        owners = {u: ring.node_for(u) for u in users}
+        counts = [list(owners.values()).count(f"shard-{i}") for i in range(4)]
+        assert min(counts) > 600 and max(counts) < 1400
+
+        grown = HashRing([f"shard-{i}" for i in range(5)])
+        moved = [u for u in users if grown.node_for(u) != owners[u]]
+        assert len(moved) < len(users) * 0.3
+        assert all(grown.node_for(u) == "shard-4" for u in moved)
+
+    def test_engine_calls_run_on_owning_shard(self, tmp_path):
+        """A sharded MemoryEngine stores, recalls and consolidates remotely"""
+        import asyncio
+        from app.services.memory_engine import MemoryEngine
+        from app.services.memory_shards import MemoryShardClient, MemoryShardPool
+        pool = MemoryShardPool(2, str(tmp_path))
+        pool.start()
+
+        async def run():
+            engine = MemoryEngine()
+            engine.shards = MemoryShardClient(pool.socket_paths)
+            users = [f"user_{i}" for i in range(6)]
+            await asyncio.gather(*(
+                engine.store_memory(u, f"{u} loves the violin", emotion="happy") for u in users
+            ))
+            recalled = [await engine.recall_memory(u, "violin") for u in users]
+            merged = await engine.consolidate_memories(users[0])
+            mood = await engine.emotional_response_synthesis(users[0], "happy")
+            await engine.shards.close()
+            await pool.stop()
+            return engine, users, recalled, merged, mood
+        engine, users, recalled, merged, mood = asyncio.run(run())
+
+        assert engine.memories == {}  # Nothing kept in this process
+        for user, results in zip(users, recalled):
+            assert [m.full_text for m, _ in results] == [f"{user} loves the violin"]
+        assert merged == 0
+        assert mood["avatar_expression"] != "neutral"
+        assert {engine.shards.shard_for(u) for u in users} == set(pool.socket_paths)
+
+    def test_supervisor_replaces_stale_sockets_and_dead_shards(self, tmp_path):
+        """Workers wait for listening shards, not socket files; a killed shard is restarted"""
+        import asyncio
+        import socket
+        import threading
+        from app.services.memory_shards import MemoryShardClient, MemoryShardPool, wait_for_shards
+        pool = MemoryShardPool(1, str(tmp_path))
+        (path,) = pool.socket_paths
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(path)  # Socket file of a crashed run, nobody listening
+        stale.close()
+        with pytest.raises(TimeoutError):
+            asyncio.run(wait_for_shards([path], timeout=0.2))
+
+        pool.start()
+        stopped = threading.Event()
+        supervisor = threading.Thread(target=pool.supervise, args=(stopped, 0.05))
+        supervisor.start()
+
+        async def recall():
+            await wait_for_shards([path], timeout=30)
+            client = MemoryShardClient([path])
+            await client.call("user_1", "memory", "store_memory", "user_1", "likes tea")
+            results = await client.call("user_1", "memory", "recall_memory", "user_1", "tea")
+            await client.close()
+            return results
+
+        try:
+            assert len(asyncio.run(recall())) == 1
+            first = pool._processes[0]
+            first.kill()
+            first.join()
+            assert asyncio.run(recall())[0][0].full_text == "likes tea"
+            assert pool._processes[0] is not first
+        finally:
+            stopped.set()
+            supervisor.join()
+            asyncio.run(pool.stop())
+
+
+class TestQuantizedVectors:
+    """Test suite for int8 / product-quantized embedding storage"""
+
+    @staticmethod
+    def _clustered(n, dim=32, clusters=8, seed=0):
+        rng = np.random.RandomState(seed)
+        centers = rng.randn(clusters, dim)
+        return (centers[rng.randint(clusters, size=n)] + 0.3 * rng.randn(n, dim)).astype(np.float32)
+
+    def test_int8_scores_match_float(self):
+        """Asymmetric int8 scores stay within quantization error of exact"""
+        from app.services.quantization import Int8Codec
+        matrix = VectorMatrix(dim=32, codec=Int8Codec(32))
+        vectors = _embeddings(100)
+        for i, v in enumerate(vectors):
+            matrix.append(i, v)
+        exact = VectorMatrix(dim=32)
+        for i, v in enumerate(vectors):
+            exact.append(i, v)
+
+        query = _embeddings(1, seed=1)[0]
+        np.testing.assert_allclose(matrix.similarities(query), exact.similarities(query), atol=0.02)
+        assert matrix._vectors.itemsize == 32 + 4
+        np.testing.assert_allclose(matrix.vectors, exact.vectors, atol=0.01)
+        np.testing.assert_array_equal(matrix.vectors_at([3, 7]), matrix.vectors[[3, 7]])
+
+    def test_pq_trains_then_encodes_all_users(self):
+        """Rows stay float32 until train_size, then every matrix holds codes"""
+        from app.services.quantization import PQCodec
+        codec = PQCodec(32, n_subspaces=8, n_centroids=16, train_size=64)
+        engine = LongTermMemoryEngine(embedding_dim=32, codec=codec)
+        vectors = self._clustered(200)
+        for i, v in enumerate(vectors[:63]):
+            engine.store_memory(f"user_{i % 2}", f"m{i}", v)
+        assert not codec.is_trained and engine.vector_store.get("user_0").codec is None
+
+        for i, v in enumerate(vectors[63:], start=63):
+            engine.store_memory(f"user_{i % 2}", f"m{i}", v)
+        assert codec.is_trained
+        for user_id in ("user_0", "user_1"):
+            matrix = engine.vector_store.get(user_id)
+            assert matrix.codec is codec and matrix._vectors.dtype == np.uint8
+            assert matrix._vectors.shape[1] == 8
+
+        # ADC ranks the stored vector itself among the best few
+        results = engine.retrieve_memories("user_0", vectors[150], top_k=3)
+        assert "m150" in [m.content for m, _ in results]
+
+    def test_exact_rerank_from_vector_file(self, tmp_path):
+        """Reranked results carry exact similarities read from disk"""
+        from app.services.quantization import PQCodec, VectorFile
+        vector_file = VectorFile(str(tmp_path / "vectors.f32"), 32)
+        codec = PQCodec(32, n_subspaces=4, n_centroids=16, train_size=32)
+        engine = LongTermMemoryEngine(
+            embedding_dim=32, codec=codec, vector_file=vector_file, rerank_candidates=8
+        )
+        vectors = self._clustered(300)
+        for i, v in enumerate(vectors):
+            engine.store_memory("user_1", f"m{i}", v)
+
+        results = engine.retrieve_memories("user_1", vectors[200], top_k=1)
+        assert results[0][0].content == "m200"
+        assert results[0][1] == pytest.approx(1.25, abs=1e-4)  # Exact cosine 1.0 x importance boost
+        vector_file.close()
+        assert not (tmp_path / "vectors.f32").exists()
+
+    def test_vector_file_compacts_released_rows(self, tmp_path):
+        """Updates and deletes don't grow the file forever, and references stay exact"""
+        from app.services.quantization import Int8Codec, VectorFile
+        from app.services.vector_store import UserVectorStore
+        vector_file = VectorFile(str(tmp_path / "vectors.f32"), 32, compact_min_rows=16)
+        store = UserVectorStore(32, codec=Int8Codec(32), vector_file=vector_file)
+        vectors = _embeddings(40)
+        for i, v in enumerate(vectors[:20]):
+            store.add(f"user_{i % 2}", i, v)
+        for round_ in range(5):
+            for row in range(10):
+                store.update("user_0", row, vectors[20 + (row + round_) % 20])
+        store.remove("user_1", [0, 1, 2])
+        store.add("user_2", 99, vectors[0])
+        store.drop("user_2")
+
+        live = sum(len(m) for m in store.matrices.values())
+        assert vector_file.size - vector_file.orphaned == live  # 71 rows were written
+        assert vector_file.orphaned < 16
+        for user_id, matrix in store.matrices.items():
+            expected = [vectors[20 + (row + 4) % 20] for row in range(10)] if user_id == "user_0" \
+                else [vectors[i] for i in range(7, 20, 2)]
+            exact = vector_file.read(matrix.refs)
+            np.testing.assert_allclose(
+                exact, np.array(expected) / np.linalg.norm(expected, axis=1, keepdims=True), atol=1e-6
+            )
+        vector_file.close()
+
+    def test_stale_process_files_removed(self, tmp_path):
+        """Files of processes that are gone are deleted when a worker opens its own"""
+        import subprocess
+        from app.services.quantization import VectorFile
+        dead = subprocess.Popen([sys.executable, "-c", "pass"])
+        dead.wait()
+        (tmp_path / f"vectors-{dead.pid}.f32").write_bytes(b"\0" * 128)
+        (tmp_path / "vectors-1.f32").write_bytes(b"\0" * 128)  # init is always alive
+        (tmp_path / "other.f32").write_bytes(b"\0" * 128)
+
+        vector_file = VectorFile.for_process(str(tmp_path), 32)
+
+        assert sorted(os.listdir(tmp_path)) == sorted(
+            ["vectors-1.f32", "other.f32", f"vectors-{os.getpid()}.f32"]
+        )
+        vector_file.close()
@@ -0,0 +1,347 @@
+"""
+Tests for the GlobalTranslator caching and provider batching
+
+Run with: pytest tests/test_translator.py -v --tb=short
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+import pytest
+import asyncio
+from app.services.translation_cache import (
+    LocalTranslationCache, RedisTranslationTier, TranslationCache,
+)
+from app.services.translation_providers import DeepLProvider, TranslationProvider
+from app.services.translator import GlobalTranslator
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis.asyncio subset RedisTranslationTier uses"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+        self.executes = 0
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def hmget(self, name, *fields):
+        self.commands.append(lambda: [self.redis.hashes.get(name, {}).get(f) for f in fields])
+
+    def hset(self, name, mapping):
+        self.commands.append(lambda: self.redis.hashes.setdefault(name, {}).update(mapping))
+
+    def hincrby(self, name, field, amount):
+        def run():
+            fields = self.redis.hashes.setdefault(name, {})
+            fields[field] = fields.get(field, 0) + amount
+        self.commands.append(run)
+
+    def expire(self, name, seconds):
+        self.commands.append(lambda: self.redis.ttls.__setitem__(name, seconds))
+
+    async def execute(self):
+        self.redis.executes += 1
+        return [command() for command in self.commands]
+
+
+class RecordingProvider(TranslationProvider):
+    """Provider that records each request and the peak number in flight"""
+
+    max_segments = 4
+    max_chars = 20
+
+    def __init__(self):
+        self.requests = []
+        self.active = 0
+        self.peak = 0
+
+    async def translate_batch(self, texts, source, target):
+        self.requests.append(list(texts))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return [f"{target}:{text}" for text in texts]
+
+
+def _translator(cache=None):
+    translator = GlobalTranslator()
+    if cache is not None:
+        translator.cache = cache
+    translator.provider_calls = 0
+
+    async def fake_api(text, source, target):
+        translator.provider_calls += 1
+        await asyncio.sleep(0)
+        return f"{target}:{text}"
+    translator._call_translation_api = fake_api
+    return translator
+
+
+class TestTranslationCache:
+    """Test suite for the local LRU + shared tier translation cache"""
+
+    def test_local_lru_is_bounded_and_expires(self):
+        """Least recently used entries go first; expired entries miss"""
+        cache = LocalTranslationCache(max_entries=2, ttl_seconds=0)
+        cache.put(("a", "en", "fr"), ("A", 0.9))
+        cache.put(("b", "en", "fr"), ("B", 0.9))
+        cache.get(("a", "en", "fr"))
+        cache.put(("c", "en", "fr"), ("C", 0.9))
+        assert len(cache) == 2 and cache.get(("b", "en", "fr")) is None
+        assert cache.get(("a", "en", "fr")) == ("A", 0.9)
+
+        expiring = LocalTranslationCache(ttl_seconds=1e-9)
+        expiring.put(("a", "en", "fr"), ("A", 0.9))
+        assert expiring.get(("a", "en", "fr")) is None and len(expiring) == 0
+
+    def test_shared_tier_serves_other_workers(self):
+        """A translation written by one worker is a shared hit for another"""
+        redis = FakeRedis()
+
+        def worker():
+            return _translator(TranslationCache(shared=RedisTranslationTier(redis), flush_interval_ms=1))
+
+        async def run():
+            first, second = worker(), worker()
+            assert await first.translate("hello", "en", "fr") == ("fr:hello", 0.92, False)
+            await first.cache.flush()
+            assert await second.translate("hello", "en", "fr") == ("fr:hello", 0.95, True)
+            assert await second.translate("hello", "en", "fr") == ("fr:hello", 0.95, True)
+            return first, second
+        first, second = asyncio.run(run())
+
+        assert first.provider_calls == 1 and second.provider_calls == 0
+        ratios = second.cache.hit_ratios()["en->fr"]
+        assert ratios["shared_hit_ratio"] == 0.5 and ratios["local_hit_ratio"] == 0.5
+
+    def test_writes_and_hits_are_batched(self):
+        """Many puts and repeated hits become one pipeline per flush"""
+        redis = FakeRedis()
+        cache = TranslationCache(shared=RedisTranslationTier(redis), batch_size=1000, flush_interval_ms=10000)
+
+        async def run():
+            for i in range(50):
+                await cache.put(f"t{i}", "en", "es", f"T{i}", 0.9)
+            await cache.flush()
+            writes = redis.executes
+            for _ in range(20):
+                assert await cache.get("t1", "en", "es") == ("T1", 0.9)
+            await cache.flush()
+            return writes, redis.executes
+        writes, total = asyncio.run(run())
+
+        assert writes == 1 and total == 2
+        (entry,) = [h for h in redis.hashes.values() if h["translated"] == "T1"]
+        assert entry["hits"] == 20
+        assert cache.stats["shared_writes"] == 50 and cache.stats["shared_hit_updates"] == 1
+
+    def test_pending_changes_are_capped_while_shared_tier_fails(self):
+        """Failed flushes keep at most batch_size * max_pending_batches changes, hits dropped first"""
+        class DownTier(RedisTranslationTier):
+            async def put_many(self, values):
+                raise ConnectionError("shared tier down")
+        cache = TranslationCache(
+            shared=DownTier(FakeRedis()), batch_size=10, flush_interval_ms=10000, max_pending_batches=2
+        )
+
+        async def run():
+            for i in range(5):
+                await cache.put(f"old{i}", "en", "es", "x", 0.9)
+                await cache.get(f"old{i}", "en", "es")
+            for i in range(30):
+                await cache.put(f"t{i}", "en", "es", "x", 0.9)
+                with pytest.raises(ConnectionError):
+                    await cache.flush()
+        asyncio.run(run())
+
+        assert len(cache._pending_writes) + len(cache._pending_hits) == 20
+        assert cache._pending_hits == {} and cache.stats["dropped_hit_updates"] == 5
+        assert cache.stats["dropped_writes"] == 15
+        assert ("t29", "en", "es") in cache._pending_writes and ("old0", "en", "es") not in cache._pending_writes
+
+
+    def test_slow_shared_tier_gets_one_flush_at_a_time(self):
+        """Full batches arriving during a slow flush queue no extra flush tasks"""
+        class SlowTier(RedisTranslationTier):
+            def __init__(self, redis):
+                super().__init__(redis)
+                self.calls = 0
+
+            async def put_many(self, values):
+                self.calls += 1
+                await asyncio.sleep(0.05)
+                await super().put_many(values)
+        tier = SlowTier(FakeRedis())
+        cache = TranslationCache(shared=tier, batch_size=10, flush_interval_ms=10000)
+
+        async def run():
+            peak_tasks = 0
+            for i in range(200):
+                await cache.put(f"t{i}", "en", "es", "x", 0.9)
+                await asyncio.sleep(0.001)
+                peak_tasks = max(peak_tasks, len(asyncio.all_tasks()))
+            while cache._flush_task is not None or cache._flushing:
+                await asyncio.sleep(0.01)
+            return peak_tasks
+        peak_tasks = asyncio.run(run())
+
+        assert peak_tasks <= 2
+        assert tier.calls < 20 and cache.stats["shared_writes"] == 200
+        assert cache._pending_writes == {}
+
+
+class TestSingleFlight:
+    """Test suite for coalescing concurrent identical translations"""
+
+    def test_concurrent_misses_share_one_provider_call(self):
+        """A burst of the same phrase costs one provider call"""
+        translator = _translator()
+
+        async def run():
+            burst = [translator.translate("gg", "en", "ja") for _ in range(50)]
+            other = translator.translate("gg", "en", "ko")
+            return await asyncio.gather(*burst, other)
+        results = asyncio.run(run())
+
+        assert {r[0] for r in results[:50]} == {"ja:gg"} and results[50][0] == "ko:gg"
+        assert translator.provider_calls == 2
+        assert translator.stats["provider_calls"] == 2 and translator.stats["coalesced_calls"] == 49
+        assert translator._inflight == {}
+
+    def test_cancelled_caller_does_not_cancel_followers(self):
+        """The shared request outlives the caller that started it"""
+        translator = _translator()
+
+        async def run():
+            leader = asyncio.ensure_future(translator.translate("hi", "en", "de"))
+            follower = asyncio.ensure_future(translator.translate("hi", "en", "de"))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+        assert asyncio.run(run()) == ("de:hi", 0.92, False)
+        assert translator.provider_calls == 1
+
+    def test_errors_reach_every_waiter(self):
+        """A failed provider call fails the whole flight, then clears it"""
+        translator = _translator()
+
+        async def failing(text, source, target):
+            await asyncio.sleep(0)
+            raise RuntimeError("provider down")
+        translator._call_translation_api = failing
+
+        async def run():
+            return await asyncio.gather(
+                *(translator.translate("x", "en", "fr") for _ in range(3)), return_exceptions=True
+            )
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert translator._inflight == {} and translator.stats["provider_calls"] == 1
+
+
+class TestBatchTranslate:
+    """Test suite for multi-segment provider requests in batch_translate"""
+
+    def test_only_misses_are_sent_in_bounded_chunks(self):
+        """Cached and repeated texts are not sent; chunks respect the limits"""
+        translator = GlobalTranslator()
+        translator.provider = provider = RecordingProvider()
+        texts = [f"t{i % 12}" for i in range(30)] + ["a much longer message"]
+
+        async def run():
+            await translator.cache.put("t0", "en", "es", "cached", 0.9)
+            return await translator.batch_translate(texts, "en", "es")
+        results = asyncio.run(run())
+
+        assert [r[0] for r in results] == ["cached" if t == "t0" else f"es:{t}" for t in texts]
+        assert results[0][1] == 0.95 and results[1][1] == 0.92
+        sent = [text for request in provider.requests for text in request]
+        assert sorted(sent) == sorted([f"t{i}" for i in range(1, 12)] + ["a much longer message"])
+        for request in provider.requests:
+            assert len(request) <= 4
+            assert len(request) == 1 or sum(map(len, request)) <= 20
+        assert translator.stats["provider_calls"] == len(provider.requests) < len(sent)
+
+    def test_concurrency_is_bounded(self):
+        """No more than provider_slots requests are in flight"""
+        translator = GlobalTranslator()
+        translator.provider = provider = RecordingProvider()
+
+        async def run():
+            translator.provider_slots = asyncio.Semaphore(2)
+            return await translator.batch_translate([f"m{i}" for i in range(40)], "en", "fr")
+        results = asyncio.run(run())
+
+        assert len(provider.requests) == 10 and provider.peak == 2
+        assert [r[0] for r in results] == [f"fr:m{i}" for i in range(40)]
+
+    def test_batch_joins_translation_in_flight(self):
+        """A text already being translated is not requested again"""
+        translator = GlobalTranslator()
+        translator.provider = provider = RecordingProvider()
+
+        async def run():
+            single = asyncio.ensure_future(translator.translate("hi", "en", "it"))
+            await asyncio.sleep(0)
+            batch = await translator.batch_translate(["hi", "bye"], "en", "it")
+            return await single, batch
+        single, batch = asyncio.run(run())
+
+        assert single[0] == "it:hi" and batch == [("it:hi", 0.92), ("it:bye", 0.92)]
+        assert provider.requests == [["hi"], ["bye"]]
+        assert translator.stats["coalesced_calls"] == 1
+
+    def test_cancelled_request_releases_its_keys(self):
+        """A cancelled provider request fails its waiters and later callers translate afresh"""
+        translator = GlobalTranslator()
+        translator.provider = provider = RecordingProvider()
+
+        async def run():
+            batch = asyncio.ensure_future(translator.batch_translate(["hi", "bye"], "en", "it"))
+            await asyncio.sleep(0)
+            for request in list(translator._requests):
+                request.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await asyncio.wait_for(batch, timeout=1)
+            assert translator._inflight == {}
+            return await asyncio.wait_for(translator.batch_translate(["hi"], "en", "it"), timeout=1)
+
+        assert asyncio.run(run()) == [("it:hi", 0.92)]
+        assert provider.requests[-1] == ["hi"]
+
+    def test_deepl_language_codes(self):
+        """Targets use DeepL's regional codes; unsupported pairs fail before any request"""
+        class FakeClient:
+            def __init__(self):
+                self.calls = []
+
+            def translate_text(self, texts, source_lang, target_lang):
+                self.calls.append((source_lang, target_lang))
+                return [type("Result", (), {"text": text})() for text in texts]
+
+        provider = DeepLProvider.__new__(DeepLProvider)
+        provider.client = FakeClient()
+        translator = GlobalTranslator()
+        translator.provider = provider
+
+        async def run():
+            for source, target in [("zh-CN", "en"), ("en", "pt"), ("en", "zh-CN"), ("en", "zh-TW"), ("de", "no")]:
+                await translator.batch_translate(["hi"], source, target)
+            with pytest.raises(ValueError):
+                await translator.translate("hi", "en", "hi")
+        asyncio.run(run())
+
+        assert provider.client.calls == [
+            ("ZH", "EN-US"), ("EN", "PT-PT"), ("EN", "ZH-HANS"), ("EN", "ZH-HANT"), ("DE", "NB"),
+        ]